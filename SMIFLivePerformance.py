@@ -5,13 +5,14 @@ import yfinance as yf
 import matplotlib
 from matplotlib import pyplot as plt
 import statsmodels.api as sm
+from ingestion import load_brokerage_files
 ####################################################################
 # first, upload the brokerage reports from your local computer drive
 dirpath = os.getcwd()
-filepath = os.path.join(dirpath, 'Investment_Transaction_Detail_-_Customizable.xlsx')
-smifReport = pd.read_excel(filepath)
-filepath = os.path.join(dirpath, 'Income_and_Expense_Detail_Base_by_Account.xlsx')
-smifIncome = pd.read_excel(filepath)
+transactionpath = os.path.join(dirpath, 'Investment_Transaction_Detail_-_Customizable.xlsx')
+incomepath = os.path.join(dirpath, 'Income_and_Expense_Detail_Base_by_Account.xlsx')
+# parsed once per file version, then read from the ingestion cache
+smifReport, smifIncome = load_brokerage_files(transactionpath, incomepath, parallel=False)
 
 # then, preprocess and parse the income report
 def emptyStr(x): return(str(x).strip()!='')
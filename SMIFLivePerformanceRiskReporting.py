@@ -5,13 +5,15 @@ import yfinance as yf
 import matplotlib
 from matplotlib import pyplot as plt
 import statsmodels.api as sm
+from analytics import batch_ols, risk_decomposition
+from ingestion import load_brokerage_files
 ####################################################################
 # first, upload the brokerage reports from your local computer drive
 dirpath = os.getcwd()
-filepath = os.path.join(dirpath, 'Investment_Transaction_Detail_-_Customizable.xlsx')
-smifReport = pd.read_excel(filepath)
-filepath = os.path.join(dirpath, 'Income_and_Expense_Detail_Base_by_Account.xlsx')
-smifIncome = pd.read_excel(filepath)
+transactionpath = os.path.join(dirpath, 'Investment_Transaction_Detail_-_Customizable.xlsx')
+incomepath = os.path.join(dirpath, 'Income_and_Expense_Detail_Base_by_Account.xlsx')
+# parsed once per file version, then read from the ingestion cache
+smifReport, smifIncome = load_brokerage_files(transactionpath, incomepath, parallel=False)
 
 # then, preprocess and parse the income report
 def emptyStr(x): return(str(x).strip()!='')
@@ -196,7 +198,6 @@ def alphaBeta(portMkts, startDate='2014-01-01', endDate=None) :
     n=len(portMkts)
     df_close = pd.DataFrame()
     df_rtn = pd.DataFrame()
-    df_abe = pd.DataFrame()
 
     for i in range(n):
         df_close[portMkts[i]],df_rtn[portMkts[i]],*_ = importYahooData(portMkts[i], startDate)
@@ -205,13 +206,9 @@ def alphaBeta(portMkts, startDate='2014-01-01', endDate=None) :
 
     ## the last ticker symbol in portMkts is asusmed to be the benchmark ##
     benCol = portMkts[n-1]
-    x = df_wRtn[benCol]
-    x = sm.add_constant(x)
-    for i in range(n-1):
-        col= portMkts[i]
-        y = df_wRtn[col]
-        reg = sm.OLS(y, x).fit()
-        df_abe[col]=[reg.params['const'],reg.params[benCol],reg.tvalues['const'],reg.pvalues['const'],reg.mse_resid]
+    # one batched OLS of every market on the benchmark
+    reg = batch_ols(df_wRtn[portMkts[:n-1]], df_wRtn[benCol])
+    df_abe = reg[['alpha','beta','t_alpha','p_alpha','mse_resid']].T
     return df_abe
 
 ## make sure that the last ticker symbol in Mkts be the benchmark
@@ -232,25 +229,6 @@ activeWts = wts[activeMkts].copy()
 activeWts = activeWts.divide(activeWts.sum(axis=1), axis=0)
 
 mktRtn = df_rtn[activeMkts]
-curPsn = pd.DataFrame(np.repeat(activeWts.tail(1).values,mktRtn.shape[0],axis=0),columns=activeMkts,index=mktRtn.index)
-simulatedPsnRtns = mktRtn * curPsn
-
-portrisk = simulatedPsnRtns.sum(axis=1).std()*np.sqrt(252)
-wtdVol = activeWts.tail(1).values.tolist()[0]*mktRtn.std()*np.sqrt(252)
-
-riskReport = pd.DataFrame(columns=['Weight','Vol','wtdVol','Corr','MRC','Beta','riskBudget','riskImpact','sumWtdVol','DV'],index=activeMkts)
-riskReport['Weight']=activeWts.tail(1).values.tolist()[0]
-riskReport['Vol']=mktRtn.std()*np.sqrt(252)
-riskReport['wtdVol']=wtdVol
-riskReport['Corr']=mktRtn.corrwith(simulatedPsnRtns.sum(axis=1))
-riskReport['MRC']=riskReport['Vol'] * riskReport['Corr']
-riskReport['Beta']=riskReport['MRC'] / portrisk
-riskReport['riskBudget']=riskReport['Beta'] * activeWts.tail(1).values.tolist()[0]
-riskReport['riskImpact']=riskReport['MRC'] * activeWts.tail(1).values.tolist()[0]
-
-new_row = pd.DataFrame({'Weight': 1, 'Vol': portrisk, 'wtdVol': portrisk, 'Corr': 1,
-           'MRC': portrisk, 'Beta': 1, 'riskBudget': 1, 'riskImpact': portrisk, 'sumWtdVol': sum(wtdVol),
-           'DV': sum(wtdVol) - portrisk},index=['activeP'])
-
-riskReport = pd.concat([riskReport,new_row])
+# closed-form risk budget at the latest weights, from the covariance of the active markets
+riskReport = risk_decomposition(mktRtn.cov(), activeWts.iloc[-1])
 riskReport.to_csv('SMIF Active Risk Decomposition and Risk Budget.csv',float_format="%.6f")
@@ -0,0 +1,648 @@
+"""
+Analytics Module for SMIF Dashboard
+Vectorized portfolio statistics shared by the dashboard and the reporting scripts
+"""
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+
+def batch_ols(returns: pd.DataFrame, benchmark: pd.Series, min_obs: int = 3) -> pd.DataFrame:
+    """
+    Regress every column of a returns panel on one benchmark in a single pass.
+
+    Each column is fitted as returns = alpha + beta * benchmark + e using the
+    rows where both that column and the benchmark are present (pairwise
+    deletion), so a short-history ticker does not shorten the sample of the
+    others. Columns with fewer than min_obs such rows get NaN statistics.
+
+    Args:
+        returns: Returns panel, one column per asset
+        benchmark: Benchmark returns, aligned to returns on the index
+        min_obs: Minimum number of observations for a column to be fitted
+
+    Returns:
+        DataFrame: One row per column with alpha, beta, t_alpha, t_beta,
+                   p_alpha, p_beta, mse (SSR/n), mse_resid (SSR/(n-2)),
+                   r2 and nobs
+    """
+    y = returns.to_numpy(dtype=float)
+    x = benchmark.reindex(returns.index).to_numpy(dtype=float)[:, None]
+
+    mask = np.isfinite(y) & np.isfinite(x)
+    n = mask.sum(axis=0).astype(float)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        xz = np.where(mask, x, 0.0)
+        yz = np.where(mask, y, 0.0)
+        x_bar = xz.sum(axis=0) / n
+        y_bar = yz.sum(axis=0) / n
+
+        dx = np.where(mask, xz - x_bar, 0.0)
+        dy = np.where(mask, yz - y_bar, 0.0)
+        sxx = (dx * dx).sum(axis=0)
+        sxy = (dx * dy).sum(axis=0)
+        syy = (dy * dy).sum(axis=0)
+
+        beta = sxy / sxx
+        alpha = y_bar - beta * x_bar
+        resid = dy - beta * dx
+        ssr = (resid * resid).sum(axis=0)
+
+        dof = n - 2
+        mse_resid = ssr / dof
+        se_beta = np.sqrt(mse_resid / sxx)
+        se_alpha = np.sqrt(mse_resid * (1.0 / n + x_bar ** 2 / sxx))
+        t_alpha = alpha / se_alpha
+        t_beta = beta / se_beta
+        r2 = 1.0 - ssr / syy
+
+    p_alpha = 2 * stats.t.sf(np.abs(t_alpha), dof)
+    p_beta = 2 * stats.t.sf(np.abs(t_beta), dof)
+
+    result = pd.DataFrame({
+        'alpha': alpha,
+        'beta': beta,
+        't_alpha': t_alpha,
+        't_beta': t_beta,
+        'p_alpha': p_alpha,
+        'p_beta': p_beta,
+        'mse': ssr / n,
+        'mse_resid': mse_resid,
+        'r2': r2,
+        'nobs': n.astype(int),
+    }, index=returns.columns)
+
+    # Not enough data (or a constant benchmark) to identify the regression
+    invalid = (n < max(min_obs, 3)) | ~(sxx > 0)
+    result.loc[invalid, result.columns.drop('nobs')] = np.nan
+    return result
+
+
+# Trailing windows in trading days: one month, one quarter, one year
+ROLLING_WINDOWS = (21, 63, 252)
+PERF_STATS = ['AnnRtn', 'AnnStd', 'Sharpe', 'MDD']
+
+
+def _window_blocks(values: np.ndarray, window: int) -> np.ndarray:
+    """Pad rows to a multiple of window and reshape to (blocks, window, columns)."""
+    n, k = values.shape
+    pad = -n % window
+    if pad:
+        values = np.vstack([values, np.full((pad, k), np.nan)])
+    return values.reshape(-1, window, k)
+
+
+def _rolling_max_drawdown(log_wealth: np.ndarray, window: int) -> np.ndarray:
+    """
+    Deepest log drawdown inside every trailing window of a log wealth path.
+
+    The rows are cut into blocks of length window, so each window is a
+    suffix of one block followed by a prefix of the next. Running
+    maxima/minima and drawdowns of those prefixes and suffixes are
+    accumulated per block; a window's drawdown is then the larger of the
+    drawdown inside its suffix, inside its prefix, and from the suffix peak
+    to the prefix trough. Each row is touched a constant number of times,
+    the same O(n) bound as a monotonic-deque sliding maximum but without a
+    per-column Python loop.
+    """
+    n, k = log_wealth.shape
+    blocks = _window_blocks(log_wealth, window)
+    reverse = blocks[:, ::-1]
+
+    # Prefix running peak/trough/drawdown, block start -> row
+    pre_max = np.fmax.accumulate(blocks, axis=1)
+    pre_min = np.fmin.accumulate(blocks, axis=1)
+    pre_dd = np.fmax.accumulate(pre_max - blocks, axis=1)
+
+    # Suffix running peak/drawdown, row -> block end
+    suf_max = np.fmax.accumulate(reverse, axis=1)[:, ::-1]
+    suf_min = np.fmin.accumulate(reverse, axis=1)
+    suf_dd = np.fmax.accumulate(reverse - suf_min, axis=1)[:, ::-1]
+
+    pre_max, pre_min, pre_dd, suf_max, suf_dd = (
+        a.reshape(-1, k)[:n] for a in (pre_max, pre_min, pre_dd, suf_max, suf_dd)
+    )
+
+    # The first window - 1 windows are cut short by the start of the data,
+    # so they cover the first block's prefix
+    result = np.full((n, k), np.nan)
+    head = min(window - 1, n)
+    result[:head] = pre_dd[:head]
+    if n < window:
+        return result
+
+    end = np.arange(window - 1, n)
+    start = end - window + 1
+    aligned = (start % window) == 0
+    with np.errstate(invalid='ignore'):
+        # Window exactly covers one block: its prefix drawdown at the last row
+        result[end[aligned]] = pre_dd[end[aligned]]
+        # Window straddles two blocks
+        s, e = start[~aligned], end[~aligned]
+        result[e] = np.fmax(np.fmax(suf_dd[s], pre_dd[e]), suf_max[s] - pre_min[e])
+    return result
+
+
+def rolling_max_drawdown(returns: pd.DataFrame, window: int) -> pd.DataFrame:
+    """
+    Maximum drawdown over every trailing window of a returns panel.
+
+    Matches the MDD of calcPerfStats on each window's slice of rows (the
+    peak is taken from the window's first close, not the close before it),
+    in O(n) per column rather than O(n * window). Missing days are skipped
+    as in calcPerfStats, so a window starting on one peaks at its first
+    valid close; the first window - 1 rows cover the shorter windows from
+    the first row.
+
+    Args:
+        returns: Daily returns, one column per asset
+        window: Window length in rows
+
+    Returns:
+        DataFrame: Drawdowns (<= 0) aligned to returns
+    """
+    r = returns.to_numpy(dtype=float)
+    valid = np.isfinite(r)
+    log_wealth = np.where(valid, np.log1p(np.where(valid, r, 0.0)).cumsum(axis=0), np.nan)
+    mdd = np.expm1(-_rolling_max_drawdown(log_wealth, window))
+    return pd.DataFrame(mdd, index=returns.index, columns=returns.columns)
+
+
+def rolling_perf_stats(returns: pd.DataFrame, window: int, scale: int = 252,
+                       min_periods: int = None) -> pd.DataFrame:
+    """
+    AnnRtn, AnnStd, Sharpe and MDD over every trailing window, for all columns at once.
+
+    Each row equals calcPerfStats on the window of rows ending there; windows
+    with fewer than min_periods non-missing returns (default: a full window)
+    are NaN.
+
+    Args:
+        returns: Daily returns, one column per asset
+        window: Window length in rows
+        scale: Periods per year used to annualize
+        min_periods: Minimum observations for a window to be reported
+
+    Returns:
+        DataFrame: Columns are a (stat, asset) MultiIndex, stats as in calcPerfStats
+    """
+    min_periods = window if min_periods is None else min_periods
+    log_growth = np.log1p(returns.fillna(0.0))
+    count = returns.notna().rolling(window, min_periods=1).sum()
+    periods = np.minimum(np.arange(1, len(returns) + 1), window)[:, None]
+
+    ann_rtn = np.expm1(log_growth.rolling(window, min_periods=1).sum() * scale / periods)
+    ann_std = returns.rolling(window, min_periods=min(min_periods, 2)).std() * np.sqrt(scale)
+    stats_by_name = {
+        'AnnRtn': ann_rtn,
+        'AnnStd': ann_std,
+        'Sharpe': ann_rtn / ann_std,
+        'MDD': rolling_max_drawdown(returns, window),
+    }
+    result = pd.concat(stats_by_name, axis=1, names=['stat', None])
+    insufficient = np.tile((count < min_periods).to_numpy(), len(PERF_STATS))
+    return result.mask(insufficient)
+
+
+def expanding_perf_stats(returns: pd.DataFrame, scale: int = 252,
+                         min_periods: int = 2) -> pd.DataFrame:
+    """
+    AnnRtn, AnnStd, Sharpe and MDD from the first row to every row, for all columns at once.
+
+    Each row equals calcPerfStats on all rows up to and including it.
+
+    Returns:
+        DataFrame: Columns are a (stat, asset) MultiIndex, stats as in calcPerfStats
+    """
+    periods = np.arange(1, len(returns) + 1)[:, None]
+    nav = (1 + returns).cumprod()
+
+    ann_rtn = np.expm1(np.log1p(returns.fillna(0.0)).cumsum() * scale / periods)
+    ann_std = returns.expanding(min_periods=2).std() * np.sqrt(scale)
+    stats_by_name = {
+        'AnnRtn': ann_rtn,
+        'AnnStd': ann_std,
+        'Sharpe': ann_rtn / ann_std,
+        # A missing day keeps the drawdown so far, as calcPerfStats skips it
+        'MDD': (nav / nav.cummax() - 1).cummin().ffill(),
+    }
+    result = pd.concat(stats_by_name, axis=1, names=['stat', None])
+    insufficient = np.tile((returns.notna().cumsum() < min_periods).to_numpy(), len(PERF_STATS))
+    return result.mask(insufficient)
+
+
+def perf_stats_panel(returns: pd.DataFrame, windows=ROLLING_WINDOWS,
+                     scale: int = 252) -> dict:
+    """
+    Rolling statistics for each window plus the expanding (since-start) statistics.
+
+    Returns:
+        dict: {window: rolling_perf_stats frame, ..., 'expanding': expanding_perf_stats frame}
+    """
+    panel = {window: rolling_perf_stats(returns, window, scale) for window in windows}
+    panel['expanding'] = expanding_perf_stats(returns, scale)
+    return panel
+
+
+HOLDING_STATS = ['AnnRtn', 'AnnStd', 'Sharpe', 'MDD', 'Beta', 'TrackingError']
+
+
+def _column_stats(r: np.ndarray, periods, scale: int = 252):
+    """
+    AnnRtn, AnnStd and MDD of each column of a returns array, as calcPerfStats.
+
+    Missing returns are skipped; AnnRtn is annualized over periods rows (a
+    scalar or one count per column).
+    """
+    valid = np.isfinite(r)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_growth = np.where(valid, np.log1p(r), 0.0)
+        ann_rtn = np.expm1(log_growth.sum(axis=0) * scale / periods)
+
+        count = valid.sum(axis=0)
+        mean = np.where(valid, r, 0.0).sum(axis=0) / count
+        ann_std = np.sqrt((np.where(valid, r - mean, 0.0) ** 2).sum(axis=0) / (count - 1) * scale)
+        ann_std[count < 2] = np.nan
+
+        # Running peak of the NAV, skipping missing days as calcPerfStats does
+        nav = np.where(valid, np.exp(np.cumsum(log_growth, axis=0)), np.nan)
+        peak = np.fmax.accumulate(nav, axis=0)
+        mdd = np.fmin.reduce(nav / peak - 1, axis=0)
+    return ann_rtn, ann_std, mdd
+
+
+def holding_stats(returns: pd.DataFrame, benchmark: str = 'VTI', scale: int = 252) -> pd.DataFrame:
+    """
+    Whole-period statistics for every column of a returns panel in one pass.
+
+    AnnRtn, AnnStd, Sharpe and MDD follow calcPerfStats (missing returns are
+    skipped, the return is annualized over all rows). Beta comes from
+    batch_ols and TrackingError is the annualized standard deviation of the
+    return in excess of the benchmark, both over the rows where the column
+    and the benchmark are present.
+
+    Args:
+        returns: Daily returns, one column per asset, including the benchmark
+        benchmark: Benchmark column
+        scale: Periods per year used to annualize
+
+    Returns:
+        DataFrame: One row per column with the HOLDING_STATS columns
+    """
+    r = returns.to_numpy(dtype=float)
+    n = len(returns.index)
+    ann_rtn, ann_std, mdd = _column_stats(r, n, scale)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bench = returns[benchmark].to_numpy(dtype=float)[:, None] if benchmark in returns.columns \
+            else np.full((n, 1), np.nan)
+        active = r - bench
+        active_valid = np.isfinite(active)
+        active_count = active_valid.sum(axis=0)
+        active_mean = np.where(active_valid, active, 0.0).sum(axis=0) / active_count
+        active_var = (np.where(active_valid, active - active_mean, 0.0) ** 2).sum(axis=0) / (active_count - 1)
+        tracking_error = np.sqrt(active_var * scale)
+        tracking_error[active_count < 2] = np.nan
+
+    result = pd.DataFrame({
+        'AnnRtn': ann_rtn,
+        'AnnStd': ann_std,
+        'Sharpe': ann_rtn / ann_std,
+        'MDD': mdd,
+        'Beta': np.nan,
+        'TrackingError': tracking_error,
+    }, index=returns.columns)
+    if benchmark in returns.columns:
+        result['Beta'] = batch_ols(returns, returns[benchmark])['beta']
+    return result
+
+
+def holding_stats_by_period(periods: dict, benchmark: str = 'VTI', scale: int = 252) -> pd.DataFrame:
+    """
+    holding_stats for several analysis periods, stacked into one table.
+
+    Args:
+        periods: {period label: returns frame}
+        benchmark: Benchmark column
+        scale: Periods per year used to annualize
+
+    Returns:
+        DataFrame: Indexed by (period, column) with the HOLDING_STATS columns
+    """
+    frames = {label: holding_stats(returns, benchmark, scale)
+              for label, returns in periods.items() if returns is not None and not returns.empty}
+    if not frames:
+        return pd.DataFrame(columns=HOLDING_STATS)
+    return pd.concat(frames, names=['period', None])
+
+
+RISK_REPORT_COLUMNS = ['Weight', 'Vol', 'wtdVol', 'Corr', 'MRC', 'Beta', 'riskBudget', 'riskImpact', 'sumWtdVol', 'DV']
+
+
+def risk_decomposition(cov: pd.DataFrame, weights: pd.Series, scale: int = 252,
+                       total_label: str = 'activeP') -> pd.DataFrame:
+    """
+    Risk budget of a portfolio held at fixed weights, in closed form from a covariance matrix.
+
+    With annualized covariance S and weights w, portfolio risk is
+    sqrt(w'Sw) and each asset's marginal risk contribution is (Sw)_i / risk,
+    which equals Vol * Corr with the portfolio; no weighted return history is
+    materialized.
+
+    Args:
+        cov: Covariance matrix of per-period returns
+        weights: Portfolio weights, indexed like cov
+        scale: Periods per year used to annualize
+        total_label: Index of the portfolio total row
+
+    Returns:
+        DataFrame: One row per asset plus the total row, with the
+                   RISK_REPORT_COLUMNS of the weekly risk budget report
+    """
+    assets = weights.index
+    sigma = cov.loc[assets, assets].to_numpy(dtype=float) * scale
+    w = weights.to_numpy(dtype=float)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sigma_w = sigma @ w
+        port_risk = np.sqrt(w @ sigma_w)
+        vol = np.sqrt(np.diag(sigma))
+        mrc = sigma_w / port_risk
+        beta = mrc / port_risk
+
+        report = pd.DataFrame({
+            'Weight': w,
+            'Vol': vol,
+            'wtdVol': w * vol,
+            'Corr': mrc / vol,
+            'MRC': mrc,
+            'Beta': beta,
+            'riskBudget': beta * w,
+            'riskImpact': mrc * w,
+            'sumWtdVol': np.nan,
+            'DV': np.nan,
+        }, index=assets)
+
+    sum_wtd_vol = report['wtdVol'].sum()
+    report.loc[total_label] = {
+        'Weight': 1, 'Vol': port_risk, 'wtdVol': port_risk, 'Corr': 1,
+        'MRC': port_risk, 'Beta': 1, 'riskBudget': 1, 'riskImpact': port_risk,
+        'sumWtdVol': sum_wtd_vol, 'DV': sum_wtd_vol - port_risk,
+    }
+    return report
+
+
+def active_weights(weights: pd.Series, benchmark: str = 'VTI') -> pd.Series:
+    """Held positions other than the benchmark, rescaled to sum to one."""
+    active = weights[(weights != 0) & weights.notna()].drop(benchmark, errors='ignore')
+    return active / active.sum()
+
+
+def active_covariance(returns: pd.DataFrame, assets) -> pd.DataFrame:
+    """Covariance of the given assets over the rows where all of them have returns."""
+    return returns[list(assets)].dropna().cov()
+
+
+class RangeAnalyzer:
+    """
+    Performance statistics for any [start, end] window from arrays precomputed once.
+
+    Prefix sums of log growth, returns and squared returns give each window's
+    AnnRtn, AnnStd and Sharpe in O(1); sparse tables of the log NAV's running
+    max, min and drawdown over power-of-two spans give its MDD in O(1). The
+    portfolio summary's Cost and Cash columns are kept as prefix sums too, so
+    a window's dollar NAV and flows need no cumulative sums from its start.
+    Statistics match calcPerfStats on returns.loc[start:end].
+    """
+
+    def __init__(self, returns: pd.DataFrame, summary: pd.DataFrame = None, scale: int = 252):
+        """
+        Args:
+            returns: Daily returns, one column per asset (e.g. results['returns'])
+            summary: Portfolio summary with MktValue, Cost and Cash columns
+            scale: Periods per year used to annualize
+        """
+        self.index = returns.index
+        self.columns = returns.columns
+        self.scale = scale
+
+        r = returns.to_numpy(dtype=float)
+        valid = np.isfinite(r)
+        k = r.shape[1]
+        zeros = np.zeros((1, k))
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            log_growth = np.where(valid, np.log1p(r), 0.0)
+            self._log_prefix = np.vstack([zeros, np.cumsum(log_growth, axis=0)])
+            self._count_prefix = np.vstack([zeros, np.cumsum(valid, axis=0)])
+
+            # Centre on the full-period mean so the variance does not lose precision
+            self._center = np.where(valid, r, 0.0).sum(axis=0) / np.maximum(valid.sum(axis=0), 1)
+            centered = np.where(valid, r - self._center, 0.0)
+            self._sum_prefix = np.vstack([zeros, np.cumsum(centered, axis=0)])
+            self._sq_prefix = np.vstack([zeros, np.cumsum(centered ** 2, axis=0)])
+
+            # Sparse tables over the log NAV; missing days are skipped like in calcPerfStats
+            level = np.where(valid, self._log_prefix[1:], np.nan)
+            self._max = [level]
+            self._min = [level]
+            self._dd = [np.where(valid, 0.0, np.nan)]
+            span = 1
+            while 2 * span <= len(level):
+                mx, mn, dd = self._max[-1], self._min[-1], self._dd[-1]
+                self._max.append(np.fmax(mx[:-span], mx[span:]))
+                self._min.append(np.fmin(mn[:-span], mn[span:]))
+                self._dd.append(np.fmax(np.fmax(dd[:-span], dd[span:]), mx[:-span] - mn[span:]))
+                span *= 2
+
+        self._summary = None
+        if summary is not None and not summary.empty:
+            self._summary = summary
+            self._mkt_value = summary['MktValue'].to_numpy(dtype=float)
+            self._cost_prefix = np.concatenate([[0.0], np.cumsum(summary['Cost'].fillna(0).to_numpy(dtype=float))])
+            self._cash_prefix = np.concatenate([[0.0], np.cumsum(summary['Cash'].fillna(0).to_numpy(dtype=float))])
+
+    @staticmethod
+    def _rows(index: pd.DatetimeIndex, start, end):
+        """Positions [i, j) of the rows dated from start to end inclusive."""
+        i = 0 if start is None else index.searchsorted(pd.Timestamp(start), side='left')
+        j = len(index) if end is None else index.searchsorted(pd.Timestamp(end), side='right')
+        return i, max(i, j)
+
+    def _range_max(self, table, i, j, reduce):
+        """max/min of a level over rows [i, j) from two overlapping power-of-two spans."""
+        level = int(np.log2(j - i))
+        return reduce(table[level][i], table[level][j - 2 ** level])
+
+    def _max_drawdown(self, i, j):
+        """Deepest log drawdown over rows [i, j)."""
+        level = int(np.log2(j - i))
+        span = 2 ** level
+        head, tail = i, j - span
+        dd = np.fmax(self._dd[level][head], self._dd[level][tail])
+        if tail > head:
+            # Peak before the tail span to a trough after the head span
+            peak = self._range_max(self._max, head, tail, np.fmax)
+            trough = self._range_max(self._min, head + span, j, np.fmin)
+            dd = np.fmax(dd, peak - trough)
+        return dd
+
+    def stats(self, start=None, end=None) -> pd.DataFrame:
+        """
+        AnnRtn, AnnStd, Sharpe and MDD for the rows dated from start to end inclusive.
+
+        Returns:
+            DataFrame: Same layout as calcPerfStats (stats as rows, assets as columns)
+        """
+        i, j = self._rows(self.index, start, end)
+        n = j - i
+        if n == 0:
+            return pd.DataFrame(np.nan, index=PERF_STATS, columns=self.columns)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            count = self._count_prefix[j] - self._count_prefix[i]
+            ann_rtn = np.expm1((self._log_prefix[j] - self._log_prefix[i]) * self.scale / n)
+            total = self._sum_prefix[j] - self._sum_prefix[i]
+            var = (self._sq_prefix[j] - self._sq_prefix[i] - total * total / count) / (count - 1)
+            ann_std = np.sqrt(np.maximum(var, 0.0) * self.scale)
+            ann_std[count < 2] = np.nan
+            mdd = np.expm1(-self._max_drawdown(i, j))
+
+        return pd.DataFrame([ann_rtn, ann_std, ann_rtn / ann_std, mdd],
+                            index=PERF_STATS, columns=self.columns)
+
+    def nav(self, start=None, end=None) -> pd.DataFrame:
+        """Growth of $1 over the window, as (1 + returns.loc[start:end]).cumprod()."""
+        i, j = self._rows(self.index, start, end)
+        growth = np.exp(self._log_prefix[i + 1:j + 1] - self._log_prefix[i])
+        valid = (self._count_prefix[i + 1:j + 1] - self._count_prefix[i:j]) > 0
+        return pd.DataFrame(np.where(valid, growth, np.nan), index=self.index[i:j], columns=self.columns)
+
+    def drawdown(self, start=None, end=None) -> pd.DataFrame:
+        """Drawdown from the running peak of the window's NAV."""
+        nav = self.nav(start, end)
+        return nav / nav.cummax() - 1
+
+    def portfolio_value(self, start=None, end=None, initial_value=None) -> pd.Series:
+        """
+        Dollar NAV over the window, as calculate_portfolio_nav from start.
+
+        Market value plus the trade cost and income accumulated since start,
+        shifted so the first day equals initial_value (the day's own value if None).
+        """
+        if self._summary is None:
+            return pd.Series(dtype=float)
+        i, j = self._rows(self._summary.index, start, end)
+        value = (self._mkt_value[i:j]
+                 + self._cost_prefix[i + 1:j + 1] - self._cost_prefix[i]
+                 + self._cash_prefix[i + 1:j + 1] - self._cash_prefix[i])
+        if initial_value is not None and len(value):
+            value = value + (initial_value - value[0])
+        return pd.Series(value, index=self._summary.index[i:j], name='NAV')
+
+    def flows(self, start=None, end=None) -> dict:
+        """Total trade cost and income booked over the window."""
+        if self._summary is None:
+            return {'Cost': np.nan, 'Cash': np.nan}
+        i, j = self._rows(self._summary.index, start, end)
+        return {
+            'Cost': self._cost_prefix[j] - self._cost_prefix[i],
+            'Cash': self._cash_prefix[j] - self._cash_prefix[i],
+        }
+
+
+def cohort_performance(summary: pd.DataFrame, benchmark_returns: pd.Series, cohorts: list,
+                       benchmark: str = 'VTI', scale: int = 252) -> dict:
+    """
+    NAV, returns and statistics of every class cohort in one pass over the portfolio summary.
+
+    Each cohort is a dict with 'semester', 'start_date', 'end_date' (None or ''
+    for the latest date) and 'initial_value'. A cohort's NAV is the
+    inception-level value MktValue + cumulative Cost + cumulative Cash shifted
+    so it starts at the cohort's initial value (as calculate_portfolio_nav),
+    so all cohorts come from one array broadcast against a vector of start
+    offsets. Returns and statistics follow the class period of
+    process_smif_data: the start is moved to the first available date on or
+    after it, and returns are measured from the day after the start.
+
+    Args:
+        summary: Inception portfolio summary with MktValue, Cost and Cash columns
+        benchmark_returns: Daily benchmark returns
+        cohorts: Cohort definitions
+        benchmark: Benchmark name used in the statistic labels
+        scale: Periods per year used to annualize
+
+    Returns:
+        dict: 'table' (one row per cohort: dates, values, total return and
+              AnnRtn/AnnStd/Sharpe/MDD for the fund and the benchmark),
+              'nav' (dollar NAV by date, one column per cohort, NaN outside
+              the cohort) and 'growth' (fund growth of $1 by trading day
+              since the cohort start)
+    """
+    dates = summary.index
+    labels = [cohort['semester'] for cohort in cohorts]
+    if len(dates) == 0 or not cohorts:
+        return {'table': pd.DataFrame(index=labels), 'nav': pd.DataFrame(columns=labels),
+                'growth': pd.DataFrame(columns=labels)}
+
+    level = (summary['MktValue'] + summary['Cost'].cumsum() + summary['Cash'].cumsum()).to_numpy(dtype=float)
+    last = len(dates) - 1
+    start = np.array([min(dates.searchsorted(pd.Timestamp(cohort['start_date'])), last) for cohort in cohorts])
+    end = np.array([last if not cohort.get('end_date') else
+                    dates.searchsorted(pd.Timestamp(cohort['end_date']), side='right') - 1
+                    for cohort in cohorts])
+    end = np.maximum(end, start)
+    initial_value = np.array([float(cohort['initial_value']) for cohort in cohorts])
+
+    rows = np.arange(len(dates))[:, None]
+    in_cohort = (rows >= start) & (rows <= end)
+    nav = np.where(in_cohort, level[:, None] + (initial_value - level[start]), np.nan)
+
+    # Returns from the day after each cohort's start
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fund = np.vstack([np.full((1, len(cohorts)), np.nan), nav[1:] / nav[:-1] - 1])
+    has_return = in_cohort & (rows > start)
+    fund = np.where(has_return, fund, np.nan)
+    bench = benchmark_returns.reindex(dates).fillna(0.0).to_numpy(dtype=float)[:, None]
+    bench = np.where(has_return, bench, np.nan)
+
+    # Fund and benchmark columns of every cohort go through one set of reductions
+    k = len(cohorts)
+    combined = np.hstack([fund, bench])
+    periods = has_return.sum(axis=0)
+    ann_rtn, ann_std, mdd = _column_stats(combined, np.concatenate([periods, periods]), scale)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_growth = np.where(np.isfinite(combined), np.log1p(combined), 0.0)
+        total = np.expm1(log_growth.sum(axis=0))
+        sharpe = ann_rtn / ann_std
+
+    table = pd.DataFrame({
+        'Start': dates[start],
+        'End': dates[end],
+        'Days': periods,
+        'InitialValue': initial_value,
+        'EndValue': nav[end, np.arange(k)],
+        'SMIF TotalRtn': total[:k],
+        f'{benchmark} TotalRtn': total[k:],
+        'SMIF AnnRtn': ann_rtn[:k],
+        'SMIF AnnStd': ann_std[:k],
+        'SMIF Sharpe': sharpe[:k],
+        'SMIF MDD': mdd[:k],
+        f'{benchmark} AnnRtn': ann_rtn[k:],
+        f'{benchmark} AnnStd': ann_std[k:],
+        f'{benchmark} Sharpe': sharpe[k:],
+        f'{benchmark} MDD': mdd[k:],
+    }, index=pd.Index(labels, name='Semester'))
+
+    # Growth of $1 realigned to trading days since each start
+    day = np.arange(int((end - start).max()) + 1)[:, None]
+    take = np.minimum(start + day, last)
+    cumulative = np.exp(np.cumsum(log_growth[:, :k], axis=0))
+    growth = np.where(day <= end - start, np.take_along_axis(cumulative, take, axis=0) / cumulative[start, np.arange(k)], np.nan)
+
+    return {
+        'table': table,
+        'nav': pd.DataFrame(nav, index=dates, columns=labels),
+        'growth': pd.DataFrame(growth, index=pd.Index(day[:, 0], name='Trading Day'), columns=labels),
+    }
@@ -4,11 +4,12 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime
+from ingestion import load_workbook
 
 # Read the transaction file
 print("=== Analyzing Investment Transaction File ===")
 transaction_file = "data/Investment_Transaction_Detail_-_Customizable.xlsx"
-df_trans = pd.read_excel(transaction_file)
+df_trans = load_workbook(transaction_file)
 
 print(f"Shape: {df_trans.shape}")
 print(f"\nColumns: {list(df_trans.columns)}")
@@ -46,7 +47,7 @@ print("\n" + "="*50 + "\n")
 # Read the income file
 print("=== Analyzing Income and Expense File ===")
 income_file = "data/Income_and_Expense_Detail_Base_by_Account.xlsx"
-df_income = pd.read_excel(income_file)
+df_income = load_workbook(income_file)
 
 print(f"Shape: {df_income.shape}")
 print(f"\nColumns: {list(df_income.columns)}")
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Benchmark Excel workbook export: write-only path vs the pandas cell-by-cell writer"""
+
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_exporter import SMIFDataExporter
+
+# Inception-to-date sized data for a wide portfolio
+NUM_DAYS = 2500
+NUM_TICKERS = 60
+
+def make_results(num_days=NUM_DAYS, num_tickers=NUM_TICKERS):
+    """Synthetic results shaped like process_smif_data output"""
+    rng = np.random.default_rng(0)
+    dates = pd.date_range('2015-01-01', periods=num_days, freq='B')
+    tickers = [f"T{i:03d}" for i in range(num_tickers)]
+    
+    returns = pd.DataFrame(rng.normal(0, 0.01, (num_days, num_tickers + 2)), index=dates, columns=tickers + ['SMIF', 'VTI'])
+    positions = pd.DataFrame(rng.integers(0, 500, (num_days, num_tickers)).astype(float), index=dates, columns=tickers)
+    market_values = positions * rng.uniform(10, 500, num_tickers)
+    weights = market_values.div(market_values.sum(axis=1), axis=0)
+    summary = pd.DataFrame({
+        'Total_MV': market_values.sum(axis=1),
+        'Cash': rng.uniform(0, 1e4, num_days),
+    }, index=dates)
+    return {
+        'returns': returns,
+        'nav': (1 + returns[['SMIF', 'VTI']]).cumprod() * 100,
+        'positions': positions,
+        'market_values': market_values,
+        'weights': weights,
+        'portfolio_summary': summary,
+        'port_mkts': tickers,
+    }
+
+def run(mode):
+    """Build one workbook and print seconds, peak RSS (MB) and size (MB)"""
+    exporter = SMIFDataExporter(make_results(), {'last_updated': 'benchmark'})
+    start = time.perf_counter()
+    output = exporter.to_excel_workbook(write_only=(mode == 'write_only'))
+    elapsed = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{elapsed:.2f} {peak_rss:.0f} {len(output.getvalue()) / 1e6:.1f}")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        run(sys.argv[1])
+        sys.exit(0)
+    
+    print(f"Excel export of {NUM_DAYS} days x {NUM_TICKERS} tickers\n")
+    print(f"{'Writer':<12}{'Time (s)':>10}{'Peak RSS (MB)':>15}{'Size (MB)':>11}")
+    # Each writer runs in a fresh process so peak RSS is not shared
+    for mode in ['pandas', 'write_only']:
+        out = subprocess.run([sys.executable, __file__, mode], capture_output=True, text=True, check=True)
+        elapsed, peak_rss, size = out.stdout.split()
+        print(f"{mode:<12}{elapsed:>10}{peak_rss:>15}{size:>11}")
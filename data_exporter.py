@@ -9,45 +9,115 @@ import zipfile
 import io
 import os
 from datetime import datetime
+import numpy as np
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 import streamlit as st
 
+# Results frames written to the Excel workbook, in sheet order
+EXCEL_SHEETS = [
+    ('returns', 'Returns'),
+    ('nav', 'NAV'),
+    ('positions', 'Positions'),
+    ('market_values', 'Market_Values'),
+    ('weights', 'Weights'),
+    ('portfolio_summary', 'Portfolio_Summary'),
+]
+EXCEL_DATETIME_FORMAT = 'YYYY-MM-DD HH:MM:SS'
+# Processing bookkeeping kept with the results but never exported
+INTERNAL_RESULT_KEYS = ('ingest_state',)
+
+def _json_default(value):
+    """Encode timestamps as ISO strings and numpy scalars as Python numbers"""
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+def _excel_values(frame):
+    """Frame values as an object array of Excel-writable cells, NaN as blank"""
+    values = frame.to_numpy(dtype=object, copy=True)
+    values[pd.isna(frame).to_numpy()] = None
+    for col, dtype in enumerate(frame.dtypes):
+        if dtype == object:
+            values[:, col] = [v if v is None or isinstance(v, (str, int, float, datetime)) else str(v)
+                              for v in values[:, col]]
+    return values
+
+def _append_frame(worksheet, frame, index=True):
+    """Write a frame to a write-only worksheet, one row per append"""
+    if isinstance(frame, pd.Series):
+        frame = frame.to_frame()
+    
+    header = [str(col) for col in frame.columns]
+    if index:
+        header = [frame.index.name] + header
+    worksheet.append(header)
+    
+    values = _excel_values(frame)
+    if not index:
+        for row in values:
+            worksheet.append(list(row))
+        return
+    
+    # Dates share one number format, assigned once per index cell
+    if isinstance(frame.index, pd.DatetimeIndex):
+        labels = []
+        for ts in frame.index.to_pydatetime():
+            cell = WriteOnlyCell(worksheet, value=ts)
+            cell.number_format = EXCEL_DATETIME_FORMAT
+            labels.append(cell)
+    else:
+        labels = _excel_values(frame.index.to_frame())[:, 0]
+    for label, row in zip(labels, values):
+        worksheet.append([label, *row])
+
 class SMIFDataExporter:
     def __init__(self, results, metadata=None):
         self.results = results
         self.metadata = metadata or {}
+    
+    def _export_items(self):
+        """(key, value) pairs of the results, without internal bookkeeping"""
+        return [(key, self.results[key]) for key in self.results if key not in INTERNAL_RESULT_KEYS]
+    
+    def _excel_sheets(self):
+        """List (sheet name, frame, write index) for each workbook sheet"""
+        sheets = []
+        
+        # Main data sheets
+        for key, sheet_name in EXCEL_SHEETS:
+            if key in self.results:
+                sheets.append((sheet_name, self.results[key], True))
         
-    def to_excel_workbook(self):
-        """Export all data to a comprehensive Excel workbook"""
+        # Metadata sheet
+        sheets.append(('Metadata', pd.DataFrame([self.metadata]), False))
+        
+        # Tickers list
+        if 'port_mkts' in self.results:
+            sheets.append(('Tickers', pd.DataFrame({'Tickers': self.results['port_mkts']}), False))
+        return sheets
+    
+    def to_excel_workbook(self, write_only=True):
+        """
+        Export all data to a comprehensive Excel workbook.
+        write_only streams rows through openpyxl's write-only mode; pass
+        False for the cell-by-cell pandas writer.
+        """
         output = io.BytesIO()
         
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            # Main data sheets
-            if 'returns' in self.results:
-                self.results['returns'].to_excel(writer, sheet_name='Returns', index=True)
-                
-            if 'nav' in self.results:
-                self.results['nav'].to_excel(writer, sheet_name='NAV', index=True)
-                
-            if 'positions' in self.results:
-                self.results['positions'].to_excel(writer, sheet_name='Positions', index=True)
-                
-            if 'market_values' in self.results:
-                self.results['market_values'].to_excel(writer, sheet_name='Market_Values', index=True)
-                
-            if 'weights' in self.results:
-                self.results['weights'].to_excel(writer, sheet_name='Weights', index=True)
-                
-            if 'portfolio_summary' in self.results:
-                self.results['portfolio_summary'].to_excel(writer, sheet_name='Portfolio_Summary', index=True)
-                
-            # Metadata sheet
-            metadata_df = pd.DataFrame([self.metadata])
-            metadata_df.to_excel(writer, sheet_name='Metadata', index=False)
-            
-            # Tickers list
-            if 'port_mkts' in self.results:
-                tickers_df = pd.DataFrame({'Tickers': self.results['port_mkts']})
-                tickers_df.to_excel(writer, sheet_name='Tickers', index=False)
+        if not write_only:
+            with pd.ExcelWriter(output, engine='openpyxl') as writer:
+                for sheet_name, frame, index in self._excel_sheets():
+                    frame.to_excel(writer, sheet_name=sheet_name, index=index)
+            output.seek(0)
+            return output
+        
+        workbook = Workbook(write_only=True)
+        for sheet_name, frame, index in self._excel_sheets():
+            _append_frame(workbook.create_sheet(sheet_name), frame, index)
+        workbook.save(output)
         
         output.seek(0)
         return output
@@ -69,7 +139,7 @@ class SMIFDataExporter:
             # Add metadata as JSON
             if self.metadata:
                 zip_file.writestr('metadata.json', json.dumps(self.metadata, indent=2, default=str))
-                
+            
             # Add tickers list
             if 'port_mkts' in self.results:
                 tickers_csv = '\n'.join(self.results['port_mkts'])
@@ -83,7 +153,7 @@ class SMIFDataExporter:
         export_data = {}
         
         # Convert DataFrames to JSON-serializable format
-        for key, value in self.results.items():
+        for key, value in self._export_items():
             if isinstance(value, pd.DataFrame):
                 export_data[key] = {
                     'data': value.to_dict('records'),
@@ -98,10 +168,39 @@ class SMIFDataExporter:
         
         return json.dumps(export_data, indent=2, default=str)
     
+    def write_json_stream(self, fp):
+        """
+        Stream data as compact JSON to a binary file object.
+        Frames are written one at a time in "split" form with ISO dates.
+        """
+        encoder = json.JSONEncoder(separators=(',', ':'), default=_json_default)
+        
+        fp.write(b'{')
+        first = True
+        for key, value in self._export_items() + [('metadata', self.metadata)]:
+            if not first:
+                fp.write(b',')
+            first = False
+            fp.write(encoder.encode(str(key)).encode('utf-8'))
+            fp.write(b':')
+            if isinstance(value, (pd.DataFrame, pd.Series)):
+                fp.write(value.to_json(orient='split', date_format='iso', double_precision=15).encode('utf-8'))
+            else:
+                for chunk in encoder.iterencode(value):
+                    fp.write(chunk.encode('utf-8'))
+        fp.write(b'}')
+    
+    def to_json_stream(self):
+        """Export data as compact, split-orient JSON (row arrays) without building it in memory first"""
+        json_buffer = io.BytesIO()
+        self.write_json_stream(json_buffer)
+        json_buffer.seek(0)
+        return json_buffer
+    
     def to_pickle_data(self):
         """Export raw Python objects as pickle for Jupyter/Python analysis"""
         export_package = {
-            'results': self.results,
+            'results': dict(self._export_items()),
             'metadata': self.metadata,
             'export_timestamp': datetime.now().isoformat()
         }
@@ -2,65 +2,269 @@
 Data persistence manager for SMIF Dashboard
 Handles saving/loading processed data and metadata
 """
+import hashlib
 import json
 import pickle
 import os
+import shutil
+import tempfile
+import threading
+import uuid
+import weakref
+from collections import OrderedDict
+from collections.abc import Mapping
 from datetime import datetime
+import numpy as np
 import pandas as pd
 import streamlit as st
 
 DATA_DIR = "data"
 METADATA_FILE = os.path.join(DATA_DIR, "metadata.json")
+# One immutable store per saved version; metadata.json names the current one
+RESULTS_VERSIONS_DIR = os.path.join(DATA_DIR, "processed_versions")
+RESULTS_CACHE_DIR = os.path.join(DATA_DIR, "results_cache")
+MAX_CACHED_RESULTS = 5
+# Data versions kept in memory for all sessions at once
+MAX_SHARED_VERSIONS = 2
+MANIFEST_FILE = "manifest.json"
+
+# Legacy stores, still read if no versioned store exists: a single columnar
+# store that was replaced in place, and before that a single pickle
+RESULTS_DIR = os.path.join(DATA_DIR, "processed_results")
 RESULTS_FILE = os.path.join(DATA_DIR, "processed_results.pkl")
 
+# Class-period frames that are date-bounded slices of the inception frames
+CLASS_VIEWS = {
+    'class_positions': 'positions',
+    'class_weights': 'weights',
+    'class_market_values': 'market_values',
+}
+
 def ensure_data_directory():
     """Create data directory if it doesn't exist"""
     if not os.path.exists(DATA_DIR):
         os.makedirs(DATA_DIR)
 
+def _encode_value(value):
+    """Convert a non-frame result value to a JSON-safe form"""
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return {'__timestamp__': pd.Timestamp(value).isoformat()}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return [_encode_value(v) for v in value]
+    return value
+
+def _decode_value(value):
+    """Inverse of _encode_value"""
+    if isinstance(value, dict) and '__timestamp__' in value:
+        return pd.Timestamp(value['__timestamp__'])
+    if isinstance(value, list):
+        return [_decode_value(v) for v in value]
+    return value
+
+def _is_view(results, key, source, start, end):
+    """True if results[key] is exactly source[start:end]"""
+    frame = results.get(key)
+    base = results.get(source)
+    if not isinstance(frame, pd.DataFrame) or not isinstance(base, pd.DataFrame):
+        return False
+    return frame.index.equals(base.loc[start:end].index) and frame.columns.equals(base.columns)
+
+def write_results_store(store_dir, results):
+    """
+    Write results as one Parquet file per frame plus a JSON manifest.
+    Class-period slices of inception frames are stored as date bounds.
+    
+    Stores are immutable once written, since open LazyResults read their
+    frames from them later: if store_dir already exists it is kept and the
+    new copy is discarded.
+    """
+    manifest = {'frames': {}, 'views': {}, 'values': {}}
+    parent_dir = os.path.dirname(store_dir) or '.'
+    os.makedirs(parent_dir, exist_ok=True)
+    # Unique temp dir, so concurrent writers never touch each other's files
+    tmp_dir = tempfile.mkdtemp(dir=parent_dir, prefix=f".{os.path.basename(store_dir)}.", suffix='.tmp')
+    try:
+        _write_store_files(tmp_dir, results, manifest)
+        os.rename(tmp_dir, store_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.exists(os.path.join(store_dir, MANIFEST_FILE)):
+            raise
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+def _write_store_files(tmp_dir, results, manifest):
+    """Write the Parquet files and manifest of a results store into tmp_dir"""
+    start = results.get('class_start_date')
+    end = results.get('class_end_date')
+    
+    for key, value in results.items():
+        if key in CLASS_VIEWS and start is not None and end is not None \
+                and _is_view(results, key, CLASS_VIEWS[key], start, end):
+            manifest['views'][key] = {
+                'source': CLASS_VIEWS[key],
+                'start': pd.Timestamp(start).isoformat(),
+                'end': pd.Timestamp(end).isoformat(),
+            }
+        elif isinstance(value, (pd.DataFrame, pd.Series)):
+            file_name = f"{key}.parquet"
+            if isinstance(value, pd.Series):
+                frame = value.to_frame(name='value')
+                manifest['frames'][key] = {'file': file_name, 'kind': 'series', 'name': value.name}
+            else:
+                frame = value
+                manifest['frames'][key] = {'file': file_name, 'kind': 'frame'}
+            frame.to_parquet(os.path.join(tmp_dir, file_name))
+        else:
+            manifest['values'][key] = _encode_value(value)
+    
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2, default=str)
+
+# Every LazyResults still referenced (e.g. held in SharedResults or being
+# extended); their stores must not be deleted
+_open_stores = weakref.WeakValueDictionary()
+_open_stores_lock = threading.Lock()
+_save_lock = threading.Lock()
+
+def store_in_use(store_dir):
+    """True if a loaded LazyResults may still read frames from store_dir"""
+    store_dir = os.path.abspath(store_dir)
+    with _open_stores_lock:
+        return any(os.path.abspath(results.store_dir) == store_dir for results in list(_open_stores.values()))
+
+def remove_store(store_dir):
+    """Delete a results store unless loaded results still read from it; True if deleted"""
+    if store_in_use(store_dir):
+        return False
+    shutil.rmtree(store_dir, ignore_errors=True)
+    return True
+
+class LazyResults(Mapping):
+    """
+    Read-only results mapping backed by a columnar store.
+    Each frame is read from disk the first time it is accessed.
+    """
+    
+    def __init__(self, store_dir, manifest):
+        self.store_dir = store_dir
+        self._manifest = manifest
+        self._loaded = {}
+        with _open_stores_lock:
+            _open_stores[id(self)] = self
+    
+    def __getitem__(self, key):
+        if key in self._loaded:
+            return self._loaded[key]
+        
+        if key in self._manifest['frames']:
+            entry = self._manifest['frames'][key]
+            frame = pd.read_parquet(os.path.join(self.store_dir, entry['file']))
+            value = frame['value'].rename(entry['name']) if entry['kind'] == 'series' else frame
+        elif key in self._manifest['views']:
+            view = self._manifest['views'][key]
+            value = self[view['source']].loc[pd.Timestamp(view['start']):pd.Timestamp(view['end'])]
+        elif key in self._manifest['values']:
+            value = _decode_value(self._manifest['values'][key])
+        else:
+            raise KeyError(key)
+        
+        self._loaded[key] = value
+        return value
+    
+    def __iter__(self):
+        for section in ('frames', 'views', 'values'):
+            yield from self._manifest[section]
+    
+    def __len__(self):
+        return sum(len(self._manifest[section]) for section in ('frames', 'views', 'values'))
+    
+    def __reduce__(self):
+        # Pickle (e.g. for exports) as a plain, fully loaded dict
+        return (dict, (dict(self.items()),))
+
+def open_results_store(store_dir):
+    """Open a columnar results store, or return None if it doesn't exist"""
+    manifest_path = os.path.join(store_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, 'r') as f:
+        return LazyResults(store_dir, json.load(f))
+
 def save_processed_data(results, upload_info):
-    """Save processed results and metadata"""
+    """Save processed results as a new version and point the metadata at it"""
     ensure_data_directory()
     
-    # Save results
-    with open(RESULTS_FILE, 'wb') as f:
-        pickle.dump(results, f)
-    
-    # Save metadata
-    metadata = {
-        "last_updated": datetime.now().isoformat(),
-        "uploaded_by": upload_info.get("email", "unknown"),
-        "file_info": {
-            "transaction_file": {
-                "name": upload_info.get("transaction_name", "unknown"),
-                "size": upload_info.get("transaction_size", 0)
+    # One save at a time, so pruning never removes a version still being saved
+    with _save_lock:
+        # Save results to their own store; sessions still viewing an older
+        # version keep reading theirs
+        saved_at = datetime.now()
+        store_name = f"{saved_at.strftime('%Y%m%d-%H%M%S-%f')}-{uuid.uuid4().hex[:8]}"
+        write_results_store(os.path.join(RESULTS_VERSIONS_DIR, store_name), results)
+        
+        # Save metadata
+        metadata = {
+            "last_updated": saved_at.isoformat(),
+            "results_store": store_name,
+            "uploaded_by": upload_info.get("email", "unknown"),
+            "file_info": {
+                "transaction_file": {
+                    "name": upload_info.get("transaction_name", "unknown"),
+                    "size": upload_info.get("transaction_size", 0)
+                },
+                "income_file": {
+                    "name": upload_info.get("income_name", "unknown"),
+                    "size": upload_info.get("income_size", 0)
+                }
             },
-            "income_file": {
-                "name": upload_info.get("income_name", "unknown"), 
-                "size": upload_info.get("income_size", 0)
-            }
-        },
-        "portfolio_summary": {
-            "num_positions": len(results.get("port_mkts", [])),
-            "tickers": results.get("port_mkts", []),
-            "date_range": {
-                "start": results.get("portfolio_summary", pd.DataFrame()).index.min().isoformat() if not results.get("portfolio_summary", pd.DataFrame()).empty else None,
-                "end": results.get("portfolio_summary", pd.DataFrame()).index.max().isoformat() if not results.get("portfolio_summary", pd.DataFrame()).empty else None
+            "portfolio_summary": {
+                "num_positions": len(results.get("port_mkts", [])),
+                "tickers": results.get("port_mkts", []),
+                "date_range": {
+                    "start": results.get("portfolio_summary", pd.DataFrame()).index.min().isoformat() if not results.get("portfolio_summary", pd.DataFrame()).empty else None,
+                    "end": results.get("portfolio_summary", pd.DataFrame()).index.max().isoformat() if not results.get("portfolio_summary", pd.DataFrame()).empty else None
+                }
             }
         }
-    }
-    
-    with open(METADATA_FILE, 'w') as f:
-        json.dump(metadata, f, indent=2, default=str)
+        
+        with tempfile.NamedTemporaryFile('w', dir=DATA_DIR, suffix='.tmp', delete=False) as f:
+            json.dump(metadata, f, indent=2, default=str)
+        os.replace(f.name, METADATA_FILE)
+        
+        prune_processed_data(store_name)
+
+def _current_store_dir():
+    """Store directory of the current saved version, or None for the legacy layout"""
+    store_name = (get_metadata() or {}).get('results_store')
+    return os.path.join(RESULTS_VERSIONS_DIR, store_name) if store_name else None
+
+def prune_processed_data(current_store):
+    """Delete older saved versions and legacy stores that no loaded results still read"""
+    if os.path.exists(RESULTS_VERSIONS_DIR):
+        for name in os.listdir(RESULTS_VERSIONS_DIR):
+            if name != current_store and not name.endswith('.tmp'):
+                remove_store(os.path.join(RESULTS_VERSIONS_DIR, name))
+    if os.path.exists(RESULTS_DIR):
+        remove_store(RESULTS_DIR)
+    if os.path.exists(RESULTS_FILE):
+        os.remove(RESULTS_FILE)
 
 def load_processed_data():
     """Load saved processed results"""
-    if not os.path.exists(RESULTS_FILE):
-        return None
-    
     try:
-        with open(RESULTS_FILE, 'rb') as f:
-            return pickle.load(f)
+        store_dir = _current_store_dir()
+        results = open_results_store(store_dir or RESULTS_DIR)
+        if results is not None:
+            return results
+        
+        if os.path.exists(RESULTS_FILE):
+            with open(RESULTS_FILE, 'rb') as f:
+                return pickle.load(f)
+        return None
     except Exception as e:
         st.error(f"Error loading saved data: {str(e)}")
         return None
@@ -79,11 +283,131 @@ def get_metadata():
 
 def data_exists():
     """Check if processed data exists"""
-    return os.path.exists(RESULTS_FILE) and os.path.exists(METADATA_FILE)
+    if not os.path.exists(METADATA_FILE):
+        return False
+    store_dir = _current_store_dir()
+    if store_dir is not None:
+        return os.path.exists(os.path.join(store_dir, MANIFEST_FILE))
+    return os.path.exists(os.path.join(RESULTS_DIR, MANIFEST_FILE)) or os.path.exists(RESULTS_FILE)
 
 def delete_data():
     """Delete all saved data"""
+    if os.path.exists(RESULTS_VERSIONS_DIR):
+        shutil.rmtree(RESULTS_VERSIONS_DIR)
+    if os.path.exists(RESULTS_DIR):
+        shutil.rmtree(RESULTS_DIR)
     if os.path.exists(RESULTS_FILE):
         os.remove(RESULTS_FILE)
     if os.path.exists(METADATA_FILE):
-        os.remove(METADATA_FILE)
\ No newline at end of file
+        os.remove(METADATA_FILE)
+
+def compute_data_hash(transaction_data, income_data, config=None):
+    """Hash the raw file bytes together with the processing configuration"""
+    digest = hashlib.sha256()
+    for data in (transaction_data, income_data):
+        digest.update(len(data).to_bytes(8, 'big'))
+        digest.update(data)
+    digest.update(json.dumps(config or {}, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+def _cached_results_path(data_hash):
+    return os.path.join(RESULTS_CACHE_DIR, data_hash)
+
+def _cached_stores():
+    """Complete stores in the results cache"""
+    if not os.path.exists(RESULTS_CACHE_DIR):
+        return []
+    return [os.path.join(RESULTS_CACHE_DIR, name) for name in os.listdir(RESULTS_CACHE_DIR)
+            if os.path.exists(os.path.join(RESULTS_CACHE_DIR, name, MANIFEST_FILE))]
+
+def _store_time(store_dir, manifest=False):
+    """Last use (directory mtime) or save (manifest mtime) of a store; 0 if it was just removed"""
+    try:
+        return os.path.getmtime(os.path.join(store_dir, MANIFEST_FILE) if manifest else store_dir)
+    except FileNotFoundError:
+        return 0
+
+def save_cached_results(data_hash, results):
+    """Save processed results under their content hash, keeping the most recently used few"""
+    os.makedirs(RESULTS_CACHE_DIR, exist_ok=True)
+    write_results_store(_cached_results_path(data_hash), results)
+    os.utime(_cached_results_path(data_hash))
+    
+    # Drop the least recently used entries beyond the cache limit; stores
+    # that loaded results still read from are skipped until a later save
+    entries = sorted(_cached_stores(), key=_store_time, reverse=True)
+    for stale_path in entries[MAX_CACHED_RESULTS:]:
+        remove_store(stale_path)
+
+def _open_cached_store(store_dir):
+    results = open_results_store(store_dir)
+    if results is not None:
+        # Directory mtime marks the last use, for least-recently-used pruning
+        os.utime(store_dir)
+    return results
+
+def load_cached_results(data_hash):
+    """Load processed results for a content hash, or None on a cache miss"""
+    try:
+        return _open_cached_store(_cached_results_path(data_hash))
+    except Exception as e:
+        st.warning(f"Ignoring unreadable cached results: {str(e)}")
+        return None
+
+def load_latest_cached_results():
+    """Load the most recently saved cached results, or None if the cache is empty"""
+    entries = _cached_stores()
+    if not entries:
+        return None
+    try:
+        return _open_cached_store(max(entries, key=lambda path: _store_time(path, manifest=True)))
+    except Exception as e:
+        st.warning(f"Ignoring unreadable cached results: {str(e)}")
+        return None
+
+def clear_cached_results():
+    """Delete all content-hash cached results"""
+    if os.path.exists(RESULTS_CACHE_DIR):
+        shutil.rmtree(RESULTS_CACHE_DIR)
+
+class SharedResults:
+    """
+    Process-wide processed results, one entry per data version.
+    Sessions keep only the version key, so each version's frames are held
+    once however many users are viewing them.
+    """
+    
+    def __init__(self, max_versions=MAX_SHARED_VERSIONS):
+        self.max_versions = max_versions
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def put(self, version, results):
+        """Store results under a version, dropping the least recently used beyond the limit"""
+        with self._lock:
+            self._entries[version] = results
+            self._entries.move_to_end(version)
+            while len(self._entries) > self.max_versions:
+                self._entries.popitem(last=False)
+        return version
+    
+    def get(self, version):
+        """Results for a version, or None if not held"""
+        with self._lock:
+            results = self._entries.get(version)
+            if results is not None:
+                self._entries.move_to_end(version)
+            return results
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self):
+        return len(self._entries)
+
+def local_results_version():
+    """Version key of the locally saved results, from their save time"""
+    metadata = get_metadata() or {}
+    return f"local:{metadata.get('last_updated', '')}"
+
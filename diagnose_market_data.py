@@ -4,9 +4,11 @@
 import pandas as pd
 import yfinance as yf
 from datetime import datetime
+from ingestion import TRANSACTION_COLUMNS, TRANSACTION_DTYPES, load_workbook
 
-# Read the transaction file to get tickers
-df_trans = pd.read_excel("data/Investment_Transaction_Detail_-_Customizable.xlsx")
+# Read the transaction file to get tickers (shares the app's ingestion cache)
+df_trans = load_workbook("data/Investment_Transaction_Detail_-_Customizable.xlsx",
+                         TRANSACTION_COLUMNS, TRANSACTION_DTYPES)
 portMkts = df_trans['Ticker/Option Symbol number'].tolist()
 portMkts = sorted(set(portMkts), key=portMkts.index)
 if 'NTPXX' in portMkts:
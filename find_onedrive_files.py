@@ -4,8 +4,8 @@ Run this script to locate your files and get the correct paths
 """
 
 import os
-import pandas as pd
 from pathlib import Path
+from ingestion import load_workbook
 
 def find_onedrive_folders():
     """Find OneDrive folders on the system"""
@@ -125,13 +125,14 @@ def main():
         income_file = str(sorted(income_files)[-1])
         
         print(f"""
-# Load SMIF data files from local OneDrive
+# Load SMIF data files from local OneDrive (run from the dashboard folder)
+from ingestion import load_brokerage_files
+
 transaction_path = r"{trans_file}"
 income_path = r"{income_file}"
 
 try:
-    transaction_data = pd.read_excel(transaction_path)
-    income_data = pd.read_excel(income_path)
+    transaction_data, income_data = load_brokerage_files(transaction_path, income_path, parallel=False)
     data_loaded = True
     print("✓ Files loaded successfully!")
     print(f"  Transaction data: {{len(transaction_data)}} rows")
@@ -146,8 +147,8 @@ except Exception as e:
         # Try to load and preview the files
         print("\nAttempting to load and preview files...")
         try:
-            trans_df = pd.read_excel(trans_file)
-            income_df = pd.read_excel(income_file)
+            trans_df = load_workbook(trans_file)
+            income_df = load_workbook(income_file)
             
             print(f"\n✓ Transaction file loaded: {len(trans_df)} rows, {len(trans_df.columns)} columns")
             print(f"  Columns: {', '.join(trans_df.columns[:5])}...")
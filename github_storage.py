@@ -3,16 +3,139 @@ GitHub Storage Module for SMIF Dashboard
 Handles private repository storage for Excel files
 """
 import base64
+import hashlib
 import json
 import logging
+import os
+import shutil
+import tempfile
 from datetime import datetime
 from typing import Optional, Tuple, Dict, List
+import requests
 import streamlit as st
-from github import Github, GithubException, UnknownObjectException
+from github import Github, GithubException, InputGitTreeElement, UnknownObjectException
 import io
 
+from jobs import SingleFlight
+
 logger = logging.getLogger(__name__)
 
+BRANCH = "main"
+CURRENT_DIR = "data/current"
+ARCHIVE_DIR = "data/archive"
+TRANSACTION_PATH = f"{CURRENT_DIR}/transaction_data.xlsx"
+INCOME_PATH = f"{CURRENT_DIR}/income_data.xlsx"
+METADATA_PATH = "metadata.json"
+FILE_MODE = "100644"
+
+# README files that mark the data directories in a fresh repository
+DIRECTORY_READMES = {
+    f"{CURRENT_DIR}/README.md": "# Current Data\nThis directory contains the latest uploaded files.",
+    f"{ARCHIVE_DIR}/README.md": "# Archive\nThis directory contains historical uploads.",
+}
+
+# Attempts at moving the branch when another upload lands first
+MAX_COMMIT_ATTEMPTS = 3
+
+# Raw blob downloads: refused above the git blobs API limit, read in chunks
+MAX_DOWNLOAD_BYTES = 100 * 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_TIMEOUT = 60
+
+# Local copies of downloaded files, named by git blob SHA
+BLOB_CACHE_DIR = os.path.join("data", "github_cache")
+# Blobs kept locally: the two current files plus a couple of earlier uploads
+MAX_CACHED_BLOBS = 6
+
+
+def git_blob_sha(data: bytes) -> str:
+    """SHA-1 that git assigns to a blob with this content."""
+    return hashlib.sha1(f"blob {len(data)}\0".encode('ascii') + data).hexdigest()
+
+
+class BlobCache:
+    """
+    Content-addressed store of downloaded files, keyed by git blob SHA.
+    Entries are verified against their SHA when read, so a corrupt or
+    partial file is treated as a miss. Reads and writes refresh an entry's
+    modification time, and only the most recently used max_entries are kept.
+    """
+    
+    def __init__(self, cache_dir: str = BLOB_CACHE_DIR, max_entries: int = MAX_CACHED_BLOBS):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+    
+    def _path(self, sha: str) -> str:
+        return os.path.join(self.cache_dir, sha)
+    
+    def get(self, sha: str) -> Optional[bytes]:
+        """Return cached content for a blob SHA, or None on a miss."""
+        path = self._path(sha)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        if git_blob_sha(data) != sha:
+            logger.warning(f"Discarding corrupt cached blob {sha[:7]}")
+            self._remove(path)
+            return None
+        self._touch(path)
+        return data
+    
+    def put(self, data: bytes) -> str:
+        """Store content under its blob SHA and return the SHA."""
+        sha = git_blob_sha(data)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(sha)
+        if os.path.exists(path):
+            self._touch(path)
+        else:
+            # Unique temp file so concurrent puts of the same blob cannot interleave
+            with tempfile.NamedTemporaryFile(dir=self.cache_dir, suffix='.tmp', delete=False) as tmp:
+                tmp_path = tmp.name
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            self._prune()
+        return sha
+    
+    def clear(self):
+        """Delete all cached blobs."""
+        if os.path.exists(self.cache_dir):
+            shutil.rmtree(self.cache_dir)
+    
+    def _touch(self, path: str):
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+    
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    
+    def _prune(self):
+        """Drop the least recently used blobs beyond the cache limit."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.tmp'):
+                continue
+            path = self._path(name)
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except FileNotFoundError:
+                continue
+        entries.sort(reverse=True)
+        for _, stale_path in entries[self.max_entries:]:
+            self._remove(stale_path)
+
 
 class GitHubStorage:
     """
@@ -39,43 +162,25 @@ class GitHubStorage:
             logger.error(f"Failed to connect to repository {repo_name}: {e}")
             raise
     
-    def _ensure_directory_structure(self):
-        """Ensure the required directory structure exists in the repo."""
-        try:
-            # Check if data/current directory exists
-            try:
-                self.repo.get_contents("data/current")
-            except UnknownObjectException:
-                # Create directory structure with README files
-                self.repo.create_file(
-                    "data/current/README.md",
-                    "Initialize current data directory",
-                    "# Current Data\nThis directory contains the latest uploaded files.",
-                    branch="main"
-                )
-                logger.info("Created data/current directory")
-            
-            # Check if data/archive directory exists
-            try:
-                self.repo.get_contents("data/archive")
-            except UnknownObjectException:
-                self.repo.create_file(
-                    "data/archive/README.md",
-                    "Initialize archive directory",
-                    "# Archive\nThis directory contains historical uploads.",
-                    branch="main"
-                )
-                logger.info("Created data/archive directory")
-                
-        except Exception as e:
-            logger.error(f"Error ensuring directory structure: {e}")
-            raise
+    def _create_blob(self, data: bytes) -> str:
+        """Create a blob from raw bytes and return its SHA."""
+        blob = self.repo.create_git_blob(base64.b64encode(data).decode('ascii'), "base64")
+        return blob.sha
+    
+    def _tree_blobs(self, tree_sha: str) -> Dict[str, str]:
+        """Map every file path in a tree to its blob SHA."""
+        tree = self.repo.get_git_tree(tree_sha, recursive=True)
+        return {element.path: element.sha for element in tree.tree if element.type == "blob"}
     
     def upload_files(self, transaction_data: bytes, income_data: bytes, 
                     uploader_email: str) -> bool:
         """
         Upload Excel files to the private repository.
         
+        The new files, archive copies of the previous files and metadata.json
+        are written as one tree in a single commit, so the branch never shows
+        a partial upload.
+        
         Args:
             transaction_data: Transaction Excel file as bytes
             income_data: Income Excel file as bytes
@@ -85,96 +190,143 @@ class GitHubStorage:
             bool: True if successful, False otherwise
         """
         try:
-            # Ensure directory structure exists
-            self._ensure_directory_structure()
-            
-            # Archive current files if they exist
-            self._archive_current_files()
-            
-            # Prepare file contents - PyGithub handles base64 encoding internally
-            transaction_content = transaction_data
-            income_content = income_data
-            
             # Create commit message
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             commit_message = f"Upload SMIF data - {timestamp}\n\nUploaded by: {uploader_email}"
             
-            # Upload transaction file
-            transaction_path = "data/current/transaction_data.xlsx"
-            try:
-                # Try to update existing file
-                file = self.repo.get_contents(transaction_path)
-                self.repo.update_file(
-                    transaction_path,
-                    commit_message,
-                    transaction_content,
-                    file.sha,
-                    branch="main"
-                )
-            except UnknownObjectException:
-                # Create new file if it doesn't exist
-                self.repo.create_file(
-                    transaction_path,
-                    commit_message,
-                    transaction_content,
-                    branch="main"
-                )
-            
-            # Upload income file
-            income_path = "data/current/income_data.xlsx"
-            try:
-                file = self.repo.get_contents(income_path)
-                self.repo.update_file(
-                    income_path,
-                    commit_message,
-                    income_content,
-                    file.sha,
-                    branch="main"
-                )
-            except UnknownObjectException:
-                self.repo.create_file(
-                    income_path,
-                    commit_message,
-                    income_content,
-                    branch="main"
-                )
+            # Blobs don't depend on the branch head, so they are reused on retry
+            new_blobs = {
+                TRANSACTION_PATH: self._create_blob(transaction_data),
+                INCOME_PATH: self._create_blob(income_data),
+            }
+            metadata_content = json.dumps(self._build_metadata(uploader_email, timestamp), indent=2)
             
-            # Update metadata
-            self._update_metadata(uploader_email, timestamp)
+            for attempt in range(1, MAX_COMMIT_ATTEMPTS + 1):
+                ref = self.repo.get_git_ref(f"heads/{BRANCH}")
+                parent = self.repo.get_git_commit(ref.object.sha)
+                existing = self._tree_blobs(parent.tree.sha)
+                
+                # Archive current files if they exist
+                elements = self._archive_elements(existing)
+                
+                for path, sha in new_blobs.items():
+                    elements.append(InputGitTreeElement(path, FILE_MODE, "blob", sha=sha))
+                elements.append(InputGitTreeElement(METADATA_PATH, FILE_MODE, "blob", content=metadata_content))
+                for path, content in DIRECTORY_READMES.items():
+                    if path not in existing:
+                        elements.append(InputGitTreeElement(path, FILE_MODE, "blob", content=content))
+                
+                tree = self.repo.create_git_tree(elements, parent.tree)
+                commit = self.repo.create_git_commit(commit_message, tree, [parent])
+                
+                try:
+                    # Not forced: fails if the branch moved since we read it
+                    ref.edit(commit.sha)
+                    break
+                except GithubException as e:
+                    if attempt == MAX_COMMIT_ATTEMPTS:
+                        raise
+                    logger.warning(f"Branch {BRANCH} moved during upload, retrying ({e.status})")
             
-            logger.info(f"Successfully uploaded files at {timestamp}")
+            logger.info(f"Successfully uploaded files at {timestamp} in commit {commit.sha[:7]}")
             return True
             
         except Exception as e:
             logger.error(f"Error uploading files: {e}")
             return False
     
-    def download_files(self) -> Tuple[Optional[bytes], Optional[bytes], Optional[Dict]]:
+    def get_current_files(self) -> Dict[str, Dict]:
+        """
+        Get the blob SHA and size of the current data files with one directory listing.
+        
+        Returns:
+            dict: File path to {'sha', 'size'}, empty if the directory doesn't exist
+        """
+        try:
+            return {item.path: {'sha': item.sha, 'size': item.size}
+                    for item in self.repo.get_contents(CURRENT_DIR) if item.type == "file"}
+        except UnknownObjectException:
+            return {}
+    
+    def _download_blob(self, sha: str, size: Optional[int] = None) -> bytes:
+        """
+        Stream a blob's raw bytes from the git blobs API into a buffer.
+        
+        Unlike the contents API this has no 1 MB inline limit and no base64
+        overhead. The size is checked before and while reading, and the
+        content is verified against the SHA.
+        
+        Args:
+            sha: Blob SHA
+            size: Expected size in bytes, if known
+            
+        Returns:
+            bytes: Blob content
+        """
+        if size is not None and size > MAX_DOWNLOAD_BYTES:
+            raise ValueError(f"Blob {sha[:7]} is {size} bytes, above the {MAX_DOWNLOAD_BYTES} byte limit")
+        
+        headers = {
+            "Authorization": f"token {self.token}",
+            "Accept": "application/vnd.github.raw",
+        }
+        buffer = io.BytesIO()
+        with requests.get(f"{self.repo.url}/git/blobs/{sha}", headers=headers,
+                          stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                buffer.write(chunk)
+                if buffer.tell() > MAX_DOWNLOAD_BYTES:
+                    raise ValueError(f"Blob {sha[:7]} exceeded the {MAX_DOWNLOAD_BYTES} byte limit")
+        
+        data = buffer.getvalue()
+        if size is not None and len(data) != size:
+            raise ValueError(f"Blob {sha[:7]} is {len(data)} bytes, expected {size}")
+        if git_blob_sha(data) != sha:
+            raise ValueError(f"Blob {sha[:7]} content does not match its SHA")
+        return data
+    
+    def _read_file(self, path: str, files: Dict[str, Dict], cache: Optional[BlobCache]) -> Optional[bytes]:
+        """Read a current file from the local cache if its SHA is unchanged, else download it."""
+        info = files.get(path)
+        if info is None:
+            return None
+        
+        if cache is not None:
+            data = cache.get(info['sha'])
+            if data is not None:
+                logger.info(f"Using cached copy of {path} ({info['sha'][:7]})")
+                return data
+        
+        data = self._download_blob(info['sha'], info['size'])
+        if cache is not None:
+            cache.put(data)
+        return data
+    
+    def download_files(self, cache: Optional[BlobCache] = None) -> Tuple[Optional[bytes], Optional[bytes], Optional[Dict]]:
         """
         Download the latest Excel files from the repository.
         
+        Args:
+            cache: Optional local blob cache; files whose SHA is already
+                   cached are read locally instead of downloaded
+        
         Returns:
             tuple: (transaction_data, income_data, metadata)
                    Returns (None, None, None) if files don't exist
         """
         try:
+            files = self.get_current_files()
+            
             # Download transaction file
-            transaction_path = "data/current/transaction_data.xlsx"
-            try:
-                transaction_file = self.repo.get_contents(transaction_path)
-                transaction_data = transaction_file.decoded_content
-            except UnknownObjectException:
-                logger.warning(f"Transaction file not found: {transaction_path}")
-                transaction_data = None
+            transaction_data = self._read_file(TRANSACTION_PATH, files, cache)
+            if transaction_data is None:
+                logger.warning(f"Transaction file not found: {TRANSACTION_PATH}")
             
             # Download income file
-            income_path = "data/current/income_data.xlsx"
-            try:
-                income_file = self.repo.get_contents(income_path)
-                income_data = income_file.decoded_content
-            except UnknownObjectException:
-                logger.warning(f"Income file not found: {income_path}")
-                income_data = None
+            income_data = self._read_file(INCOME_PATH, files, cache)
+            if income_data is None:
+                logger.warning(f"Income file not found: {INCOME_PATH}")
             
             # Download metadata
             metadata = self._get_metadata()
@@ -202,7 +354,7 @@ class GitHubStorage:
             history = []
             
             # Get commits for the data/current directory
-            commits = self.repo.get_commits(path="data/current")
+            commits = self.repo.get_commits(path=CURRENT_DIR)
             
             count = 0
             for commit in commits:
@@ -234,94 +386,52 @@ class GitHubStorage:
             logger.error(f"Error getting file history: {e}")
             return []
     
-    def _archive_current_files(self) -> bool:
+    def _archive_elements(self, existing: Dict[str, str]) -> List[InputGitTreeElement]:
         """
-        Move current files to archive before uploading new ones.
+        Tree entries that copy the current files into a timestamped archive.
+        
+        The archive entries point at the existing blob SHAs, so the copy is
+        made server-side and no file content is downloaded or re-uploaded.
         
+        Args:
+            existing: Path to blob SHA map of the branch head
+            
         Returns:
-            bool: True if successful or no files to archive
+            list: Tree elements, empty if there are no current files to archive
         """
-        try:
-            # Check if current files exist
-            try:
-                transaction_file = self.repo.get_contents("data/current/transaction_data.xlsx")
-                income_file = self.repo.get_contents("data/current/income_data.xlsx")
-            except UnknownObjectException:
-                # No files to archive
-                return True
-            
-            # Create archive directory with timestamp
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            archive_dir = f"data/archive/{timestamp}"
-            
-            # Get file contents - use decoded_content for binary files
-            transaction_content = transaction_file.decoded_content
-            income_content = income_file.decoded_content
-            
-            # Create archived files
-            self.repo.create_file(
-                f"{archive_dir}/transaction_data.xlsx",
-                f"Archive files - {timestamp}",
-                transaction_content,
-                branch="main"
-            )
-            
-            self.repo.create_file(
-                f"{archive_dir}/income_data.xlsx",
-                f"Archive files - {timestamp}",
-                income_content,
-                branch="main"
-            )
-            
-            logger.info(f"Archived current files to {archive_dir}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error archiving files: {e}")
-            return False
+        if TRANSACTION_PATH not in existing or INCOME_PATH not in existing:
+            # No files to archive
+            return []
+        
+        # Create archive directory with timestamp
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        archive_dir = f"{ARCHIVE_DIR}/{timestamp}"
+        
+        elements = []
+        for path in (TRANSACTION_PATH, INCOME_PATH):
+            file_name = path.rsplit("/", 1)[-1]
+            elements.append(InputGitTreeElement(
+                f"{archive_dir}/{file_name}", FILE_MODE, "blob", sha=existing[path]))
+        
+        logger.info(f"Archiving current files to {archive_dir}")
+        return elements
     
-    def _update_metadata(self, uploader_email: str, timestamp: str):
-        """Update metadata.json with latest upload information."""
-        try:
-            metadata = {
-                "last_upload": {
-                    "timestamp": timestamp,
-                    "uploader": uploader_email,
-                    "updated_at": datetime.now().isoformat()
-                },
-                "repository": self.repo_name,
-                "version": "1.0"
-            }
-            
-            metadata_content = json.dumps(metadata, indent=2)
-            metadata_path = "metadata.json"
-            
-            try:
-                # Update existing file
-                file = self.repo.get_contents(metadata_path)
-                self.repo.update_file(
-                    metadata_path,
-                    f"Update metadata - {timestamp}",
-                    metadata_content,
-                    file.sha,
-                    branch="main"
-                )
-            except UnknownObjectException:
-                # Create new file
-                self.repo.create_file(
-                    metadata_path,
-                    f"Create metadata - {timestamp}",
-                    metadata_content,
-                    branch="main"
-                )
-                
-        except Exception as e:
-            logger.error(f"Error updating metadata: {e}")
+    def _build_metadata(self, uploader_email: str, timestamp: str) -> Dict:
+        """Build metadata.json contents for an upload."""
+        return {
+            "last_upload": {
+                "timestamp": timestamp,
+                "uploader": uploader_email,
+                "updated_at": datetime.now().isoformat()
+            },
+            "repository": self.repo_name,
+            "version": "1.0"
+        }
     
     def _get_metadata(self) -> Optional[Dict]:
         """Get metadata from repository."""
         try:
-            metadata_file = self.repo.get_contents("metadata.json")
+            metadata_file = self.repo.get_contents(METADATA_PATH)
             metadata_content = metadata_file.decoded_content.decode('utf-8')
             return json.loads(metadata_content)
         except Exception as e:
@@ -347,10 +457,26 @@ class GitHubStorage:
 
 
 # Streamlit-specific helper functions
-@st.cache_data(ttl=3600)  # Cache for 1 hour
+@st.cache_resource
+def get_github_storage(token: str, repo_name: str) -> GitHubStorage:
+    """Get a GitHub storage client shared across sessions."""
+    return GitHubStorage(token, repo_name)
+
+
+@st.cache_resource
+def get_download_flight() -> SingleFlight:
+    """Process-wide coordinator so concurrent sessions share one GitHub fetch."""
+    return SingleFlight()
+
+
 def get_cached_data_from_github(token: str, repo_name: str) -> Tuple[Optional[bytes], Optional[bytes], Optional[Dict]]:
     """
-    Get data from GitHub with caching.
+    Get data from GitHub, downloading only files that changed.
+    
+    The current blob SHAs are checked on every call; files whose SHA is
+    already in the local blob cache are read from disk. Sessions calling
+    while a fetch for the repository is running wait for it and share its
+    files instead of listing and downloading them again.
     
     Args:
         token: GitHub token
@@ -360,13 +486,14 @@ def get_cached_data_from_github(token: str, repo_name: str) -> Tuple[Optional[by
         tuple: (transaction_data, income_data, metadata)
     """
     try:
-        storage = GitHubStorage(token, repo_name)
-        return storage.download_files()
+        storage = get_github_storage(token, repo_name)
+        return get_download_flight().do(repo_name, storage.download_files, BlobCache())
     except Exception as e:
         st.error(f"Error connecting to GitHub: {str(e)}")
         return None, None, None
 
 
 def clear_github_cache():
-    """Clear the GitHub data cache."""
-    get_cached_data_from_github.clear()
\ No newline at end of file
+    """Clear the GitHub client and the local blob cache."""
+    get_github_storage.clear()
+    BlobCache().clear()
@@ -1,6 +1,6 @@
 import pandas as pd
 import yfinance as yf
-import statsmodels.api as sm
+from analytics import batch_ols
 
 # default lookback window is set to be 10 years
 # the last ticker symbol in the list of portfolio markets must be the benchmark
@@ -17,7 +17,6 @@ def alphaBeta(portMkts, startDate='2014-01-01', endDate=None) :
     n=len(portMkts)
     df_close = pd.DataFrame()
     df_rtn = pd.DataFrame()
-    df_abe = pd.DataFrame()
 
     for i in range(n):
         df_close[portMkts[i]],df_rtn[portMkts[i]],*_ = importYahooData(portMkts[i], startDate)
@@ -26,13 +25,9 @@ def alphaBeta(portMkts, startDate='2014-01-01', endDate=None) :
 
     ## the last ticker symbol in portMkts is asusmed to be the benchmark ##
     benCol = portMkts[n-1]
-    x = df_wRtn[benCol]
-    x = sm.add_constant(x)
-    for i in range(n-1):
-        col= portMkts[i]
-        y = df_wRtn[col]
-        reg = sm.OLS(y, x).fit()
-        df_abe[col]=[reg.params['const'],reg.params[benCol],reg.tvalues['const'],reg.pvalues['const'],reg.mse_resid]
+    # one batched OLS of every market on the benchmark
+    reg = batch_ols(df_wRtn[portMkts[:n-1]], df_wRtn[benCol])
+    df_abe = reg[['alpha','beta','t_alpha','p_alpha','mse_resid']].T
     return df_abe
 
 ## the last ticker symbol in portMkts must be the benchmark
@@ -0,0 +1,287 @@
+"""
+Ingestion Module for SMIF Dashboard
+Parses the brokerage transaction and income workbooks and keeps a normalized
+Parquet copy of each, keyed by content hash, so a workbook is parsed once
+"""
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Columns the reports use from each brokerage export, with the dtypes of the
+# numeric ones. Dates and text are left to the Excel reader (income dates
+# can be blank strings).
+TRANSACTION_COLUMNS = ['D-TRADE', 'Share/Par Value', 'A-PRIN-TRD-BSE', 'Ticker/Option Symbol number']
+TRANSACTION_DTYPES = {
+    'Share/Par Value': 'float64',
+    'A-PRIN-TRD-BSE': 'float64',
+}
+INCOME_COLUMNS = ['Recognition date', 'Net amount - base', 'Narrative - Short']
+INCOME_DTYPES = {
+    'Net amount - base': 'float64',
+}
+
+# Column types applied when normalizing, wherever these columns appear
+DATE_COLUMNS = ['D-TRADE', 'Recognition date']
+NUMERIC_COLUMNS = ['Share/Par Value', 'A-PRIN-TRD-BSE', 'Net amount - base']
+
+# One worker per workbook
+MAX_WORKERS = 2
+
+INGEST_CACHE_DIR = os.path.join("data", "ingest_cache")
+MAX_CACHED_WORKBOOKS = 20
+# Bump when normalize_workbook changes so older cache entries are not reused
+NORMALIZED_VERSION = 2
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Shared worker pool, started on first use so its start-up cost is paid once."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that already runs server threads is unsafe
+            _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS,
+                                        mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _reset_pool():
+    """Drop a broken worker pool so the next call starts a new one."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _source_bytes(source) -> bytes:
+    """Read an uploaded file, buffer or path into bytes."""
+    if isinstance(source, bytes):
+        return source
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            return f.read()
+    if hasattr(source, 'getvalue'):
+        return source.getvalue()
+    source.seek(0)
+    return source.read()
+
+
+def read_workbook(source, usecols: Optional[List[str]] = None,
+                  dtypes: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """
+    Read the first sheet of a workbook, limited to the given columns.
+    
+    Falls back to reading the whole sheet without dtypes when the columns
+    are missing or a value doesn't fit its dtype, so callers see the same
+    frame (and errors) as a plain pd.read_excel.
+    
+    Args:
+        source: Workbook path or bytes
+        usecols: Columns to read (None reads all)
+        dtypes: Column dtypes to parse with
+    
+    Returns:
+        DataFrame: The sheet contents
+    """
+    data = io.BytesIO(source) if isinstance(source, bytes) else source
+    try:
+        return pd.read_excel(data, usecols=usecols, dtype=dtypes)
+    except ValueError as e:
+        logger.warning(f"Reading workbook without column/dtype limits: {e}")
+        if isinstance(data, io.BytesIO):
+            data.seek(0)
+        return pd.read_excel(data)
+
+
+def _read_workbooks(jobs: List[Tuple], parallel: bool = True) -> List[pd.DataFrame]:
+    """Run read_workbook for each (data, usecols, dtypes) job, in the worker pool when it helps."""
+    # A single core gains nothing from parallel parsing, only the pool overhead
+    if not parallel or len(jobs) < 2 or (os.cpu_count() or 1) < 2:
+        return [read_workbook(*job) for job in jobs]
+    
+    try:
+        pool = _get_pool()
+        futures = [pool.submit(read_workbook, *job) for job in jobs]
+        return [future.result() for future in futures]
+    except (OSError, RuntimeError) as e:
+        # Pool unavailable (e.g. process limits or a crashed worker): read serially
+        logger.warning(f"Parallel workbook parsing failed, reading serially: {e}")
+        _reset_pool()
+        return [read_workbook(*job) for job in jobs]
+
+
+def read_brokerage_files(transaction_source, income_source,
+                         parallel: bool = True) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Parse the transaction and income workbooks concurrently, without caching.
+    
+    Args:
+        transaction_source: Investment Transaction Detail workbook (path, bytes or file)
+        income_source: Income and Expense Detail workbook (path, bytes or file)
+        parallel: Parse in the worker pool; scripts without a __main__ guard
+                  must pass False, since spawned workers re-import the script
+    
+    Returns:
+        tuple: (transactions, income) with only the columns the reports use
+    """
+    transactions, income = _read_workbooks([
+        (_source_bytes(transaction_source), TRANSACTION_COLUMNS, TRANSACTION_DTYPES),
+        (_source_bytes(income_source), INCOME_COLUMNS, INCOME_DTYPES),
+    ], parallel)
+    return transactions, income
+
+
+def normalize_workbook(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Give every column of a parsed workbook a single type so it can be stored as Parquet.
+    
+    Known date and amount columns are coerced to datetime64 and float64 (blank
+    dates become NaT). Other mixed-type columns are stored as text.
+    
+    Raises:
+        ValueError: A non-blank cell of a date column is not a date
+    """
+    frame = frame.copy()
+    frame.columns = [str(col) for col in frame.columns]
+    for col in frame.columns:
+        if col in DATE_COLUMNS:
+            frame[col] = _parse_dates(frame[col])
+        elif col in NUMERIC_COLUMNS:
+            frame[col] = pd.to_numeric(frame[col], errors='coerce').astype('float64')
+        elif frame[col].dtype == object:
+            frame[col] = frame[col].where(frame[col].isna(), frame[col].astype(str))
+    return frame
+
+
+def _parse_dates(values: pd.Series) -> pd.Series:
+    """Parse a date column, leaving only blank cells as NaT."""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    blank = values.isna() | values.astype(str).str.strip().eq('')
+    dates = pd.to_datetime(values.where(~blank), errors='coerce')
+    bad = dates.isna() & ~blank
+    if bad.any():
+        # Spreadsheet rows: one header row, numbered from 1
+        cells = ', '.join(f"row {i + 2}: {value!r}" for i, value in values[bad].head(5).items())
+        raise ValueError(f"Column '{values.name}' has {bad.sum()} value(s) that are not dates ({cells})")
+    return dates
+
+
+def _cache_path(data: bytes, usecols: Optional[List[str]], cache_dir: str) -> str:
+    """Cache file for a workbook's content and the columns read from it."""
+    digest = hashlib.sha256(data)
+    digest.update(json.dumps({'usecols': usecols, 'version': NORMALIZED_VERSION}).encode('utf-8'))
+    return os.path.join(cache_dir, f"{digest.hexdigest()}.parquet")
+
+
+def _load_cached(path: str) -> Optional[pd.DataFrame]:
+    if not os.path.exists(path):
+        return None
+    try:
+        frame = pd.read_parquet(path)
+    except Exception as e:
+        logger.warning(f"Discarding unreadable ingestion cache {path}: {e}")
+        return None
+    # Mark the entry as recently used so pruning drops the least recently used workbooks
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return frame
+
+
+def _save_cached(path: str, frame: pd.DataFrame, cache_dir: str):
+    os.makedirs(cache_dir, exist_ok=True)
+    # Unique temp file so concurrent loads of the same workbook cannot interleave
+    with tempfile.NamedTemporaryFile(dir=cache_dir, suffix='.tmp', delete=False) as tmp:
+        tmp_path = tmp.name
+    try:
+        frame.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    
+    # Drop the least recently used entries beyond the cache limit
+    entries = sorted(
+        (os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if name.endswith('.parquet')),
+        key=os.path.getmtime,
+        reverse=True
+    )
+    for stale_path in entries[MAX_CACHED_WORKBOOKS:]:
+        os.remove(stale_path)
+
+
+def _load_workbooks(jobs: List[Tuple], parallel: bool = True,
+                    cache_dir: str = INGEST_CACHE_DIR) -> List[pd.DataFrame]:
+    """Load (source, usecols, dtypes) jobs from the cache, parsing and caching the misses."""
+    datas = [_source_bytes(source) for source, _, _ in jobs]
+    paths = [_cache_path(data, usecols, cache_dir) for data, (_, usecols, _) in zip(datas, jobs)]
+    frames = [_load_cached(path) for path in paths]
+    
+    missing = [i for i, frame in enumerate(frames) if frame is None]
+    parsed = _read_workbooks([(datas[i], jobs[i][1], jobs[i][2]) for i in missing], parallel)
+    for i, frame in zip(missing, parsed):
+        frames[i] = normalize_workbook(frame)
+        try:
+            _save_cached(paths[i], frames[i], cache_dir)
+        except Exception as e:
+            logger.warning(f"Could not cache normalized workbook: {e}")
+    
+    if missing:
+        logger.info(f"Parsed {len(missing)} of {len(jobs)} workbooks, rest from ingestion cache")
+    return frames
+
+
+def load_workbook(source, usecols: Optional[List[str]] = None,
+                  dtypes: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """
+    Load one workbook as a normalized frame, parsing it only on a cache miss.
+    
+    Args:
+        source: Workbook path, bytes or file
+        usecols: Columns to read (None reads all)
+        dtypes: Column dtypes to parse with
+    
+    Returns:
+        DataFrame: The normalized sheet contents
+    """
+    return _load_workbooks([(source, usecols, dtypes)], parallel=False)[0]
+
+
+def load_brokerage_files(transaction_source, income_source,
+                         parallel: bool = True) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Load the transaction and income workbooks through the ingestion cache.
+    
+    Workbooks already seen (by content hash) are read from their normalized
+    Parquet copy; the others are parsed concurrently and cached.
+    
+    Args:
+        transaction_source: Investment Transaction Detail workbook (path, bytes or file)
+        income_source: Income and Expense Detail workbook (path, bytes or file)
+        parallel: Parse in the worker pool; scripts without a __main__ guard
+                  must pass False, since spawned workers re-import the script
+    
+    Returns:
+        tuple: (transactions, income) with only the columns the reports use
+    """
+    transactions, income = _load_workbooks([
+        (transaction_source, TRANSACTION_COLUMNS, TRANSACTION_DTYPES),
+        (income_source, INCOME_COLUMNS, INCOME_DTYPES),
+    ], parallel)
+    return transactions, income
@@ -0,0 +1,180 @@
+"""
+Jobs Module for SMIF Dashboard
+Coordinates expensive work shared by concurrent user sessions and runs
+long tasks in the background
+"""
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _Abandoned(Exception):
+    """Set on a flight whose leader stopped without an outcome to share"""
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time.
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is running wait for the same future and receive its
+    result, or its exception. Once the call finishes the key is released,
+    so later callers run again (results should be cached by the function).
+
+    Only results and ordinary exceptions are shared. If the leader is
+    interrupted by a BaseException that is not an Exception (such as a
+    Streamlit rerun or stop in its script thread), the waiters retry and
+    one of them becomes the new leader.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Call fn(*args, **kwargs) once for all concurrent callers with this key.
+
+        Args:
+            key: Identity of the work, e.g. a content hash
+            fn: Function to run if no call for key is in flight
+
+        Returns:
+            The leader's return value
+        """
+        while True:
+            with self._lock:
+                future = self._calls.get(key)
+                leader = future is None
+                if leader:
+                    future = Future()
+                    self._calls[key] = future
+            if leader:
+                break
+
+            logger.info(f"Waiting for in-flight call {str(key)[:12]}")
+            try:
+                return future.result()
+            except _Abandoned:
+                logger.info(f"In-flight call {str(key)[:12]} was interrupted, retrying")
+
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self._release(key)
+            future.set_exception(e)
+            raise
+        except BaseException:
+            self._release(key)
+            future.set_exception(_Abandoned())
+            raise
+        self._release(key)
+        future.set_result(result)
+        return result
+
+    def _release(self, key: Hashable):
+        # Released before the future is resolved, so retrying waiters never see it again
+        with self._lock:
+            del self._calls[key]
+
+    def in_flight(self, key: Hashable) -> bool:
+        """True if a call for key is currently running"""
+        with self._lock:
+            return key in self._calls
+
+
+class Job:
+    """
+    A background job's state, polled by the session that submitted it.
+
+    The job function receives its Job and reports through update(),
+    warning() and error(), the same calls the page's progress reporter takes.
+    """
+
+    def __init__(self, job_id: str, name: str):
+        self.id = job_id
+        self.name = name
+        self.status = 'queued'
+        self.progress = 0.0
+        self.message = 'Waiting for a worker...'
+        self.messages: List[Tuple[str, str]] = []
+        self.result: Any = None
+        self.error_message: Optional[str] = None
+        self.created = time.time()
+        self.finished: Optional[float] = None
+
+    def update(self, fraction: Optional[float] = None, message: Optional[str] = None):
+        """Record progress (0-1) and/or the current step"""
+        if fraction is not None:
+            self.progress = fraction
+        if message is not None:
+            self.message = message
+
+    def warning(self, message: str):
+        self.messages.append(('warning', message))
+
+    def error(self, message: str):
+        self.messages.append(('error', message))
+
+    @property
+    def done(self) -> bool:
+        return self.status in ('done', 'failed')
+
+
+class JobManager:
+    """
+    Runs jobs on a shared worker pool and keeps their state by job ID.
+
+    Jobs outlive the script run (and session rerun) that submitted them;
+    finished jobs are dropped keep_seconds after they end.
+    """
+
+    def __init__(self, max_workers: int = 2, keep_seconds: int = 3600):
+        self.keep_seconds = keep_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='smif-job')
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, name: str, fn: Callable[..., Any], *args, **kwargs) -> str:
+        """
+        Queue fn(job, *args, **kwargs) and return the job ID.
+
+        The function's return value becomes job.result; an exception marks
+        the job failed with its message in job.error_message.
+        """
+        job = Job(uuid.uuid4().hex, name)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        logger.info(f"Submitted job {job.id[:8]} ({name})")
+        return job.id
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """A job by ID, or None if unknown or already dropped"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: Job, fn: Callable[..., Any], args, kwargs):
+        job.status = 'running'
+        job.update(message='Starting...')
+        try:
+            job.result = fn(job, *args, **kwargs)
+            job.update(1.0)
+            job.status = 'done'
+        except Exception as e:
+            logger.exception(f"Job {job.id[:8]} ({job.name}) failed")
+            job.error_message = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished = time.time()
+
+    def _prune(self):
+        cutoff = time.time() - self.keep_seconds
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished and job.finished < cutoff]:
+            del self._jobs[job_id]
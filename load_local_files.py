@@ -23,10 +23,11 @@ if not data_loaded:
     try:
         # Check if files exist
         import os
+        from ingestion import load_brokerage_files
         
         if os.path.exists(transaction_path) and os.path.exists(income_path):
-            transaction_data = pd.read_excel(transaction_path)
-            income_data = pd.read_excel(income_path)
+            # Parsed once per file version, then read from the ingestion cache
+            transaction_data, income_data = load_brokerage_files(transaction_path, income_path, parallel=False)
             data_loaded = True
             print("✓ Files loaded successfully from local paths!")
             print(f"  Transaction data: {len(transaction_data)} rows")
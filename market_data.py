@@ -0,0 +1,179 @@
+"""
+Market Data Module for SMIF Dashboard
+Handles batched Yahoo Finance downloads for all portfolio tickers
+"""
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on concurrent Yahoo requests inside a batch download
+MAX_WORKERS = 8
+
+
+def add_return_columns(datax: pd.DataFrame) -> pd.DataFrame:
+    """
+    Derive close, dividend and adjusted returns from a daily price history.
+
+    Args:
+        datax: Daily history with 'Close', 'Dividends' and 'Stock Splits' columns
+
+    Returns:
+        DataFrame: The same history with 'Close.Rtns', 'Div.Rtns', 'Adj.Rtns'
+                   and 'deltaClose' columns added
+    """
+    datax = datax.copy()
+
+    # Handle missing Dividends / Stock Splits columns
+    if 'Dividends' not in datax.columns:
+        datax['Dividends'] = 0.0
+    if 'Stock Splits' not in datax.columns:
+        datax['Stock Splits'] = 0.0
+
+    datax['Close.Rtns'] = datax['Close'].pct_change()
+    datax['Div.Rtns'] = datax['Dividends'] / datax['Close'].shift(1)
+    datax['Adj.Rtns'] = datax['Close.Rtns'] + datax['Div.Rtns']
+    datax['deltaClose'] = datax['Close'].diff(1) + datax['Dividends']
+    return datax
+
+
+def _split_batch(datax: pd.DataFrame, tickers: List[str]) -> Dict[str, pd.DataFrame]:
+    """Split a (possibly multi-ticker) yfinance frame into one frame per ticker."""
+    frames = {}
+    if isinstance(datax.columns, pd.MultiIndex):
+        available = set(datax.columns.get_level_values(0))
+        for ticker in tickers:
+            if ticker in available:
+                frames[ticker] = datax[ticker]
+    elif len(tickers) == 1:
+        frames[tickers[0]] = datax
+    return frames
+
+
+def download_history(tickers: List[str], startdate: str = '2023-09-01',
+                     enddate: Optional[str] = None,
+                     max_workers: int = MAX_WORKERS) -> Tuple[Dict[str, pd.DataFrame], Dict[str, str]]:
+    """
+    Download daily history for several tickers in a single batched request.
+
+    Args:
+        tickers: Yahoo Finance ticker symbols
+        startdate: First date to download
+        enddate: Last date to download (None means today)
+        max_workers: Maximum number of concurrent requests yfinance may use
+
+    Returns:
+        tuple: (histories, failures) where histories maps ticker to a frame with
+               'Close', 'Dividends' and 'Stock Splits' columns and failures maps
+               ticker to an error message
+    """
+    histories = {}
+    failures = {}
+    if not tickers:
+        return histories, failures
+
+    try:
+        datax = yf.download(tickers, interval='1d', start=startdate, end=enddate,
+                            actions=True, group_by='ticker', progress=False,
+                            threads=max(1, min(max_workers, len(tickers))))
+    except Exception as e:
+        logger.error(f"Batch download failed for {len(tickers)} tickers: {e}")
+        return histories, {ticker: str(e) for ticker in tickers}
+
+    frames = _split_batch(datax, tickers)
+    for ticker in tickers:
+        frame = frames.get(ticker)
+        if frame is None or 'Close' not in frame.columns or frame['Close'].dropna().empty:
+            failures[ticker] = "No data available"
+            continue
+
+        frame = frame.dropna(subset=['Close']).copy()
+        frame.index = pd.DatetimeIndex(frame.index.strftime('%Y-%m-%d'))
+        for col in ['Dividends', 'Stock Splits']:
+            if col not in frame.columns:
+                frame[col] = 0.0
+        histories[ticker] = frame[['Close', 'Dividends', 'Stock Splits']].fillna(0.0)
+
+    if failures:
+        logger.warning(f"No market data for: {', '.join(failures)}")
+    return histories, failures
+
+
+def fetch_market_data(tickers: List[str], startdate: str = '2023-09-01',
+                      enddate: Optional[str] = None,
+                      max_workers: int = MAX_WORKERS,
+                      cache=None) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, Dict[str, str]]:
+    """
+    Build the close, return and split matrices for all portfolio tickers.
+
+    Args:
+        tickers: Yahoo Finance ticker symbols
+        startdate: First date of the business-day calendar
+        enddate: Last date to download (None means today)
+        max_workers: Maximum number of concurrent requests
+        cache: Optional price_cache.PriceCache used to avoid re-downloading history
+
+    Returns:
+        tuple: (df_close, df_rtn, df_splits, failures) on a business-day index,
+               with NaN columns for tickers that failed to download
+    """
+    end = enddate or pd.to_datetime('today').strftime('%Y-%m-%d')
+    dates = pd.date_range(startdate, end, freq='B')
+    df_close = pd.DataFrame(np.nan, columns=tickers, index=dates)
+    df_rtn = pd.DataFrame(np.nan, columns=tickers, index=dates)
+    df_splits = pd.DataFrame(np.nan, columns=tickers, index=dates)
+
+    if cache is not None:
+        histories, failures = cache.get_histories(tickers, startdate, enddate, max_workers)
+    else:
+        histories, failures = download_history(tickers, startdate, enddate, max_workers)
+    for ticker, history in histories.items():
+        datax = add_return_columns(history)
+        df_close[ticker] = datax['Close']
+        df_rtn[ticker] = datax['Adj.Rtns']
+        df_splits[ticker] = datax['Stock Splits']
+
+    return df_close, df_rtn, df_splits, failures
+
+
+def fetch_monthly_returns(tickers: List[str], years: int = 5,
+                          max_workers: int = MAX_WORKERS) -> pd.DataFrame:
+    """
+    Download monthly returns for several tickers in a single batched request.
+
+    Args:
+        tickers: Yahoo Finance ticker symbols
+        years: Lookback window in years, ending today
+        max_workers: Maximum number of concurrent requests yfinance may use
+
+    Returns:
+        DataFrame: Monthly returns (adjusted close where available), one column
+                   per ticker with data; months a ticker has no data are NaN
+    """
+    if not tickers:
+        return pd.DataFrame()
+
+    end_date = pd.to_datetime('today')
+    start_date = end_date - pd.DateOffset(years=years)
+    try:
+        datax = yf.download(tickers, interval='1mo', start=start_date, end=end_date,
+                            actions=True, group_by='ticker', progress=False,
+                            threads=max(1, min(max_workers, len(tickers))))
+    except Exception as e:
+        logger.error(f"Monthly batch download failed for {len(tickers)} tickers: {e}")
+        return pd.DataFrame()
+
+    returns = {}
+    for ticker, frame in _split_batch(datax, tickers).items():
+        price_col = 'Adj Close' if 'Adj Close' in frame.columns else 'Close'
+        prices = frame[price_col].dropna()
+        monthly = prices.pct_change().dropna()
+        if not monthly.empty:
+            monthly.index = pd.DatetimeIndex(monthly.index)
+            returns[ticker] = monthly
+
+    return pd.DataFrame(returns)
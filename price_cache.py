@@ -0,0 +1,198 @@
+"""
+Price Cache Module for SMIF Dashboard
+Keeps daily Yahoo Finance history on disk and tops up only the missing tail
+"""
+import logging
+import os
+import tempfile
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from market_data import MAX_WORKERS, add_return_columns, download_history
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.path.join("data", "price_cache")
+PRICE_COLUMNS = ['Close', 'Dividends', 'Stock Splits']
+
+
+class PriceCache:
+    """
+    Per-ticker store of daily close, dividends, splits and adjusted returns.
+
+    A cached ticker is served without any network call when it was refreshed
+    today. Otherwise only the bars since the last cached bar are downloaded
+    and appended. A full download is done when the cache does not reach back
+    far enough, or when the new bars show a split or a restated close (Yahoo
+    restates the whole close history in both cases).
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    def _path(self, ticker: str) -> str:
+        safe_name = "".join(c if c.isalnum() or c in '-_.' else '_' for c in ticker)
+        return os.path.join(self.cache_dir, f"{safe_name}.pkl")
+
+    def load(self, ticker: str) -> Optional[pd.DataFrame]:
+        """Load the cached history for a ticker, or None if not cached."""
+        path = self._path(ticker)
+        if not os.path.exists(path):
+            return None
+        try:
+            return pd.read_pickle(path)
+        except Exception as e:
+            logger.warning(f"Discarding unreadable price cache for {ticker}: {e}")
+            return None
+
+    def save(self, ticker: str, history: pd.DataFrame, requested_start: str):
+        """Write a ticker's history to disk, recomputing the derived returns."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        frame = history[PRICE_COLUMNS].copy()
+        frame['Adj.Rtns'] = add_return_columns(frame)['Adj.Rtns']
+        frame.attrs['requested_start'] = pd.Timestamp(requested_start).strftime('%Y-%m-%d')
+        frame.attrs['fetched_on'] = pd.Timestamp.today().strftime('%Y-%m-%d')
+
+        # Unique temp file so concurrent refreshes of a ticker cannot interleave
+        path = self._path(ticker)
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir, suffix='.tmp', delete=False) as tmp:
+            tmp_path = tmp.name
+        try:
+            frame.to_pickle(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def stats(self) -> Dict[str, int]:
+        """Cache hits, misses and bytes of history not re-downloaded."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'bytes_saved': self.bytes_saved}
+
+    def _record(self, hit: bool, saved_bytes: int = 0):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.bytes_saved += int(saved_bytes)
+
+    def _plan_fetch(self, cached: Optional[pd.DataFrame], startdate: pd.Timestamp,
+                    enddate: Optional[pd.Timestamp]) -> Optional[pd.Timestamp]:
+        """
+        Decide where a download has to start for a ticker.
+
+        Returns:
+            Timestamp or None: None when the cache already covers the request,
+                               otherwise the first date to download
+        """
+        if cached is None or cached.empty:
+            return startdate
+        if pd.Timestamp(cached.attrs.get('requested_start', cached.index[0])) > startdate:
+            return startdate
+
+        fetched_on = pd.Timestamp(cached.attrs.get('fetched_on', cached.index[-1]))
+        if fetched_on >= pd.Timestamp.today().normalize():
+            return None
+        if enddate is not None and cached.index[-1] >= enddate:
+            return None
+
+        # Re-download the last two bars: the older one verifies that history
+        # was not restated, the newer one may have been an intraday bar.
+        return cached.index[-2] if len(cached) > 1 else startdate
+
+    def get_histories(self, tickers: List[str], startdate: str = '2023-09-01',
+                      enddate: Optional[str] = None,
+                      max_workers: int = MAX_WORKERS) -> Tuple[Dict[str, pd.DataFrame], Dict[str, str]]:
+        """
+        Get daily history for several tickers, downloading only what is missing.
+
+        Args:
+            tickers: Yahoo Finance ticker symbols
+            startdate: First date required
+            enddate: Last date required (None means today)
+            max_workers: Maximum number of concurrent requests per batch
+
+        Returns:
+            tuple: (histories, failures) in the same shape as
+                   market_data.download_history
+        """
+        start_ts = pd.Timestamp(startdate)
+        end_ts = pd.Timestamp(enddate) if enddate is not None else None
+
+        cached = {}
+        plans = {}
+        for ticker in tickers:
+            cached[ticker] = self.load(ticker)
+            plans[ticker] = self._plan_fetch(cached[ticker], start_ts, end_ts)
+
+        # Tickers sharing a fetch start are downloaded together in one batch
+        batches = {}
+        for ticker, fetch_start in plans.items():
+            if fetch_start is not None:
+                batches.setdefault(fetch_start, []).append(ticker)
+
+        merged = {}
+        failures = {}
+        for fetch_start, batch in batches.items():
+            fetched, batch_failures = download_history(
+                batch, fetch_start.strftime('%Y-%m-%d'), enddate, max_workers)
+
+            for ticker in batch:
+                previous = cached[ticker] if fetch_start != start_ts else None
+                tail = fetched.get(ticker)
+
+                if tail is None:
+                    if previous is not None:
+                        # Keep serving the stale cache rather than failing
+                        merged[ticker] = previous
+                    else:
+                        failures[ticker] = batch_failures.get(ticker, "No data available")
+                    continue
+
+                if previous is not None:
+                    overlap = previous.index.intersection(tail.index)
+                    restated = len(overlap) == 0 or not np.allclose(
+                        previous.loc[overlap[:1], 'Close'].values,
+                        tail.loc[overlap[:1], 'Close'].values, rtol=1e-6)
+                    new_split = (tail.loc[tail.index > previous.index[-2], 'Stock Splits'] != 0).any()
+                    if restated or new_split:
+                        logger.info(f"History restated for {ticker}, refreshing from {startdate}")
+                        full, full_failures = download_history([ticker], startdate, enddate, max_workers)
+                        if ticker not in full:
+                            failures[ticker] = full_failures.get(ticker, "No data available")
+                            continue
+                        self._record(hit=False)
+                        merged[ticker] = full[ticker]
+                        self.save(ticker, full[ticker], startdate)
+                        continue
+
+                    kept = previous.loc[previous.index < tail.index[0], PRICE_COLUMNS]
+                    self._record(hit=True, saved_bytes=kept.memory_usage(index=True).sum())
+                    history = pd.concat([kept, tail[PRICE_COLUMNS]])
+                    self.save(ticker, history, previous.attrs.get('requested_start', startdate))
+                else:
+                    self._record(hit=False)
+                    history = tail
+                    self.save(ticker, history, startdate)
+                merged[ticker] = history
+
+        histories = {}
+        for ticker in tickers:
+            if ticker in failures:
+                continue
+            if plans[ticker] is None:
+                history = cached[ticker]
+                self._record(hit=True, saved_bytes=history[PRICE_COLUMNS].memory_usage(index=True).sum())
+            else:
+                history = merged[ticker]
+            histories[ticker] = history.loc[start_ts:end_ts, PRICE_COLUMNS]
+
+        return histories, failures
@@ -1,7 +1,6 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import yfinance as yf
 import matplotlib.pyplot as plt
 from scipy import stats
 import io
@@ -10,8 +9,14 @@ from datetime import datetime
 import hashlib
 import data_manager
 from data_exporter import SMIFDataExporter
+from market_data import fetch_market_data, fetch_monthly_returns
+from price_cache import PriceCache
+from analytics import (ROLLING_WINDOWS, RangeAnalyzer, active_covariance, active_weights, batch_ols,
+                       cohort_performance, holding_stats_by_period, perf_stats_panel, risk_decomposition)
+from ingestion import INCOME_COLUMNS, TRANSACTION_COLUMNS, load_brokerage_files
+from jobs import JobManager, SingleFlight
 import logging
-from github_storage import GitHubStorage, get_cached_data_from_github, clear_github_cache
+from github_storage import BlobCache, get_github_storage, get_cached_data_from_github, clear_github_cache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -40,6 +45,8 @@ try:
         CLASS_SEMESTER = st.secrets['class_period'].get('CLASS_SEMESTER', 'Current Semester')
         CLASS_INITIAL_VALUE = st.secrets['class_period'].get('CLASS_INITIAL_VALUE', INITIAL_PORTFOLIO_VALUE)
         CLASS_BENCHMARK = st.secrets['class_period'].get('CLASS_BENCHMARK', 'VTI')
+        # Earlier (or parallel) semesters to compare, as [[class_period.cohorts]] tables
+        CLASS_COHORTS = [dict(cohort) for cohort in st.secrets['class_period'].get('cohorts', [])]
         
         # GitHub storage configuration
         GITHUB_TOKEN = st.secrets.get('github', {}).get('GITHUB_TOKEN', None)
@@ -55,6 +62,7 @@ try:
         CLASS_SEMESTER = 'Current Semester'
         CLASS_INITIAL_VALUE = INITIAL_PORTFOLIO_VALUE
         CLASS_BENCHMARK = 'VTI'
+        CLASS_COHORTS = []
         
         # GitHub storage disabled in legacy mode
         GITHUB_TOKEN = None
@@ -74,12 +82,157 @@ except (ImportError, KeyError):
     CLASS_SEMESTER = 'Demo Semester'
     CLASS_INITIAL_VALUE = INITIAL_PORTFOLIO_VALUE
     CLASS_BENCHMARK = 'VTI'
+    CLASS_COHORTS = []
     
     # GitHub storage disabled in demo mode
     GITHUB_TOKEN = None
     GITHUB_DATA_REPO = None
     USE_GITHUB_STORAGE = False
 
+@st.cache_resource
+def get_price_cache():
+    """Process-wide on-disk price cache shared by all sessions"""
+    return PriceCache()
+
+@st.cache_resource
+def get_shared_results():
+    """Process-wide processed results shared by all sessions, one entry per data version"""
+    return data_manager.SharedResults()
+
+def set_session_results(results, version):
+    """Publish results to the shared store and point this session at them"""
+    get_shared_results().put(version, results)
+    st.session_state['results_version'] = version
+
+def get_session_results():
+    """This session's results from the shared store, or None if none are loaded"""
+    version = st.session_state.get('results_version')
+    return None if version is None else get_shared_results().get(version)
+
+@st.cache_resource
+def get_processing_flight():
+    """Process-wide coordinator so each data hash is processed by one session at a time"""
+    return SingleFlight()
+
+# Seconds between refreshes of the report job status while it runs
+JOB_POLL_SECONDS = 1
+
+@st.cache_resource
+def get_job_manager():
+    """Process-wide background job pool; jobs outlive the reruns of the session that started them"""
+    return JobManager(max_workers=2)
+
+class StreamlitReporter:
+    """Progress bar, status line and messages on the page, for processing in the script thread"""
+    
+    def __init__(self):
+        self._progress_bar = st.progress(0)
+        self._status_text = st.empty()
+    
+    def update(self, fraction=None, message=None):
+        if fraction is not None:
+            self._progress_bar.progress(fraction)
+        if message is not None:
+            self._status_text.text(message)
+    
+    def warning(self, message):
+        st.warning(message)
+    
+    def error(self, message):
+        st.error(message)
+
+def get_report_job():
+    """This session's running report job, or None"""
+    job_id = st.session_state.get('report_job')
+    job = get_job_manager().get(job_id) if job_id else None
+    return job if job is not None and not job.done else None
+
+def poll_report_job():
+    """Hand a finished report job's results and messages over to this session"""
+    job_id = st.session_state.get('report_job')
+    if job_id is None:
+        return
+    job = get_job_manager().get(job_id)
+    if job is not None and not job.done:
+        return
+    
+    del st.session_state['report_job']
+    if job is None:
+        st.session_state['report_notices'] = [('warning', "The report job is no longer available. Please generate the reports again.")]
+        return
+    
+    notices = list(job.messages)
+    if job.status == 'failed':
+        notices.append(('error', f"Error generating reports: {job.error_message}"))
+    elif job.result:
+        outcome, job.result = job.result, None
+        if outcome['version'] is not None:
+            set_session_results(outcome['results'], outcome['version'])
+            st.session_state['data_source'] = outcome['data_source']
+        if outcome.get('success'):
+            notices.append(('success', outcome['success']))
+    st.session_state['report_notices'] = notices
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def report_job_status():
+    """Progress of this session's running report job; only this fragment reruns while it polls"""
+    job = get_report_job()
+    if job is not None:
+        st.progress(job.progress)
+        st.caption(f"⏳ {job.message} (job {job.id[:8]}). You can keep using the dashboard meanwhile.")
+    else:
+        # The job ended: one full rerun hands its results and messages to the page
+        st.rerun()
+
+def show_report_job():
+    """Progress of this session's running report job, or the messages from its last one"""
+    if get_report_job() is not None:
+        report_job_status()
+    
+    for level, message in st.session_state.pop('report_notices', []):
+        getattr(st, level)(message)
+        if level == 'success':
+            st.balloons()
+
+def generate_reports(job, transaction_data, income_data, upload_info):
+    """
+    Background job behind Generate Reports: process the uploaded files and persist the results.
+    Returns the results and their version for the submitting session to pick up.
+    """
+    results, data_hash = process_with_cache(transaction_data, income_data, reporter=job)
+    if not results:
+        raise RuntimeError("No results were produced from the uploaded files")
+    
+    job.update(message='Saving results...')
+    if USE_GITHUB_STORAGE:
+        try:
+            # Save to GitHub
+            storage = get_github_storage(GITHUB_TOKEN, GITHUB_DATA_REPO)
+            success = storage.upload_files(transaction_data, income_data, upload_info['email'])
+            
+            if success:
+                # Seed the local blob cache so the next load skips the download
+                blob_cache = BlobCache()
+                blob_cache.put(transaction_data)
+                blob_cache.put(income_data)
+                logger.info("Data saved to GitHub successfully")
+                return {'results': results, 'version': data_hash, 'data_source': 'github',
+                        'success': "✅ Reports generated and saved to GitHub successfully!"}
+            job.error("Failed to save to GitHub. Data processed but not persisted.")
+            return {'results': results, 'version': None, 'data_source': None}
+        except Exception as e:
+            logger.error(f"GitHub upload error: {e}")
+            job.error(f"GitHub upload error: {str(e)}")
+            # Fall back to local storage
+            data_manager.save_processed_data(results, upload_info)
+            job.warning("Data saved locally as fallback.")
+            return {'results': results, 'version': data_hash, 'data_source': 'local'}
+    
+    # Use local data manager
+    data_manager.save_processed_data(results, upload_info)
+    return {'results': results, 'version': data_hash, 'data_source': 'local',
+            'success': "✅ Reports generated and saved successfully!"}
+
 def check_password():
     """Returns True if user has correct email and password."""
     
@@ -113,58 +266,6 @@ def check_password():
         # Password correct
         return True
 
-def importYahooData(market, startdate='2023-09-01', enddate=None):
-    """Import data from Yahoo Finance"""
-    try:
-        datax = yf.download(market, interval='1d', start=startdate, end=enddate, actions=True)
-        
-        if datax.empty:
-            st.warning(f"No data available for {market}")
-            return None, None, None, None
-            
-        datax.index = pd.DatetimeIndex(datax.index.strftime('%Y-%m-%d'))
-        datax['Close.Rtns'] = datax['Close'].pct_change()
-        
-        # Handle missing Dividends column
-        if 'Dividends' not in datax.columns:
-            datax['Dividends'] = 0.0
-        
-        # Handle missing Stock Splits column  
-        if 'Stock Splits' not in datax.columns:
-            datax['Stock Splits'] = 0.0
-            
-        datax['Div.Rtns'] = datax['Dividends']/datax['Close'].shift(1)
-        datax['Adj.Rtns'] = datax['Close.Rtns']+datax['Div.Rtns']
-        datax['deltaClose'] = datax['Close'].diff(1)+datax['Dividends']
-        
-        return datax['Close'], datax['Adj.Rtns'], datax['Stock Splits'], datax['deltaClose']
-        
-    except Exception as e:
-        st.error(f"Error downloading data for {market}: {str(e)}")
-        return None, None, None, None
-
-def importMonthlyData(market, years=5):
-    """Import monthly data from Yahoo Finance for Treynor-Black analysis"""
-    try:
-        end_date = pd.to_datetime('today')
-        start_date = end_date - pd.DateOffset(years=years)
-        
-        # Download data
-        datax = yf.download(market, interval='1mo', start=start_date, end=end_date, actions=True)
-        
-        if datax.empty:
-            return None
-            
-        datax.index = pd.DatetimeIndex(datax.index)
-        
-        # Calculate monthly returns using adjusted close
-        datax['Monthly_Return'] = datax['Adj Close'].pct_change()
-        
-        return datax['Monthly_Return'].dropna()
-        
-    except Exception as e:
-        return None
-
 def calcPerfStats(rtns, scale=252):
     """Calculate performance statistics"""
     n = len(rtns.index)
@@ -195,161 +296,427 @@ def calculate_portfolio_nav(smifPort, initV, start_date):
     
     return nav
 
-def calculate_treynor_black_weights(port_mkts, years=5):
+def treynor_black_tickers(port_mkts):
+    """Tickers the Treynor-Black model downloads: VTI, then the holdings without the money market fund"""
+    return list(dict.fromkeys(['VTI'] + [ticker for ticker in port_mkts if ticker != 'NTPXX']))
+
+def calculate_treynor_black_weights(port_mkts, years=5, monthly_returns=None):
     """Calculate Treynor-Black model target weights using monthly data"""
     
-    # Download VTI monthly data first
-    vti_returns = importMonthlyData('VTI', years)
+    # Download every ticker's monthly series once, in a single batch
+    tickers = [ticker for ticker in dict.fromkeys(port_mkts) if ticker != 'NTPXX']
+    if monthly_returns is None:
+        monthly_returns = fetch_monthly_returns(treynor_black_tickers(port_mkts), years)
+    
+    vti_returns = monthly_returns['VTI'].dropna() if 'VTI' in monthly_returns.columns else None
     if vti_returns is None or len(vti_returns) < 12:
         return None, "Insufficient VTI data for analysis"
     
-    # Initialize results dictionary
-    tb_results = {
-        'ticker': [],
-        'alpha': [],
-        'beta': [],
-        'mse': [],
-        'alpha_mse': [],
-        'raw_weight': [],
-        'normalized_weight': []
-    }
+    # Regress every stock on VTI in one batched OLS (pairwise-complete months)
+    candidates = [ticker for ticker in tickers if ticker in monthly_returns.columns]
+    regression = batch_ols(monthly_returns[candidates], vti_returns, min_obs=12)
+    regression = regression.dropna(subset=['beta'])
+    valid_tickers = regression.index.tolist()
     
-    # Calculate statistics for each stock
-    valid_tickers = []
-    for ticker in port_mkts:
-        if ticker == 'NTPXX':  # Skip money market fund
-            continue
-            
-        # Download monthly returns
-        stock_returns = importMonthlyData(ticker, years)
-        
-        if stock_returns is None or len(stock_returns) < 12:
-            continue
-        
-        # Align the data
-        aligned_data = pd.DataFrame({
-            'stock': stock_returns,
-            'vti': vti_returns
-        }).dropna()
-        
-        if len(aligned_data) < 12:  # Need at least 12 months
-            continue
-        
-        # Run regression
-        x = aligned_data['vti'].values
-        y = aligned_data['stock'].values
-        
-        try:
-            # Use scipy's linregress for simple linear regression
-            slope, intercept, r_value, p_value, std_err = stats.linregress(x, y)
-            
-            # Extract statistics
-            alpha = intercept * 12  # Annualize alpha (monthly to annual)
-            beta = slope
-            
-            # Calculate MSE from residuals
-            y_pred = intercept + slope * x
-            residuals = y - y_pred
-            mse = np.mean(residuals ** 2)
-            
-            # Calculate alpha/MSE ratio
-            alpha_mse = alpha / mse if mse > 0 else 0
-            
-            tb_results['ticker'].append(ticker)
-            tb_results['alpha'].append(alpha)
-            tb_results['beta'].append(beta)
-            tb_results['mse'].append(mse)
-            tb_results['alpha_mse'].append(alpha_mse)
-            tb_results['raw_weight'].append(alpha_mse)
-            
-            valid_tickers.append(ticker)
-            
-        except Exception as e:
-            continue
+    tb_df = pd.DataFrame({
+        'ticker': valid_tickers,
+        'alpha': regression['alpha'].values * 12,  # Annualize alpha (monthly to annual)
+        'beta': regression['beta'].values,
+        'mse': regression['mse'].values,
+    })
     
-    # Calculate normalized weights
-    if tb_results['raw_weight']:
-        # Only consider positive alpha/MSE ratios for long positions
-        positive_weights = [max(0, w) for w in tb_results['raw_weight']]
-        total_positive = sum(positive_weights)
-        
-        if total_positive > 0:
-            tb_results['normalized_weight'] = [w / total_positive for w in positive_weights]
-        else:
-            # If no positive weights, equal weight
-            n = len(tb_results['ticker'])
-            tb_results['normalized_weight'] = [1.0 / n] * n
+    # Calculate alpha/MSE ratio
+    tb_df['alpha_mse'] = (tb_df['alpha'] / tb_df['mse'].where(tb_df['mse'] > 0)).fillna(0.0)
+    tb_df['raw_weight'] = tb_df['alpha_mse']
     
-    # Create DataFrame
-    tb_df = pd.DataFrame(tb_results)
+    # Calculate normalized weights
+    # Only consider positive alpha/MSE ratios for long positions
+    positive_weights = tb_df['raw_weight'].clip(lower=0)
+    total_positive = positive_weights.sum()
+    if total_positive > 0:
+        tb_df['normalized_weight'] = positive_weights / total_positive
+    else:
+        # If no positive weights, equal weight
+        tb_df['normalized_weight'] = 1.0 / len(tb_df) if len(tb_df) else 0.0
     
     # Sort by normalized weight descending
     tb_df = tb_df.sort_values('normalized_weight', ascending=False)
     
-    # Calculate covariance matrix of returns
-    returns_data = pd.DataFrame()
-    for ticker in valid_tickers:
-        stock_returns = importMonthlyData(ticker, years)
-        if stock_returns is not None:
-            returns_data[ticker] = stock_returns
-    
-    # Align all returns
-    returns_data = returns_data.dropna()
+    # Calculate covariance matrix of returns, reusing the downloaded series
+    returns_data = monthly_returns[valid_tickers].dropna()
     
     # Calculate covariance matrix (annualized)
     cov_matrix = returns_data.cov() * 12  # Annualize covariance
     
     return tb_df, cov_matrix
 
-def process_smif_data(transaction_file, income_file):
-    """Process SMIF data and generate reports for both inception-to-date and class period"""
+def build_trades_matrix(smifTrade, portMkts, reporting_dates, df_splits):
+    """Align trades to the reporting calendar and restate them in post-split shares"""
+    trade_dates = pd.DatetimeIndex(pd.to_datetime(smifTrade.index))
+    tickers = smifTrade['Ticker/Option Symbol number'].to_numpy()
+    shares = smifTrade['Share/Par Value'].to_numpy(dtype=float)
+    
+    # Snap each trade to the first reporting business day on or after it
+    snap = reporting_dates.searchsorted(trade_dates, side='left')
+    keep = (snap < len(reporting_dates)) & pd.Index(tickers).isin(portMkts)
+    snapped = pd.DataFrame({
+        'date': reporting_dates[snap[keep]],
+        'ticker': tickers[keep],
+        'shares': shares[keep],
+    })
+    # Trades landing on the same day overwrite each other, the later one wins
+    snapped = snapped.drop_duplicates(['date', 'ticker'], keep='last')
+    trades = snapped.pivot(index='date', columns='ticker', values='shares')
+    trades = trades.reindex(index=reporting_dates, columns=portMkts).fillna(0.0)
+    trades = trades.rename_axis(index=None, columns=None)
     
-    progress_bar = st.progress(0)
-    status_text = st.empty()
+    # Each trade is scaled by the product of all split factors after its date:
+    # a reverse cumulative product over the split calendar, looked up per day
+    factors = df_splits.reindex(columns=portMkts).replace(0, 1).fillna(1.0)
+    later_factors = factors.iloc[::-1].cumprod().iloc[::-1].to_numpy()
+    later_factors = np.vstack([later_factors, np.ones((1, len(portMkts)))])
+    first_later_split = df_splits.index.searchsorted(reporting_dates, side='right')
     
+    return trades * later_factors[first_later_split]
+
+class IncompleteResult(ValueError):
+    """Raised from a cached function so a partial result is returned but not cached"""
+    def __init__(self, message, result):
+        super().__init__(message)
+        self.result = result
+
+@st.cache_data(show_spinner=False)
+def _cached_treynor_black_weights(tickers, years, month_end):
+    """Successful Treynor-Black results, memoized on (ticker set, years, month-end)"""
+    # Raising keeps failures and partial downloads (often a transient Yahoo error) out of the cache
+    symbols = treynor_black_tickers(tickers)
+    monthly_returns = fetch_monthly_returns(symbols, years)
+    tb_df, cov_matrix = calculate_treynor_black_weights(list(tickers), years, monthly_returns)
+    if tb_df is None or tb_df.empty:
+        raise ValueError(cov_matrix if tb_df is None else "No stocks with sufficient data")
+    missing = [ticker for ticker in symbols if ticker not in monthly_returns.columns]
+    if missing:
+        raise IncompleteResult(f"No monthly data downloaded for {', '.join(missing)}", (tb_df, cov_matrix))
+    return tb_df, cov_matrix
+
+def get_treynor_black_weights(tickers, years=5, month_end=None):
+    """Treynor-Black weights, or (None, reason) without caching the failure"""
     try:
-        # Read Excel files
-        status_text.text('Reading transaction data...')
-        progress_bar.progress(0.1)
-        smifReport = pd.read_excel(transaction_file)
-        
-        status_text.text('Reading income data...')
-        progress_bar.progress(0.2)
-        smifIncome = pd.read_excel(income_file)
+        return _cached_treynor_black_weights(tickers, years, month_end)
+    except IncompleteResult as e:
+        # Show the weights of the tickers that did download; the next run tries the rest again
+        logger.warning(f"Treynor-Black weights incomplete: {e}")
+        return e.result
+    except ValueError as e:
+        logger.warning(f"Treynor-Black weights unavailable: {e}")
+        return None, str(e)
+
+@st.cache_data(show_spinner=False)
+def get_perf_stats_panel(returns):
+    """Rolling and expanding performance statistics, memoized per returns frame"""
+    return perf_stats_panel(returns, ROLLING_WINDOWS)
+
+@st.cache_data(show_spinner=False)
+def get_holding_stats(periods):
+    """Per-holding statistics for every analysis period, memoized per returns frames"""
+    return holding_stats_by_period(periods, benchmark='VTI')
+
+@st.cache_data(show_spinner=False)
+def get_active_covariance(returns, assets):
+    """Covariance of the active markets, memoized per returns frame and asset set"""
+    return active_covariance(returns, assets)
+
+@st.cache_data(show_spinner=False)
+def get_risk_report(cov, weights):
+    """Active risk decomposition, memoized per covariance matrix and (ticker, weight) vector"""
+    return risk_decomposition(cov, pd.Series(dict(weights)))
+
+@st.cache_resource(max_entries=data_manager.MAX_SHARED_VERSIONS)
+def get_range_analyzer(results_version, _results):
+    """Prefix-array analyzer for a results version, built once and shared by all sessions"""
+    return RangeAnalyzer(_results['returns'], _results.get('portfolio_summary'))
+
+def get_class_cohorts():
+    """Configured class cohorts, always including the current class period"""
+    cohorts = [{
+        'semester': str(cohort.get('semester', f"Cohort {i + 1}")),
+        'start_date': cohort.get('start_date', CLASS_START_DATE),
+        'end_date': cohort.get('end_date') or None,
+        'initial_value': cohort.get('initial_value', INITIAL_PORTFOLIO_VALUE),
+    } for i, cohort in enumerate(CLASS_COHORTS)]
+    if CLASS_SEMESTER not in [cohort['semester'] for cohort in cohorts]:
+        cohorts.append({
+            'semester': CLASS_SEMESTER,
+            'start_date': CLASS_START_DATE,
+            'end_date': CLASS_END_DATE or None,
+            'initial_value': CLASS_INITIAL_VALUE,
+        })
+    return sorted(cohorts, key=lambda cohort: pd.Timestamp(cohort['start_date']))
+
+@st.cache_data(show_spinner=False)
+def get_cohort_performance(summary, benchmark_returns, cohorts):
+    """All cohorts' NAV and statistics in one pass, memoized per summary and cohort table"""
+    return cohort_performance(summary, benchmark_returns, cohorts, benchmark=CLASS_BENCHMARK)
+
+def current_month_end():
+    """Month-end date used to roll the Treynor-Black cache once a month"""
+    return (pd.Timestamp.today().normalize() + pd.offsets.MonthEnd(0)).strftime('%Y-%m-%d')
+
+def parse_income(smifIncome):
+    """Daily income and expense totals from the income report"""
+    def emptyStr(x): return(str(x).strip()!='')
+    x = smifIncome['Recognition date'].to_list()
+    smif_Income = smifIncome.loc[list(map(emptyStr,x)), ['Narrative - Short','Recognition date', 'Net amount - base']]
+    smif_Income = smif_Income.set_index(smif_Income['Recognition date'])[['Narrative - Short','Net amount - base']]
+    smif_Income.index = pd.to_datetime(smif_Income.index)
+    return smif_Income.groupby(['Recognition date']).apply('sum')['Net amount - base']
+
+def get_port_mkts(smifReport):
+    """Portfolio tickers in order of first appearance, without the money market fund"""
+    portMkts = smifReport['Ticker/Option Symbol number'].tolist()
+    portMkts = sorted(set(portMkts), key=portMkts.index)
+    if 'NTPXX' in portMkts:
+        portMkts.remove('NTPXX')
+    return portMkts
+
+def parse_trades(smifReport):
+    """Transactions summed per trade date and ticker, indexed by trade date"""
+    smifTrade = smifReport[['D-TRADE','Share/Par Value','A-PRIN-TRD-BSE','Ticker/Option Symbol number']]
+    smifTrade = smifTrade.groupby(['D-TRADE','Ticker/Option Symbol number']).apply('sum')
+    return smifTrade.reset_index(level='Ticker/Option Symbol number')
+
+def get_trade_costs(smifTrade):
+    """Daily trade costs, excluding money market sweeps"""
+    smifTrade_filtered = smifTrade.loc[smifTrade['Ticker/Option Symbol number']!='NTPXX']
+    return smifTrade_filtered.groupby(['D-TRADE']).apply('sum')['A-PRIN-TRD-BSE']
+
+def value_holdings(positions, df_close, portMkts, tradeCosts, smif_Income):
+    """Market values, weights and daily portfolio summary for a block of positions"""
+    # Reindex df_close to match positions index, forward filling missing values
+    # This handles cases where market data ends before transaction dates
+    MktClose = df_close.reindex(positions.index, method='ffill')
+    
+    MktValue = pd.DataFrame(positions[portMkts].values * MktClose[portMkts].values, 
+                           columns=portMkts, index=positions.index)
+    
+    # Portfolio weights
+    weights = MktValue.divide(MktValue.sum(axis=1), axis=0)
+    
+    # Portfolio components
+    smifPort = pd.DataFrame(0.0, columns=['MktValue','Cost','Cash'], index=positions.index)
+    smifPort['MktValue'] = MktValue.sum(axis=1)
+    smifPort['Cost'] = tradeCosts.reindex(smifPort.index)
+    smifPort['Cash'] = smif_Income.reindex(smifPort.index)
+    smifPort.fillna(0, inplace=True)
+    return MktValue, weights, smifPort
+
+def get_split_events(df_splits, portMkts):
+    """Split events for the given tickers as [date, ticker, factor] lists"""
+    splits = df_splits.reindex(columns=portMkts).fillna(0.0)
+    events = splits.stack()
+    events = events[events != 0]
+    return [[date.strftime('%Y-%m-%d'), ticker, float(factor)] for (date, ticker), factor in events.items()]
+
+def get_history_hash(smifReport, smifIncome, through):
+    """Fingerprint of the transaction and income rows dated on or before a date"""
+    trade_dates = pd.to_datetime(smifReport['D-TRADE'], errors='coerce')
+    income_dates = pd.to_datetime(smifIncome['Recognition date'], errors='coerce')
+    digest = hashlib.sha256()
+    for frame in (smifReport.loc[trade_dates <= through, TRANSACTION_COLUMNS],
+                  smifIncome.loc[income_dates <= through, INCOME_COLUMNS]):
+        digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def get_ingest_state(smifReport, smifIncome, through, df_splits, portMkts):
+    """What processed results depend on up to their last date, to check before extending them"""
+    settings = get_processing_config()
+    settings.pop('as_of')
+    return {
+        'through': through.strftime('%Y-%m-%d'),
+        'history': get_history_hash(smifReport, smifIncome, through),
+        'splits': get_split_events(df_splits, portMkts),
+        'settings': settings,
+    }
+
+def extend_holdings(previous, smifReport, smifIncome, smifTrade, smif_Income, portMkts, df_close, df_splits):
+    """
+    Extend previous positions, market values, weights and portfolio summary
+    with the reporting dates after their last date.
+    
+    Returns None when the previous results can't be extended: rows on or before
+    their last date changed, splits were added or restated, or the processing
+    settings changed. The caller then rebuilds from scratch.
+    """
+    state = previous.get('ingest_state') if previous is not None else None
+    if not state:
+        return None
+    through = pd.Timestamp(state['through'])
+    current = get_ingest_state(smifReport, smifIncome, through, df_splits, list(previous['port_mkts']))
+    if current != state:
+        changed = [key for key in state if state[key] != current.get(key)]
+        logger.info(f"Rebuilding results, changed since {state['through']}: {', '.join(changed)}")
+        return None
+    
+    # Previous frames with any new tickers added as empty columns
+    prev_positions = previous['positions'].reindex(columns=portMkts, fill_value=0.0)
+    prev_market_values = previous['market_values'].reindex(columns=portMkts, fill_value=0.0)
+    prev_weights = previous['weights'].reindex(columns=portMkts, fill_value=0.0)
+    
+    # Only the reporting dates after the last processed one are computed
+    new_trades = smifTrade.loc[pd.to_datetime(smifTrade.index) > through]
+    max_date = pd.to_datetime(smifTrade.index).max()
+    new_dates = pd.date_range(start=through + pd.offsets.BDay(1), end=max_date, freq='B')
+    
+    trades = build_trades_matrix(new_trades, portMkts, new_dates, df_splits)
+    new_positions = trades.cumsum() + prev_positions.iloc[-1]
+    tradeCosts = get_trade_costs(smifTrade)
+    new_market_values, new_weights, new_port = value_holdings(new_positions, df_close, portMkts, tradeCosts, smif_Income)
+    
+    logger.info(f"Extending results from {state['through']} by {len(new_dates)} reporting days")
+    return (
+        pd.concat([prev_positions, new_positions]),
+        pd.concat([prev_market_values, new_market_values]),
+        pd.concat([prev_weights, new_weights]),
+        pd.concat([previous['portfolio_summary'], new_port]),
+        tradeCosts,
+    )
+
+def build_results(positions, MktValue, weights, smifPort, tradeCosts, portMkts, df_rtn, reporter):
+    """NAV, returns and class-period views from the daily holdings"""
+    # Calculate inception-to-date NAV and returns
+    reporter.update(0.85, 'Calculating inception-to-date performance...')
+    inception_nav = calculate_portfolio_nav(smifPort, INITIAL_PORTFOLIO_VALUE, '2023-09-14')
+    inception_returns = inception_nav.pct_change()
+    inception_returns.fillna(0, inplace=True)
+    inception_returns = pd.DataFrame(inception_returns.values, columns=['SMIF'], index=pd.DatetimeIndex(inception_returns.index))
+    
+    # Calculate class period NAV and returns
+    reporter.update(0.9, 'Calculating class period performance...')
+    class_start_dt = pd.to_datetime(CLASS_START_DATE)
+    class_end_dt = pd.to_datetime(CLASS_END_DATE) if CLASS_END_DATE else pd.to_datetime('today')
+    
+    # Find the closest available date to class start
+    available_dates = inception_nav.index
+    
+    # Safety check: ensure we have data for the requested period
+    if class_start_dt > available_dates[-1]:
+        # Class start is after all available data - use the last available date
+        class_start_actual = available_dates[-1]
+        reporter.warning(f"⚠️ Class start date ({CLASS_START_DATE}) is after available data. Using {class_start_actual.strftime('%Y-%m-%d')} instead.")
+    elif class_start_dt < available_dates[0]:
+        # Class start is before available data - use the first available date
+        class_start_actual = available_dates[0]
+        reporter.warning(f"⚠️ Class start date ({CLASS_START_DATE}) is before available data. Using {class_start_actual.strftime('%Y-%m-%d')} instead.")
+    else:
+        # Find the closest business day on or after class start
+        future_dates = available_dates[available_dates >= class_start_dt]
+        class_start_actual = future_dates[0] if len(future_dates) > 0 else available_dates[-1]
+    
+    try:
+        class_nav = calculate_portfolio_nav(smifPort, CLASS_INITIAL_VALUE, class_start_actual)
+        class_returns = class_nav.pct_change()
+        class_returns.fillna(0, inplace=True)
+        class_returns = pd.DataFrame(class_returns.values, columns=['SMIF'], index=pd.DatetimeIndex(class_returns.index))
+    except Exception as e:
+        reporter.error(f"Error calculating class period performance: {str(e)}")
+        # Fallback to inception data
+        class_nav = inception_nav.copy()
+        class_returns = inception_returns.copy()
+        class_start_actual = available_dates[0]
+    
+    # Filter class period data
+    class_end_actual = min(class_end_dt, available_dates[-1])
+    class_mask = (class_returns.index >= class_start_actual) & (class_returns.index <= class_end_actual)
+    class_returns_filtered = class_returns.loc[class_mask]
+    class_nav_filtered = class_nav.loc[class_mask]
+    
+    # Combine with benchmark returns for both periods
+    reporter.update(0.95, 'Combining with benchmark data...')
+    
+    # Inception-to-date analysis
+    inception_combined = inception_returns.join(df_rtn, how='outer')
+    inception_combined = inception_combined.iloc[1:, :]  # Start from second day
+    inception_combined = inception_combined.fillna(0)
+    inception_nav_combined = (1+inception_combined).cumprod()
+    
+    # Class period analysis  
+    # Use reindex to align df_rtn with class_returns_filtered, filling missing values with 0
+    df_rtn_reindexed = df_rtn.reindex(class_returns_filtered.index, fill_value=0)
+    class_combined = class_returns_filtered.join(df_rtn_reindexed, how='outer')
+    class_combined = class_combined.iloc[1:, :] if len(class_combined) > 1 else class_combined  # Start from second day
+    class_combined = class_combined.fillna(0)
+    class_nav_combined = (1+class_combined).cumprod()
+    
+    # Create masks for positions, weights, and market values (which have different indices)
+    # Ensure we have valid data before creating masks
+    try:
+        positions_mask = (positions.index >= class_start_actual) & (positions.index <= class_end_actual)
+        weights_mask = (weights.index >= class_start_actual) & (weights.index <= class_end_actual)
+        mktvalue_mask = (MktValue.index >= class_start_actual) & (MktValue.index <= class_end_actual)
+    except Exception as e:
+        reporter.warning(f"Issue with class period filtering: {str(e)}. Using full dataset.")
+        # Create empty masks as fallback
+        positions_mask = pd.Series([False] * len(positions), index=positions.index)
+        weights_mask = pd.Series([False] * len(weights), index=weights.index)
+        mktvalue_mask = pd.Series([False] * len(MktValue), index=MktValue.index)
+    
+    reporter.update(1.0, 'Analysis complete!')
+    
+    return {
+        # Inception-to-date data
+        'returns': inception_combined,
+        'nav': inception_nav_combined,
+        'positions': positions,
+        'market_values': MktValue,
+        'weights': weights,
+        'portfolio_summary': smifPort,
+        'trade_costs': tradeCosts,
+        'port_mkts': portMkts,
+        
+        # Class period data
+        'class_returns': class_combined,
+        'class_nav': class_nav_combined,
+        'class_start_date': class_start_actual,
+        'class_end_date': class_end_actual,
+        'class_semester': CLASS_SEMESTER,
+        'class_initial_value': CLASS_INITIAL_VALUE,
+        
+        # Filter class period positions and weights with appropriate masks
+        'class_positions': positions.loc[positions_mask] if any(positions_mask) else positions.iloc[:0],
+        'class_weights': weights.loc[weights_mask] if any(weights_mask) else weights.iloc[:0],
+        'class_market_values': MktValue.loc[mktvalue_mask] if any(mktvalue_mask) else MktValue.iloc[:0],
+    }
+
+def process_smif_data(transaction_file, income_file, previous=None, reporter=None):
+    """
+    Process SMIF data and generate reports for both inception-to-date and class period.
+    When previous results are given and the new files only add newer rows, their
+    holdings are extended with the new dates instead of rebuilt. Progress and
+    messages go to reporter (a background job), or to the page if None.
+    """
+    
+    reporter = reporter or StreamlitReporter()
+    
+    try:
+        # Read Excel files (parsed concurrently, or loaded from the ingestion cache)
+        reporter.update(0.1, 'Reading transaction and income data...')
+        smifReport, smifIncome = load_brokerage_files(transaction_file, income_file)
+        reporter.update(0.2)
         
         # Process income report
-        status_text.text('Processing income data...')
-        progress_bar.progress(0.3)
-        def emptyStr(x): return(str(x).strip()!='')
-        x = smifIncome['Recognition date'].to_list()
-        smif_Income = smifIncome.loc[list(map(emptyStr,x)), ['Narrative - Short','Recognition date', 'Net amount - base']]
-        smif_Income = smif_Income.set_index(smif_Income['Recognition date'])[['Narrative - Short','Net amount - base']]
-        smif_Income.index = pd.to_datetime(smif_Income.index)
-        smif_Income = smif_Income.groupby(['Recognition date']).apply('sum')['Net amount - base']
+        reporter.update(0.3, 'Processing income data...')
+        smif_Income = parse_income(smifIncome)
         
         # Get portfolio markets
-        status_text.text('Extracting portfolio tickers...')
-        progress_bar.progress(0.4)
-        portMkts = smifReport['Ticker/Option Symbol number'].tolist()
-        portMkts = sorted(set(portMkts), key=portMkts.index)
-        if 'NTPXX' in portMkts:
-            portMkts.remove('NTPXX')
+        reporter.update(0.4, 'Extracting portfolio tickers...')
+        portMkts = get_port_mkts(smifReport)
         
         # Download market data
-        status_text.text('Downloading market data from Yahoo Finance...')
-        progress_bar.progress(0.5)
-        dates = pd.date_range('2023-09-01', pd.to_datetime('today').strftime('%Y-%m-%d'), freq='B')
-        df_close = pd.DataFrame(np.nan, columns=portMkts, index=dates)
-        df_rtn = pd.DataFrame(np.nan, columns=portMkts, index=dates)
-        df_splits = pd.DataFrame(np.nan, columns=portMkts, index=dates)
-        
-        for i, market in enumerate(portMkts):
-            close_data, rtn_data, splits_data, _ = importYahooData(market, '2023-09-01')
-            if close_data is not None:
-                df_close[market] = close_data
-                df_rtn[market] = rtn_data
-                df_splits[market] = splits_data
-            progress_bar.progress(0.5 + (i / len(portMkts)) * 0.2)
+        reporter.update(0.5, 'Downloading market data from Yahoo Finance...')
+        df_close, df_rtn, df_splits, failures = fetch_market_data(portMkts, '2023-09-01', cache=get_price_cache())
+        for market, reason in failures.items():
+            reporter.warning(f"No data available for {market}: {reason}")
+        reporter.update(0.7)
         
         # Only keep dates where we have data for at least one stock
         # This prevents losing all data if one stock has missing values
@@ -358,197 +725,135 @@ def process_smif_data(transaction_file, income_file):
         df_splits.fillna(0, inplace=True)
         
         # Process transactions
-        status_text.text('Processing transactions...')
-        progress_bar.progress(0.7)
+        reporter.update(0.7, 'Processing transactions...')
         
         # First, process smifTrade to get actual transaction dates
-        smifTrade = smifReport[['D-TRADE','Share/Par Value','A-PRIN-TRD-BSE','Ticker/Option Symbol number']]
-        smifTrade = smifTrade.groupby(['D-TRADE','Ticker/Option Symbol number']).apply('sum')
-        smifTrade = smifTrade.reset_index(level='Ticker/Option Symbol number')
-        
-        # Get the actual transaction date range from the data
-        transaction_dates = pd.to_datetime(smifTrade.index).unique()
-        min_date = max(transaction_dates.min(), pd.to_datetime('2023-09-14'))
-        max_date = transaction_dates.max()
-        
-        # Create reporting dates based on actual transaction range
-        # This ensures we show the full date range of the transactions
-        reporting_dates = pd.date_range(start=min_date, end=max_date, freq='B')
-        
-        trades = pd.DataFrame(0.0, columns=portMkts, index=reporting_dates)
-        
-        for ticker in trades.columns:
-            # Get trades for this ticker
-            ticker_trades = smifTrade.loc[smifTrade['Ticker/Option Symbol number'] == ticker]
-            
-            if not ticker_trades.empty:
-                # Align trade dates with our reporting dates
-                for trade_date, trade_row in ticker_trades.iterrows():
-                    trade_date_dt = pd.to_datetime(trade_date)
-                    
-                    # Find the nearest business day in our reporting dates
-                    if trade_date_dt in reporting_dates:
-                        trades.loc[trade_date_dt, ticker] = trade_row['Share/Par Value']
-                    else:
-                        # Find next available business day
-                        next_dates = reporting_dates[reporting_dates >= trade_date_dt]
-                        if len(next_dates) > 0:
-                            trades.loc[next_dates[0], ticker] = trade_row['Share/Par Value']
-                
-                # Handle stock splits
-                tradeDates = trades.loc[trades[ticker] != 0, ticker].index
-                if len(tradeDates) > 0:
-                    splitDates = df_splits.loc[df_splits[ticker] != 0, ticker].index
-                    if len(splitDates) > 0:
-                        for k in splitDates:
-                            splitFactor = df_splits.loc[k, ticker]
-                            tradesBeforeSplit = (trades.index < k)
-                            trades.loc[tradesBeforeSplit, ticker] *= splitFactor
-        
-        positions = trades.cumsum()
-        
-        # Calculate market values and performance
-        status_text.text('Calculating performance metrics...')
-        progress_bar.progress(0.8)
+        smifTrade = parse_trades(smifReport)
         
-        # Reindex df_close to match positions index, forward filling missing values
-        # This handles cases where market data ends before transaction dates
-        MktClose = df_close.reindex(positions.index, method='ffill')
-        
-        MktValue = pd.DataFrame(positions[portMkts].values * MktClose[portMkts].values, 
-                               columns=portMkts, index=positions.index)
-        
-        # Portfolio weights
-        weights = MktValue.divide(MktValue.sum(axis=1), axis=0)
-        
-        # Trade costs
-        smifTrade_filtered = smifTrade.loc[smifTrade['Ticker/Option Symbol number']!='NTPXX']
-        tradeCosts = smifTrade_filtered.groupby(['D-TRADE']).apply('sum')['A-PRIN-TRD-BSE']
-        
-        # Portfolio components
-        smifPort = pd.DataFrame(0.0, columns=['MktValue','Cost','Cash'], index=reporting_dates)
-        smifPort['MktValue'] = MktValue.sum(axis=1)
-        smifPort['Cost'] = tradeCosts
-        smifPort['Cash'] = smif_Income
-        smifPort.fillna(0, inplace=True)
-        smifPort.loc['2023-09-14','Cash'] = INITIAL_PORTFOLIO_VALUE
-        
-        # Calculate inception-to-date NAV and returns
-        status_text.text('Calculating inception-to-date performance...')
-        progress_bar.progress(0.85)
-        inception_nav = calculate_portfolio_nav(smifPort, INITIAL_PORTFOLIO_VALUE, '2023-09-14')
-        inception_returns = inception_nav.pct_change()
-        inception_returns.fillna(0, inplace=True)
-        inception_returns = pd.DataFrame(inception_returns.values, columns=['SMIF'], index=pd.DatetimeIndex(inception_returns.index))
-        
-        # Calculate class period NAV and returns
-        status_text.text('Calculating class period performance...')
-        progress_bar.progress(0.9)
-        class_start_dt = pd.to_datetime(CLASS_START_DATE)
-        class_end_dt = pd.to_datetime(CLASS_END_DATE) if CLASS_END_DATE else pd.to_datetime('today')
-        
-        # Find the closest available date to class start
-        available_dates = inception_nav.index
-        
-        # Safety check: ensure we have data for the requested period
-        if class_start_dt > available_dates[-1]:
-            # Class start is after all available data - use the last available date
-            class_start_actual = available_dates[-1]
-            st.warning(f"⚠️ Class start date ({CLASS_START_DATE}) is after available data. Using {class_start_actual.strftime('%Y-%m-%d')} instead.")
-        elif class_start_dt < available_dates[0]:
-            # Class start is before available data - use the first available date
-            class_start_actual = available_dates[0]
-            st.warning(f"⚠️ Class start date ({CLASS_START_DATE}) is before available data. Using {class_start_actual.strftime('%Y-%m-%d')} instead.")
+        # Extend the previous results if only newer rows were added
+        holdings = extend_holdings(previous, smifReport, smifIncome, smifTrade, smif_Income, portMkts, df_close, df_splits)
+        if holdings is not None:
+            positions, MktValue, weights, smifPort, tradeCosts = holdings
+            reporter.update(0.8, 'Calculating performance metrics...')
         else:
-            # Find the closest business day on or after class start
-            future_dates = available_dates[available_dates >= class_start_dt]
-            class_start_actual = future_dates[0] if len(future_dates) > 0 else available_dates[-1]
-        
-        try:
-            class_nav = calculate_portfolio_nav(smifPort, CLASS_INITIAL_VALUE, class_start_actual)
-            class_returns = class_nav.pct_change()
-            class_returns.fillna(0, inplace=True)
-            class_returns = pd.DataFrame(class_returns.values, columns=['SMIF'], index=pd.DatetimeIndex(class_returns.index))
-        except Exception as e:
-            st.error(f"Error calculating class period performance: {str(e)}")
-            # Fallback to inception data
-            class_nav = inception_nav.copy()
-            class_returns = inception_returns.copy()
-            class_start_actual = available_dates[0]
-        
-        # Filter class period data
-        class_end_actual = min(class_end_dt, available_dates[-1])
-        class_mask = (class_returns.index >= class_start_actual) & (class_returns.index <= class_end_actual)
-        class_returns_filtered = class_returns.loc[class_mask]
-        class_nav_filtered = class_nav.loc[class_mask]
-        
-        # Combine with benchmark returns for both periods
-        status_text.text('Combining with benchmark data...')
-        progress_bar.progress(0.95)
-        
-        # Inception-to-date analysis
-        inception_combined = inception_returns.join(df_rtn, how='outer')
-        inception_combined = inception_combined.iloc[1:, :]  # Start from second day
-        inception_combined = inception_combined.fillna(0)
-        inception_nav_combined = (1+inception_combined).cumprod()
-        
-        # Class period analysis  
-        # Use reindex to align df_rtn with class_returns_filtered, filling missing values with 0
-        df_rtn_reindexed = df_rtn.reindex(class_returns_filtered.index, fill_value=0)
-        class_combined = class_returns_filtered.join(df_rtn_reindexed, how='outer')
-        class_combined = class_combined.iloc[1:, :] if len(class_combined) > 1 else class_combined  # Start from second day
-        class_combined = class_combined.fillna(0)
-        class_nav_combined = (1+class_combined).cumprod()
-        
-        # Create masks for positions, weights, and market values (which have different indices)
-        # Ensure we have valid data before creating masks
-        try:
-            positions_mask = (positions.index >= class_start_actual) & (positions.index <= class_end_actual)
-            weights_mask = (weights.index >= class_start_actual) & (weights.index <= class_end_actual)
-            mktvalue_mask = (MktValue.index >= class_start_actual) & (MktValue.index <= class_end_actual)
-        except Exception as e:
-            st.warning(f"Issue with class period filtering: {str(e)}. Using full dataset.")
-            # Create empty masks as fallback
-            positions_mask = pd.Series([False] * len(positions), index=positions.index)
-            weights_mask = pd.Series([False] * len(weights), index=weights.index)
-            mktvalue_mask = pd.Series([False] * len(MktValue), index=MktValue.index)
-        
-        progress_bar.progress(1.0)
-        status_text.text('Analysis complete!')
-        
-        return {
-            # Inception-to-date data
-            'returns': inception_combined,
-            'nav': inception_nav_combined,
-            'positions': positions,
-            'market_values': MktValue,
-            'weights': weights,
-            'portfolio_summary': smifPort,
-            'trade_costs': tradeCosts,
-            'port_mkts': portMkts,
+            # Get the actual transaction date range from the data
+            transaction_dates = pd.to_datetime(smifTrade.index).unique()
+            min_date = max(transaction_dates.min(), pd.to_datetime('2023-09-14'))
+            max_date = transaction_dates.max()
+            
+            # Create reporting dates based on actual transaction range
+            # This ensures we show the full date range of the transactions
+            reporting_dates = pd.date_range(start=min_date, end=max_date, freq='B')
             
-            # Class period data
-            'class_returns': class_combined,
-            'class_nav': class_nav_combined,
-            'class_start_date': class_start_actual,
-            'class_end_date': class_end_actual,
-            'class_semester': CLASS_SEMESTER,
-            'class_initial_value': CLASS_INITIAL_VALUE,
+            trades = build_trades_matrix(smifTrade, portMkts, reporting_dates, df_splits)
             
-            # Filter class period positions and weights with appropriate masks
-            'class_positions': positions.loc[positions_mask] if any(positions_mask) else positions.iloc[:0],
-            'class_weights': weights.loc[weights_mask] if any(weights_mask) else weights.iloc[:0],
-            'class_market_values': MktValue.loc[mktvalue_mask] if any(mktvalue_mask) else MktValue.iloc[:0],
-        }
+            positions = trades.cumsum()
+            
+            # Calculate market values and performance
+            reporter.update(0.8, 'Calculating performance metrics...')
+            
+            # Trade costs
+            tradeCosts = get_trade_costs(smifTrade)
+            
+            MktValue, weights, smifPort = value_holdings(positions, df_close, portMkts, tradeCosts, smif_Income)
+            smifPort.loc['2023-09-14','Cash'] = INITIAL_PORTFOLIO_VALUE
+        
+        results = build_results(positions, MktValue, weights, smifPort, tradeCosts, portMkts, df_rtn, reporter)
+        results['ingest_state'] = get_ingest_state(smifReport, smifIncome, positions.index[-1], df_splits, portMkts)
+        return results
         
     except Exception as e:
-        st.error(f"Error processing data: {str(e)}")
+        reporter.error(f"Error processing data: {str(e)}")
         return None
 
+def get_processing_config():
+    """Settings that change the processed results for the same input files"""
+    return {
+        'initial_portfolio_value': INITIAL_PORTFOLIO_VALUE,
+        'class_start_date': CLASS_START_DATE,
+        'class_end_date': CLASS_END_DATE,
+        'class_semester': CLASS_SEMESTER,
+        'class_initial_value': CLASS_INITIAL_VALUE,
+        # Market data runs up to today, so results roll over daily
+        'as_of': pd.Timestamp.today().strftime('%Y-%m-%d'),
+    }
+
+def process_with_cache(transaction_data, income_data, reporter=None):
+    """Process raw file bytes, reusing or extending previously cached results"""
+    data_hash = data_manager.compute_data_hash(transaction_data, income_data, get_processing_config())
+    # Another session may already hold these results in memory
+    results = get_shared_results().get(data_hash)
+    if results is not None:
+        return results, data_hash
+    
+    # Sessions asking for the same data at once wait for one run instead of each downloading and processing
+    if get_processing_flight().in_flight(data_hash):
+        waiting = "⏳ Another user is processing this data; waiting for their results..."
+        if reporter is not None:
+            reporter.update(message=waiting)
+        else:
+            st.info(waiting)
+    results = get_processing_flight().do(data_hash, load_or_process, transaction_data, income_data, data_hash, reporter)
+    return results, data_hash
+
+def load_or_process(transaction_data, income_data, data_hash, reporter=None):
+    """Results for a data hash from the disk cache, or processed and cached; published to all sessions"""
+    results = data_manager.load_cached_results(data_hash)
+    if results is not None:
+        logger.info(f"Using cached results for data hash {data_hash[:12]}")
+    else:
+        # The latest cached results are extended if the new files only add newer rows
+        previous = data_manager.load_latest_cached_results()
+        results = process_smif_data(io.BytesIO(transaction_data), io.BytesIO(income_data), previous, reporter)
+        if results:
+            data_manager.save_cached_results(data_hash, results)
+    if results:
+        get_shared_results().put(data_hash, results)
+    return results
+
+# Exporter method that builds each Data Export Hub format
+EXPORT_BUILDERS = {
+    'excel': 'to_excel_workbook',
+    'csv': 'to_csv_package',
+    'pickle': 'to_pickle_data',
+    'json': 'to_json_stream',
+}
+
+@st.cache_resource(max_entries=data_manager.MAX_SHARED_VERSIONS)
+def get_export_cache(results_version):
+    """Process-wide export bytes for a results version, keyed by (export_period, fmt) and shared by all sessions"""
+    return {}
+
+def get_cached_export(exporter, fmt, results_version, export_period):
+    """Return an export's bytes if already built for this results version and period, else None"""
+    return get_export_cache(results_version).get((export_period, fmt))
+
+def build_export(exporter, fmt, results_version, export_period):
+    """Build an export format on demand, once per process for concurrent sessions, and cache it"""
+    def build():
+        cache = get_export_cache(results_version)
+        if (export_period, fmt) not in cache:
+            output = getattr(exporter, EXPORT_BUILDERS[fmt])()
+            cache[(export_period, fmt)] = output.getvalue() if hasattr(output, 'getvalue') else output
+        return cache[(export_period, fmt)]
+    return get_processing_flight().do(('export', results_version, export_period, fmt), build)
+
+def export_download(exporter, fmt, results_version, export_period, prepare_label, **download_kwargs):
+    """Show a prepare button until the export is built, then its download button"""
+    data = get_cached_export(exporter, fmt, results_version, export_period)
+    if data is None and st.button(prepare_label, key=f"prepare_{fmt}"):
+        with st.spinner('Preparing export...'):
+            data = build_export(exporter, fmt, results_version, export_period)
+    if data is not None:
+        st.download_button(data=data, key=f"download_{fmt}", **download_kwargs)
+
 def main():
     if not check_password():
         return
     
+    # Pick up the results of a report job that finished since the last run
+    poll_report_job()
+    
     # Sidebar
     st.sidebar.title("📈 SMIF Dashboard")
     if 'user_email' in st.session_state:
@@ -556,6 +861,12 @@ def main():
     else:
         st.sidebar.write("Please log in to access the dashboard.")
     
+    cache_stats = get_price_cache().stats()
+    st.sidebar.caption(
+        f"📦 Price cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+        f"{cache_stats['bytes_saved'] / 1024:,.0f} KB saved"
+    )
+    
     if st.sidebar.button("Logout"):
         for key in list(st.session_state.keys()):
             del st.session_state[key]
@@ -565,8 +876,8 @@ def main():
     st.title(f"📊 {APP_TITLE}")
     st.markdown("---")
     
-    # Load existing data if available
-    if 'results' not in st.session_state:
+    # Load existing data if available (a version dropped from the shared store is reloaded)
+    if get_session_results() is None:
         # Try GitHub storage first
         if USE_GITHUB_STORAGE:
             try:
@@ -575,13 +886,10 @@ def main():
                     transaction_data, income_data, github_metadata = get_cached_data_from_github(GITHUB_TOKEN, GITHUB_DATA_REPO)
                     
                     if transaction_data and income_data:
-                        # Process the data
-                        transaction_file = io.BytesIO(transaction_data)
-                        income_file = io.BytesIO(income_data)
-                        
-                        results = process_smif_data(transaction_file, income_file)
+                        # Process the data, reusing results for identical files
+                        results, data_hash = process_with_cache(transaction_data, income_data)
                         if results:
-                            st.session_state['results'] = results
+                            set_session_results(results, data_hash)
                             st.session_state['data_source'] = 'github'
                             st.session_state['github_metadata'] = github_metadata
                             # Store file sizes for metadata display
@@ -597,9 +905,14 @@ def main():
                 st.error(f"Error loading from GitHub: {str(e)}")
         
         # Fall back to local data manager if no GitHub data
-        if 'results' not in st.session_state and data_manager.data_exists():
-            st.session_state['results'] = data_manager.load_processed_data()
-            st.session_state['data_source'] = 'local'
+        if get_session_results() is None and data_manager.data_exists():
+            version = data_manager.local_results_version()
+            results = get_shared_results().get(version)
+            if results is None:
+                results = data_manager.load_processed_data()
+            if results is not None:
+                set_session_results(results, version)
+                st.session_state['data_source'] = 'local'
     
     # Data overview section
     # Use GitHub metadata if available, otherwise local metadata
@@ -632,14 +945,15 @@ def main():
                 }
             }
             # Update portfolio summary from results if available
-            if 'results' in st.session_state:
-                if 'port_mkts' in st.session_state['results']:
-                    metadata['portfolio_summary']['tickers'] = st.session_state['results']['port_mkts']
-                    metadata['portfolio_summary']['num_positions'] = len(st.session_state['results']['port_mkts'])
+            session_results = get_session_results()
+            if session_results is not None:
+                if 'port_mkts' in session_results:
+                    metadata['portfolio_summary']['tickers'] = session_results['port_mkts']
+                    metadata['portfolio_summary']['num_positions'] = len(session_results['port_mkts'])
                     
                     # Add date range from portfolio_summary data
-                    if 'portfolio_summary' in st.session_state['results'] and not st.session_state['results']['portfolio_summary'].empty:
-                        portfolio_data = st.session_state['results']['portfolio_summary']
+                    if 'portfolio_summary' in session_results and not session_results['portfolio_summary'].empty:
+                        portfolio_data = session_results['portfolio_summary']
                         metadata['portfolio_summary']['date_range']['start'] = portfolio_data.index[0].isoformat()
                         metadata['portfolio_summary']['date_range']['end'] = portfolio_data.index[-1].isoformat()
         else:
@@ -661,8 +975,9 @@ def main():
             )
         
         with col2:
-            if 'results' in st.session_state and 'port_mkts' in st.session_state['results']:
-                num_positions = len(st.session_state['results']['port_mkts'])
+            session_results = get_session_results()
+            if session_results is not None and 'port_mkts' in session_results:
+                num_positions = len(session_results['port_mkts'])
             else:
                 num_positions = metadata.get('portfolio_summary', {}).get('num_positions', 'N/A')
             st.metric("Portfolio Positions", num_positions)
@@ -718,8 +1033,12 @@ def main():
                 # Clear local data
                 data_manager.delete_data()
             
+            data_manager.clear_cached_results()
+            get_shared_results().clear()
+            get_export_cache.clear()
+            
             # Clear session state
-            for key in ['results', 'data_source', 'github_metadata', 'github_file_sizes']:
+            for key in ['results_version', 'data_source', 'github_metadata', 'github_file_sizes']:
                 if key in st.session_state:
                     del st.session_state[key]
             
@@ -748,79 +1067,40 @@ def main():
                 help="Upload the Income_and_Expense_Detail_Base_by_Account.xlsx file"
             )
         
+        report_job = get_report_job()
         if transaction_file and income_file:
-            if st.button("🚀 Generate Reports", type="primary"):
-                with st.spinner('Processing data...'):
-                    upload_info = {
-                        "email": st.session_state.get('user_email', 'unknown'),
-                        "transaction_name": transaction_file.name,
-                        "transaction_size": transaction_file.size,
-                        "income_name": income_file.name,
-                        "income_size": income_file.size
-                    }
-                    
-                    results = process_smif_data(transaction_file, income_file)
-                    
-                    if results:
-                        # Save data for persistence
-                        if USE_GITHUB_STORAGE:
-                            try:
-                                # Save to GitHub
-                                storage = GitHubStorage(GITHUB_TOKEN, GITHUB_DATA_REPO)
-                                
-                                # Read file contents
-                                transaction_file.seek(0)
-                                transaction_data = transaction_file.read()
-                                income_file.seek(0)
-                                income_data = income_file.read()
-                                
-                                # Upload to GitHub
-                                success = storage.upload_files(
-                                    transaction_data,
-                                    income_data,
-                                    st.session_state.get('user_email', 'unknown')
-                                )
-                                
-                                if success:
-                                    # Clear cache to force reload
-                                    clear_github_cache()
-                                    st.session_state['results'] = results
-                                    st.session_state['data_source'] = 'github'
-                                    st.success("✅ Reports generated and saved to GitHub successfully!")
-                                    logger.info("Data saved to GitHub successfully")
-                                else:
-                                    st.error("Failed to save to GitHub. Data processed but not persisted.")
-                            except Exception as e:
-                                logger.error(f"GitHub upload error: {e}")
-                                st.error(f"GitHub upload error: {str(e)}")
-                                # Fall back to local storage
-                                data_manager.save_processed_data(results, upload_info)
-                                st.session_state['results'] = results
-                                st.session_state['data_source'] = 'local'
-                                st.warning("Data saved locally as fallback.")
-                        else:
-                            # Use local data manager
-                            data_manager.save_processed_data(results, upload_info)
-                            st.session_state['results'] = results
-                            st.session_state['data_source'] = 'local'
-                            st.success("✅ Reports generated and saved successfully!")
-                        
-                        st.balloons()
+            if st.button("🚀 Generate Reports", type="primary", disabled=report_job is not None):
+                upload_info = {
+                    "email": st.session_state.get('user_email', 'unknown'),
+                    "transaction_name": transaction_file.name,
+                    "transaction_size": transaction_file.size,
+                    "income_name": income_file.name,
+                    "income_size": income_file.size
+                }
+                
+                # Processing runs in the background so the page stays usable and survives reruns
+                job_id = get_job_manager().submit(
+                    'Generate Reports', generate_reports,
+                    transaction_file.getvalue(), income_file.getvalue(), upload_info
+                )
+                st.session_state['report_job'] = job_id
+        
+        show_report_job()
     
     # Display results section
-    if 'results' in st.session_state:
+    results = get_session_results()
+    if results is not None:
         st.markdown("---")
         st.header("📈 Performance Analysis")
-        
-        results = st.session_state['results']
+        results_version = st.session_state['results_version']
         
         # Time period selector
         period_col1, period_col2 = st.columns([2, 1])
         with period_col1:
             analysis_period = st.selectbox(
                 "📅 Analysis Period",
-                ["Class Period", "Inception to Date"],
-                help=f"Choose between class period ({results.get('class_semester', 'Current Semester')}) or full inception-to-date analysis"
+                ["Class Period", "Inception to Date", "Custom Range"],
+                help=f"Choose between class period ({results.get('class_semester', 'Current Semester')}), full inception-to-date analysis or any custom date range"
             )
         
         with period_col2:
@@ -832,9 +1112,39 @@ def main():
                 st.info(f"📈 **Full Portfolio History**\n\n"
                        f"From: 2023-09-14\n\n"
                        f"To: {results['nav'].index[-1].strftime('%Y-%m-%d')}")
+            elif analysis_period == "Custom Range":
+                first_date = results['returns'].index[0].date()
+                last_date = results['returns'].index[-1].date()
+                custom_range = st.date_input(
+                    "Date range",
+                    value=(first_date, last_date),
+                    min_value=first_date,
+                    max_value=last_date,
+                    key="custom_range"
+                )
         
         # Select data based on period
-        if analysis_period == "Class Period" and 'class_returns' in results and not results['class_returns'].empty:
+        range_stats = range_value = None
+        if analysis_period == "Custom Range":
+            # Any window is read from precomputed prefix arrays, without reprocessing
+            if len(custom_range) == 2:
+                range_start, range_end = custom_range
+            else:
+                # Only the start has been picked so far
+                range_start = range_end = custom_range[0] if custom_range else first_date
+            analyzer = get_range_analyzer(results_version, results)
+            range_stats = analyzer.stats(range_start, range_end)
+            range_value = analyzer.portfolio_value(range_start, range_end)
+            range_flows = analyzer.flows(range_start, range_end)
+            current_returns = results['returns'].loc[pd.Timestamp(range_start):pd.Timestamp(range_end)]
+            current_nav = analyzer.nav(range_start, range_end)
+            current_weights = results['weights'].loc[pd.Timestamp(range_start):pd.Timestamp(range_end)]
+            current_positions = results['positions'].loc[pd.Timestamp(range_start):pd.Timestamp(range_end)]
+            if current_weights.empty:
+                current_weights = results['weights']
+                current_positions = results['positions']
+            period_label = f"{range_start:%Y-%m-%d} to {range_end:%Y-%m-%d}"
+        elif analysis_period == "Class Period" and 'class_returns' in results and not results['class_returns'].empty:
             current_returns = results['class_returns']
             current_nav = results['class_nav']
             current_weights = results['class_weights'] if not results['class_weights'].empty else results['weights']
@@ -852,7 +1162,10 @@ def main():
         col1, col2, col3, col4 = st.columns(4)
         
         if 'SMIF' in current_returns.columns and 'VTI' in current_returns.columns and len(current_returns) > 1:
-            perf_stats, _, dd = calcPerfStats(current_returns[['SMIF', 'VTI']])
+            if range_stats is not None:
+                perf_stats = range_stats[['SMIF', 'VTI']]
+            else:
+                perf_stats, _, dd = calcPerfStats(current_returns[['SMIF', 'VTI']])
             
             with col1:
                 st.metric(
@@ -882,8 +1195,26 @@ def main():
         else:
             st.warning("⚠️ Insufficient data for the selected period. Please choose a different time range or upload more recent data.")
         
+        # Dollar value of the fund over a custom range, with the cash that moved in and out of it
+        if range_value is not None and not range_value.empty:
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Start Value", f"${range_value.iloc[0]:,.0f}")
+            with col2:
+                st.metric(
+                    "End Value",
+                    f"${range_value.iloc[-1]:,.0f}",
+                    delta=f"${range_value.iloc[-1] - range_value.iloc[0]:,.0f}"
+                )
+            with col3:
+                st.metric("Net Trade Cash Flow", f"${range_flows['Cost']:,.0f}",
+                          help="Trade principal over the range: purchases are negative, sales positive")
+            with col4:
+                st.metric("Contributions & Income", f"${range_flows['Cash']:,.0f}",
+                          help="Initial capital, dividends, interest and other income booked over the range")
+        
         # Charts
-        tab1, tab2, tab3, tab4 = st.tabs(["📊 Performance", "🥧 Allocation", "📉 Drawdown", "📋 Data"])
+        tab1, tab2, tab3, tab5, tab4 = st.tabs(["📊 Performance", "🥧 Allocation", "📉 Drawdown", "🎓 Cohorts", "📋 Data"])
         
         with tab1:
             st.subheader(f"Cumulative Performance vs VTI - {period_label}")
@@ -891,6 +1222,10 @@ def main():
                 chart_data = current_nav[['SMIF', 'VTI']].copy()
                 st.line_chart(chart_data, height=400)
                 
+                if range_value is not None and len(range_value) > 1:
+                    st.subheader(f"Portfolio Value - {period_label}")
+                    st.line_chart(range_value.rename('Portfolio Value ($)'), height=300)
+                
                 # Add comparison view option
                 if analysis_period == "Class Period" and 'returns' in results:
                     if st.checkbox("📈 Compare with Inception-to-Date Performance"):
@@ -953,6 +1288,23 @@ def main():
                     st.metric("R-squared", f"{r_value**2:.3f}")
             else:
                 st.warning("⚠️ Insufficient data for regression analysis in the selected period (minimum 5 observations required).")
+            
+            # Rolling statistics
+            if 'SMIF' in current_returns.columns and 'VTI' in current_returns.columns and len(current_returns) > ROLLING_WINDOWS[0]:
+                st.subheader(f"Rolling Statistics - {period_label}")
+                window_labels = {21: "1 Month (21 days)", 63: "1 Quarter (63 days)", 252: "1 Year (252 days)", 'expanding': "Since Start"}
+                col1, col2 = st.columns(2)
+                with col1:
+                    rolling_window = st.selectbox("Window", list(window_labels), format_func=window_labels.get, key="rolling_window")
+                with col2:
+                    rolling_stat = st.selectbox("Statistic", ['AnnRtn', 'AnnStd', 'Sharpe', 'MDD'], key="rolling_stat")
+                
+                rolling_stats = get_perf_stats_panel(current_returns[['SMIF', 'VTI']])[rolling_window]
+                rolling_chart = rolling_stats[rolling_stat].dropna(how='all')
+                if not rolling_chart.empty:
+                    st.line_chart(rolling_chart, height=300)
+                else:
+                    st.info(f"Not enough data in the selected period for a {window_labels[rolling_window].lower()} window.")
         
         with tab2:
             st.subheader(f"Portfolio Allocation - {period_label}")
@@ -971,6 +1323,8 @@ def main():
                 # Use the appropriate market values based on period
                 if analysis_period == "Class Period" and 'class_market_values' in results and not results['class_market_values'].empty:
                     market_vals = results['class_market_values'].iloc[-1]
+                elif analysis_period == "Custom Range":
+                    market_vals = results['market_values'].loc[current_weights.index[-1]]
                 else:
                     market_vals = results['market_values'].iloc[-1]
                 
@@ -981,6 +1335,44 @@ def main():
                 })
                 st.dataframe(allocation_df, use_container_width=True)
                 
+                # Per-holding statistics, computed for both periods at once
+                st.subheader(f"Holding Performance - {period_label}")
+                stats_periods = {'Inception to Date': results['returns']}
+                if 'class_returns' in results and not results['class_returns'].empty:
+                    stats_periods[results['class_semester']] = results['class_returns']
+                if analysis_period == "Custom Range":
+                    stats_periods[period_label] = current_returns
+                all_holding_stats = get_holding_stats(stats_periods)
+                if period_label in all_holding_stats.index.get_level_values(0):
+                    holding_table = all_holding_stats.loc[period_label]
+                    shown = [col for col in dict.fromkeys(list(latest_weights.index) + ['SMIF', 'VTI']) if col in holding_table.index]
+                    holding_table = holding_table.loc[shown]
+                    st.dataframe(
+                        holding_table.style.format({
+                            'AnnRtn': '{:.2%}', 'AnnStd': '{:.2%}', 'Sharpe': '{:.2f}',
+                            'MDD': '{:.2%}', 'Beta': '{:.2f}', 'TrackingError': '{:.2%}'
+                        }, na_rep='N/A'),
+                        use_container_width=True
+                    )
+                    st.caption("Beta and tracking error are measured against VTI.")
+                
+                # Risk budget of the active (non-VTI) holdings at their latest weights
+                st.subheader(f"Active Risk Decomposition - {period_label}")
+                risk_weights = active_weights(latest_weights, benchmark='VTI')
+                risk_assets = [ticker for ticker in risk_weights.index if ticker in current_returns.columns]
+                if len(risk_assets) == len(risk_weights) and len(risk_weights) > 0 and len(current_returns) > 2:
+                    risk_cov = get_active_covariance(current_returns, tuple(risk_assets))
+                    risk_report = get_risk_report(risk_cov, tuple(risk_weights.items()))
+                    st.dataframe(
+                        risk_report.style.format('{:.4f}', na_rep=''),
+                        use_container_width=True
+                    )
+                    st.caption("Active holdings exclude VTI, with weights rescaled to sum to one. "
+                               "MRC is the marginal risk contribution; riskBudget sums to one across holdings "
+                               "and DV is the diversification benefit (sum of weighted vols less portfolio vol).")
+                else:
+                    st.info("No active holdings with return history in the selected period.")
+                
                 # Period comparison for allocation
                 if analysis_period == "Class Period" and st.checkbox("📊 Compare Allocation Over Time"):
                     st.subheader("Allocation Evolution During Class Period")
@@ -1009,7 +1401,9 @@ def main():
                 
                 if 'port_mkts' in results:
                     with st.spinner('Calculating Treynor-Black weights...'):
-                        tb_weights, cov_matrix = calculate_treynor_black_weights(results['port_mkts'])
+                        tb_weights, cov_matrix = get_treynor_black_weights(
+                            tuple(sorted(set(results['port_mkts']))), 5, current_month_end()
+                        )
                         
                         if tb_weights is not None and not tb_weights.empty:
                             # Display metrics
@@ -1180,7 +1574,10 @@ def main():
         with tab3:
             st.subheader(f"Drawdown Analysis - {period_label}")
             if 'SMIF' in current_returns.columns and 'VTI' in current_returns.columns and len(current_returns) > 1:
-                _, _, dd = calcPerfStats(current_returns[['SMIF', 'VTI']])
+                if range_stats is not None:
+                    dd = analyzer.drawdown(range_start, range_end)
+                else:
+                    _, _, dd = calcPerfStats(current_returns[['SMIF', 'VTI']])
                 st.line_chart(dd[['SMIF', 'VTI']], height=400)
                 
                 # Drawdown statistics
@@ -1208,6 +1605,29 @@ def main():
             else:
                 st.warning("⚠️ Insufficient data for drawdown analysis in the selected period.")
         
+        with tab5:
+            st.subheader("🎓 Class Cohort Comparison")
+            if 'portfolio_summary' in results and CLASS_BENCHMARK in results['returns'].columns:
+                cohorts = get_cohort_performance(results['portfolio_summary'], results['returns'][CLASS_BENCHMARK], get_class_cohorts())
+                cohort_table = cohorts['table']
+                st.dataframe(
+                    cohort_table.style.format({
+                        'Start': '{:%Y-%m-%d}', 'End': '{:%Y-%m-%d}',
+                        'InitialValue': '${:,.0f}', 'EndValue': '${:,.0f}',
+                        **{col: '{:.2f}' if col.endswith('Sharpe') else '{:.2%}'
+                           for col in cohort_table.columns if ' ' in col}
+                    }, na_rep='N/A'),
+                    use_container_width=True
+                )
+                
+                st.subheader("Growth of $1 by Trading Day Since Cohort Start")
+                st.line_chart(cohorts['growth'], height=400)
+                if len(cohort_table) == 1:
+                    st.caption("Add [[class_period.cohorts]] entries (semester, start_date, end_date, initial_value) "
+                               "to the secrets to compare semesters.")
+            else:
+                st.warning(f"⚠️ Portfolio summary or {CLASS_BENCHMARK} returns not available for cohort analysis.")
+        
         with tab4:
             st.subheader("📊 Data Export Hub")
             st.write("Export your data for advanced analysis in Jupyter, Colab, Excel, or Google Sheets")
@@ -1261,6 +1681,7 @@ def main():
             
             exporter = SMIFDataExporter(export_results, metadata)
             
+            # Exports are only built on request and reused until the results change
             # Export format selection
             st.subheader("🎯 Choose Export Format")
             
@@ -1270,20 +1691,20 @@ def main():
                 st.markdown("### 📊 **For Excel/Spreadsheet Analysis**")
                 
                 # Excel workbook download
-                excel_data = exporter.to_excel_workbook()
-                st.download_button(
+                export_download(
+                    exporter, 'excel', results_version, export_period,
+                    prepare_label="📗 Prepare Excel Workbook",
                     label="📗 Download Excel Workbook",
-                    data=excel_data,
                     file_name=f"SMIF_Analysis{period_suffix}_{datetime.now().strftime('%Y%m%d')}.xlsx",
                     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                     help=f"Complete dataset in Excel format ({export_period.lower()})"
                 )
                 
                 # CSV package download
-                csv_package = exporter.to_csv_package()
-                st.download_button(
+                export_download(
+                    exporter, 'csv', results_version, export_period,
+                    prepare_label="📦 Prepare CSV Package",
                     label="📦 Download CSV Package",
-                    data=csv_package,
                     file_name=f"SMIF_Data{period_suffix}_{datetime.now().strftime('%Y%m%d')}.zip",
                     mime="application/zip",
                     help=f"ZIP file containing data as separate CSV files ({export_period.lower()})"
@@ -1293,23 +1714,23 @@ def main():
                 st.markdown("### 🐍 **For Python/Jupyter Analysis**")
                 
                 # Pickle data download
-                pickle_data = exporter.to_pickle_data()
-                st.download_button(
+                export_download(
+                    exporter, 'pickle', results_version, export_period,
+                    prepare_label="🥒 Prepare Python Data (Pickle)",
                     label="🥒 Download Python Data (Pickle)",
-                    data=pickle_data,
                     file_name=f"smif_data{period_suffix}_{datetime.now().strftime('%Y%m%d')}.pkl",
                     mime="application/octet-stream",
                     help=f"Python objects for direct loading in Jupyter/Colab ({export_period.lower()})"
                 )
                 
                 # JSON download
-                json_data = exporter.to_json_package()
-                st.download_button(
+                export_download(
+                    exporter, 'json', results_version, export_period,
+                    prepare_label="📄 Prepare JSON Data",
                     label="📄 Download JSON Data",
-                    data=json_data,
                     file_name=f"smif_data{period_suffix}_{datetime.now().strftime('%Y%m%d')}.json",
                     mime="application/json",
-                    help=f"JSON format for web applications or other tools ({export_period.lower()})"
+                    help=f"Compact JSON (split orient) for web applications or other tools ({export_period.lower()})"
                 )
             
             st.markdown("---")
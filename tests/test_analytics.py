@@ -0,0 +1,313 @@
+"""Tests for the vectorized analytics kernels against their reference implementations"""
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+import streamlit_app as app
+from analytics import (HOLDING_STATS, RISK_REPORT_COLUMNS, RangeAnalyzer, active_covariance, active_weights, batch_ols,
+                       cohort_performance, expanding_perf_stats, holding_stats, holding_stats_by_period,
+                       risk_decomposition, rolling_max_drawdown, rolling_perf_stats)
+
+
+@pytest.fixture
+def panel():
+    """
+    Daily returns with the gaps the kernels must handle: VTI is complete,
+    A has scattered missing days, B has a 40-day all-NaN window, C has only
+    eight observations (fewer than min_obs) and D is all NaN.
+    """
+    rng = np.random.default_rng(7)
+    index = pd.bdate_range('2023-09-14', periods=300)
+    vti = rng.normal(0.0004, 0.01, len(index))
+    returns = pd.DataFrame({
+        'VTI': vti,
+        'A': 0.0002 + 1.2 * vti + rng.normal(0, 0.008, len(index)),
+        'B': -0.0001 + 0.7 * vti + rng.normal(0, 0.012, len(index)),
+        'C': rng.normal(0.001, 0.02, len(index)),
+        'D': np.nan,
+    }, index=index)
+    returns.iloc[rng.choice(len(index), 25, replace=False), 1] = np.nan
+    returns.iloc[120:160, 2] = np.nan
+    returns.iloc[:-8, 3] = np.nan
+    return returns
+
+
+def test_batch_ols_matches_linregress_on_pairwise_rows(panel):
+    result = batch_ols(panel[['A', 'B']], panel['VTI'], min_obs=12)
+
+    for col in ['A', 'B']:
+        rows = panel[[col, 'VTI']].dropna()
+        ref = stats.linregress(rows['VTI'], rows[col])
+        resid = rows[col] - (ref.intercept + ref.slope * rows['VTI'])
+        n = len(rows)
+
+        assert result.loc[col, 'nobs'] == n
+        assert result.loc[col, 'beta'] == pytest.approx(ref.slope, rel=1e-10)
+        assert result.loc[col, 'alpha'] == pytest.approx(ref.intercept, rel=1e-9)
+        assert result.loc[col, 't_beta'] == pytest.approx(ref.slope / ref.stderr, rel=1e-9)
+        assert result.loc[col, 't_alpha'] == pytest.approx(ref.intercept / ref.intercept_stderr, rel=1e-9)
+        assert result.loc[col, 'p_beta'] == pytest.approx(ref.pvalue, rel=1e-6, abs=1e-300)
+        assert result.loc[col, 'r2'] == pytest.approx(ref.rvalue ** 2, rel=1e-10)
+        assert result.loc[col, 'mse'] == pytest.approx((resid ** 2).sum() / n, rel=1e-10)
+        assert result.loc[col, 'mse_resid'] == pytest.approx((resid ** 2).sum() / (n - 2), rel=1e-10)
+
+
+def test_batch_ols_matches_polyfit_slope(panel):
+    result = batch_ols(panel[['A']], panel['VTI'])
+    rows = panel[['A', 'VTI']].dropna()
+    slope, intercept = np.polyfit(rows['VTI'], rows['A'], 1)
+
+    assert result.loc['A', 'beta'] == pytest.approx(slope, rel=1e-10)
+    assert result.loc['A', 'alpha'] == pytest.approx(intercept, rel=1e-9)
+
+
+def test_batch_ols_leaves_short_and_empty_columns_unfitted(panel):
+    result = batch_ols(panel[['A', 'C', 'D']], panel['VTI'], min_obs=12)
+
+    assert result.loc['C', 'nobs'] == 8
+    assert result.loc['D', 'nobs'] == 0
+    assert result.loc[['C', 'D']].drop(columns='nobs').isna().all().all()
+    assert result.loc['A'].notna().all()
+
+    # Without the minimum, the eight observations of C are fitted
+    assert np.isfinite(batch_ols(panel[['C']], panel['VTI'], min_obs=3).loc['C', 'beta'])
+
+
+def reference_stats(rows):
+    """calcPerfStats on a slice of rows, the definition the kernels follow"""
+    return app.calcPerfStats(rows)[0]
+
+
+def assert_stats_row(result, row, expected, enough):
+    """Compare one date of a (stat, asset) frame: reported where enough data, NaN elsewhere"""
+    for col in expected.columns:
+        for stat in expected.index:
+            value = result.loc[row, (stat, col)]
+            if enough[col]:
+                assert value == pytest.approx(expected.loc[stat, col], rel=1e-9, abs=1e-12, nan_ok=True), (row, stat, col)
+            else:
+                assert np.isnan(value), (row, stat, col)
+
+
+@pytest.mark.parametrize('window, min_periods', [(21, None), (21, 5), (63, None), (63, 40)])
+def test_rolling_perf_stats_matches_calc_perf_stats_on_each_window(panel, window, min_periods):
+    result = rolling_perf_stats(panel, window, min_periods=min_periods)
+    required = window if min_periods is None else min_periods
+
+    for end in range(len(panel)):
+        rows = panel.iloc[max(0, end - window + 1):end + 1]
+        enough = rows.notna().sum() >= required
+        assert_stats_row(result, panel.index[end], reference_stats(rows), enough)
+
+    # A full window inside B's gap, and C and D, which never have a full window
+    assert result.loc[panel.index[159], (slice(None), 'B')].isna().all()
+    assert result.xs('D', axis=1, level=1).isna().all().all()
+    if min_periods is None:
+        assert result.xs('C', axis=1, level=1).isna().all().all()
+
+
+def test_rolling_max_drawdown_matches_brute_force(panel):
+    window = 17
+    result = rolling_max_drawdown(panel, window)
+
+    for end in range(len(panel)):
+        rows = panel.iloc[max(0, end - window + 1):end + 1]
+        nav = (1 + rows).cumprod()
+        expected = (nav / nav.cummax() - 1).min()
+        pd.testing.assert_series_equal(result.iloc[end], expected, check_names=False, rtol=1e-9, atol=1e-12)
+
+
+def test_expanding_perf_stats_matches_calc_perf_stats_on_each_prefix(panel):
+    result = expanding_perf_stats(panel)
+
+    for end in range(len(panel)):
+        rows = panel.iloc[:end + 1]
+        enough = rows.notna().sum() >= 2
+        assert_stats_row(result, panel.index[end], reference_stats(rows), enough)
+
+
+def test_holding_stats_matches_reference_per_column(panel):
+    result = holding_stats(panel, benchmark='VTI')
+    expected = reference_stats(panel)
+
+    assert list(result.columns) == HOLDING_STATS
+    for col in panel.columns:
+        for stat in expected.index:
+            assert result.loc[col, stat] == pytest.approx(expected.loc[stat, col], rel=1e-9, abs=1e-12, nan_ok=True), (stat, col)
+
+        rows = panel[[col, 'VTI']].dropna()
+        tracking_error = (panel[col] - panel['VTI']).std() * np.sqrt(252)
+        assert result.loc[col, 'TrackingError'] == pytest.approx(tracking_error, rel=1e-9, nan_ok=True), col
+        if len(rows) >= 3:
+            assert result.loc[col, 'Beta'] == pytest.approx(stats.linregress(rows['VTI'], rows[col]).slope, rel=1e-9), col
+
+    # The benchmark against itself, and a column with no data at all
+    assert result.loc['VTI', 'Beta'] == pytest.approx(1.0)
+    assert result.loc['VTI', 'TrackingError'] == 0
+    assert result.loc['D'].drop('AnnRtn').isna().all()
+
+
+def test_holding_stats_by_period_stacks_periods_and_skips_empty_ones(panel):
+    periods = {'First half': panel.iloc[:150], 'Second half': panel.iloc[150:], 'Empty': panel.iloc[:0]}
+    result = holding_stats_by_period(periods)
+
+    assert list(result.index.get_level_values(0).unique()) == ['First half', 'Second half']
+    pd.testing.assert_frame_equal(result.loc['Second half'], holding_stats(panel.iloc[150:]))
+    # C only has data in the second half
+    assert result.loc[('First half', 'C')].drop('AnnRtn').isna().all()
+
+
+def simulated_risk_report(mktRtn, weights):
+    """The weekly report's risk budget from a simulated weighted return history, kept as the reference"""
+    curPsn = pd.DataFrame(np.repeat(weights.values[None, :], mktRtn.shape[0], axis=0),
+                          columns=weights.index, index=mktRtn.index)
+    simulatedPsnRtns = mktRtn * curPsn
+    portrisk = simulatedPsnRtns.sum(axis=1).std() * np.sqrt(252)
+    wtdVol = weights.values * mktRtn.std() * np.sqrt(252)
+
+    riskReport = pd.DataFrame(columns=RISK_REPORT_COLUMNS, index=weights.index, dtype=float)
+    riskReport['Weight'] = weights.values
+    riskReport['Vol'] = mktRtn.std() * np.sqrt(252)
+    riskReport['wtdVol'] = wtdVol
+    riskReport['Corr'] = mktRtn.corrwith(simulatedPsnRtns.sum(axis=1))
+    riskReport['MRC'] = riskReport['Vol'] * riskReport['Corr']
+    riskReport['Beta'] = riskReport['MRC'] / portrisk
+    riskReport['riskBudget'] = riskReport['Beta'] * weights.values
+    riskReport['riskImpact'] = riskReport['MRC'] * weights.values
+    riskReport.loc['activeP'] = [1, portrisk, portrisk, 1, portrisk, 1, 1, portrisk, sum(wtdVol), sum(wtdVol) - portrisk]
+    return riskReport
+
+
+@pytest.mark.parametrize('assets', [['A', 'B'], ['A', 'B', 'C']])
+def test_risk_decomposition_matches_simulated_history(panel, assets):
+    weights = active_weights(pd.Series({'VTI': 0.5, 'A': 0.3, 'B': 0.15, 'C': 0.05, 'D': 0.0})[['VTI'] + assets])
+    result = risk_decomposition(active_covariance(panel, assets), weights)
+
+    expected = simulated_risk_report(panel[assets].dropna(), weights)
+    # With C, only the few rows where all three are present enter the covariance
+    pd.testing.assert_frame_equal(result, expected, rtol=1e-10)
+
+
+def test_active_weights_drops_benchmark_and_empty_positions():
+    weights = active_weights(pd.Series({'VTI': 0.4, 'A': 0.3, 'B': 0.1, 'C': 0.0, 'D': np.nan}))
+    pd.testing.assert_series_equal(weights, pd.Series({'A': 0.75, 'B': 0.25}))
+
+
+def test_risk_decomposition_without_overlapping_history_is_nan(panel):
+    result = risk_decomposition(active_covariance(panel, ['A', 'D']), pd.Series({'A': 0.5, 'D': 0.5}))
+    assert result.loc[['A', 'D'], ['Vol', 'Corr', 'MRC']].isna().all().all()
+    assert np.isnan(result.loc['activeP', 'Vol'])
+
+
+@pytest.fixture
+def summary(panel):
+    """Portfolio summary on the panel's dates, with occasional trade costs and income"""
+    rng = np.random.default_rng(11)
+    index = panel.index
+    return pd.DataFrame({
+        'MktValue': 1_000_000 * (1 + panel['VTI']).cumprod(),
+        'Cost': np.where(rng.random(len(index)) < 0.2, rng.normal(0, 5000, len(index)), 0.0),
+        'Cash': np.where(rng.random(len(index)) < 0.05, rng.normal(300, 50, len(index)), 0.0),
+    }, index=index)
+
+
+RANGES = [
+    (None, None),
+    ('2023-09-16', '2023-10-20'),   # starts on a Saturday
+    ('2024-02-28', '2024-04-10'),   # B has no data in this window
+    ('2024-03-01', '2024-03-01'),   # a single day
+    ('2024-10-01', '2025-06-30'),   # ends after the data, where C has its few rows
+    ('2023-11-01', '2024-08-15'),
+]
+
+
+@pytest.mark.parametrize('start, end', RANGES)
+def test_range_analyzer_matches_slices(panel, summary, start, end):
+    analyzer = RangeAnalyzer(panel, summary)
+    rows = panel.loc[start:end]
+
+    pd.testing.assert_frame_equal(analyzer.stats(start, end), reference_stats(rows), rtol=1e-9, atol=1e-12)
+    pd.testing.assert_frame_equal(analyzer.nav(start, end), (1 + rows).cumprod(), rtol=1e-9, check_freq=False)
+
+    first = summary.loc[start:end].index[0]
+    expected_value = app.calculate_portfolio_nav(summary, 250_000, first).loc[:end]
+    pd.testing.assert_series_equal(analyzer.portfolio_value(start, end, 250_000), expected_value,
+                                   check_names=False, check_freq=False, rtol=1e-12)
+
+    flows = analyzer.flows(start, end)
+    assert flows['Cost'] == pytest.approx(summary.loc[start:end, 'Cost'].sum(), abs=1e-6)
+    assert flows['Cash'] == pytest.approx(summary.loc[start:end, 'Cash'].sum(), abs=1e-6)
+
+
+def test_range_analyzer_value_starts_at_the_days_own_value(summary, panel):
+    analyzer = RangeAnalyzer(panel, summary)
+    value = analyzer.portfolio_value('2024-01-02', '2024-02-01')
+    first = summary.loc['2024-01-02']
+    assert value.iloc[0] == pytest.approx(first['MktValue'] + first['Cost'] + first['Cash'])
+
+
+def test_range_analyzer_without_summary_or_rows(panel):
+    analyzer = RangeAnalyzer(panel)
+    assert analyzer.portfolio_value().empty
+    assert np.isnan(analyzer.flows()['Cost'])
+    assert analyzer.stats('2030-01-01', '2030-12-31').isna().all().all()
+
+
+COHORTS = [
+    {'semester': 'Inception', 'start_date': '2023-01-01', 'end_date': '', 'initial_value': 1_000_000},
+    {'semester': 'Fall 2023', 'start_date': '2023-09-16', 'end_date': '2023-12-15', 'initial_value': 250_000},
+    {'semester': 'Spring 2024', 'start_date': '2024-01-08', 'end_date': '2024-05-10', 'initial_value': 300_000},
+    {'semester': 'Fall 2024', 'start_date': '2024-09-01', 'end_date': None, 'initial_value': 400_000},
+]
+
+
+def class_period_reference(summary, benchmark_returns, cohort):
+    """A cohort's NAV and statistics as build_results computes the class period"""
+    dates = summary.index
+    start = dates[dates >= pd.Timestamp(cohort['start_date'])][0]
+    end = pd.Timestamp(cohort['end_date']) if cohort['end_date'] else dates[-1]
+    nav = app.calculate_portfolio_nav(summary, cohort['initial_value'], start).loc[:end]
+    returns = pd.DataFrame({'SMIF': nav.pct_change().fillna(0)})
+    combined = returns.join(benchmark_returns.reindex(returns.index, fill_value=0).rename('VTI'))
+    combined = combined.iloc[1:].fillna(0)
+    return nav, combined, reference_stats(combined)
+
+
+def test_cohort_performance_matches_class_period_per_cohort(panel, summary):
+    # B, with its 40-day gap, stands in for the benchmark
+    result = cohort_performance(summary, panel['B'], COHORTS)
+    table = result['table']
+
+    for cohort in COHORTS:
+        label = cohort['semester']
+        nav, combined, expected = class_period_reference(summary, panel['B'], cohort)
+
+        pd.testing.assert_series_equal(result['nav'][label].dropna(), nav, check_names=False, check_freq=False, rtol=1e-12)
+        assert table.loc[label, 'Start'] == nav.index[0]
+        assert table.loc[label, 'End'] == nav.index[-1]
+        assert table.loc[label, 'Days'] == len(combined)
+        assert table.loc[label, 'EndValue'] == pytest.approx(nav.iloc[-1], rel=1e-12)
+        for name in ['SMIF', 'VTI']:
+            assert table.loc[label, f'{name} TotalRtn'] == pytest.approx((1 + combined[name]).prod() - 1, rel=1e-9)
+            for stat in expected.index:
+                assert table.loc[label, f'{name} {stat}'] == pytest.approx(expected.loc[stat, name], rel=1e-9), (label, name, stat)
+
+        growth = result['growth'][label].dropna()
+        np.testing.assert_allclose(growth.to_numpy(), np.r_[1.0, (1 + combined['SMIF']).cumprod().to_numpy()], rtol=1e-10)
+
+
+def test_cohort_starting_after_the_data_has_no_returns(panel, summary):
+    cohort = {'semester': 'Future', 'start_date': '2026-01-05', 'end_date': '', 'initial_value': 500_000}
+    table = cohort_performance(summary, panel['VTI'], [cohort])['table']
+
+    assert table.loc['Future', 'Start'] == summary.index[-1]
+    assert table.loc['Future', 'Days'] == 0
+    assert table.loc['Future', 'EndValue'] == 500_000
+    assert np.isnan(table.loc['Future', 'SMIF AnnStd'])
+
+
+def test_cohort_performance_on_empty_summary(summary, panel):
+    result = cohort_performance(summary.iloc[:0], panel['VTI'], COHORTS)
+    assert list(result['table'].index) == [cohort['semester'] for cohort in COHORTS]
+    assert result['nav'].empty
@@ -0,0 +1,25 @@
+"""Tests for workbook normalization in the ingestion cache"""
+import pandas as pd
+import pytest
+
+from ingestion import normalize_workbook
+
+
+def test_blank_dates_become_nat():
+    income = pd.DataFrame({
+        'Recognition date': [pd.Timestamp('2024-01-02'), ' ', None, '2024-02-03'],
+        'Net amount - base': [1, 2, 3, 4],
+    })
+    result = normalize_workbook(income)
+
+    assert result['Recognition date'].tolist()[::3] == [pd.Timestamp('2024-01-02'), pd.Timestamp('2024-02-03')]
+    assert result['Recognition date'].iloc[1:3].isna().all()
+
+
+def test_unparseable_dates_are_reported_not_dropped():
+    transactions = pd.DataFrame({
+        'D-TRADE': ['2024-01-02', 'Pending', '2024-01-04', ''],
+        'Share/Par Value': [10, 20, 30, 40],
+    })
+    with pytest.raises(ValueError, match=r"'D-TRADE' has 1 value\(s\) that are not dates \(row 3: 'Pending'\)"):
+        normalize_workbook(transactions)
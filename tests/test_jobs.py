@@ -0,0 +1,131 @@
+"""Tests for the background job manager and single-flight calls"""
+import threading
+import time
+
+from jobs import JobManager, SingleFlight
+
+
+def wait_for(manager, job_id, timeout=5.0):
+    deadline = time.time() + timeout
+    job = manager.get(job_id)
+    while not job.done and time.time() < deadline:
+        time.sleep(0.01)
+        job = manager.get(job_id)
+    assert job.done, "job did not finish in time"
+    return job
+
+
+def test_failing_job_records_error_message():
+    def fail(job):
+        job.update(0.5, 'Halfway')
+        raise RuntimeError("upload failed")
+
+    manager = JobManager(max_workers=1)
+    job = wait_for(manager, manager.submit('fail', fail))
+
+    assert job.status == 'failed'
+    assert job.error_message == "upload failed"
+    assert job.result is None
+    assert job.finished is not None
+
+
+def test_job_reports_error_and_still_completes():
+    def report(job, value):
+        job.warning("Saved locally as fallback.")
+        job.error("GitHub upload error: timeout")
+        return value * 2
+
+    manager = JobManager(max_workers=1)
+    job = wait_for(manager, manager.submit('report', report, 21))
+
+    assert job.status == 'done'
+    assert job.result == 42
+    assert job.error_message is None
+    assert job.messages == [('warning', "Saved locally as fallback."),
+                            ('error', "GitHub upload error: timeout")]
+    assert job.progress == 1.0
+
+
+class StopScript(BaseException):
+    """Stands in for Streamlit's rerun/stop exceptions, which are not Exceptions"""
+
+
+def start(target, *args):
+    """Run target in a thread, recording what it returned or raised"""
+    outcome = {}
+
+    def run():
+        try:
+            outcome['result'] = target(*args)
+        except BaseException as e:
+            outcome['error'] = e
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, outcome
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    assert condition(), "condition not reached in time"
+
+
+def test_waiters_retry_after_the_leader_is_interrupted():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def interrupted():
+        calls.append('leader')
+        release.wait(5)
+        raise StopScript()
+
+    def download():
+        calls.append('retry')
+        time.sleep(0.2)
+        return 'blob'
+
+    leader, leader_outcome = start(flight.do, 'repo', interrupted)
+    wait_until(lambda: calls == ['leader'])
+    waiters = [start(flight.do, 'repo', download) for _ in range(4)]
+    time.sleep(0.1)
+    assert calls == ['leader'], "waiters must not run while the leader is in flight"
+
+    release.set()
+    for thread, _ in [(leader, leader_outcome)] + waiters:
+        thread.join(5)
+
+    # The interruption stays with the leader; one waiter took over and shared its result
+    assert isinstance(leader_outcome['error'], StopScript)
+    assert calls == ['leader', 'retry']
+    assert [outcome for _, outcome in waiters] == [{'result': 'blob'}] * 4
+    assert not flight.in_flight('repo')
+
+
+def test_leader_exception_reaches_every_waiter():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+    failure = ValueError("rate limited")
+
+    def fail():
+        calls.append('leader')
+        release.wait(5)
+        raise failure
+
+    leader, leader_outcome = start(flight.do, 'repo', fail)
+    wait_until(lambda: calls == ['leader'])
+    waiters = [start(flight.do, 'repo', fail) for _ in range(3)]
+    time.sleep(0.1)
+
+    release.set()
+    for thread, _ in [(leader, leader_outcome)] + waiters:
+        thread.join(5)
+
+    assert calls == ['leader']
+    assert all(outcome['error'] is failure for _, outcome in [(leader, leader_outcome)] + waiters)
+    assert not flight.in_flight('repo')
+
+    # The key was released, so the next caller runs again
+    assert flight.do('repo', lambda: 'fresh') == 'fresh'
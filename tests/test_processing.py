@@ -0,0 +1,241 @@
+"""Tests for the holdings pipeline in streamlit_app against the original loop-based code"""
+import functools
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_manager
+import streamlit_app as app
+from ingestion import load_brokerage_files
+from jobs import Job
+
+
+def loop_trades_matrix(smifTrade, portMkts, reporting_dates, df_splits):
+    """The per-ticker iterrows loop build_trades_matrix replaced, kept as the reference"""
+    trades = pd.DataFrame(0.0, columns=portMkts, index=reporting_dates)
+    for ticker in trades.columns:
+        ticker_trades = smifTrade.loc[smifTrade['Ticker/Option Symbol number'] == ticker]
+        if not ticker_trades.empty:
+            for trade_date, trade_row in ticker_trades.iterrows():
+                trade_date_dt = pd.to_datetime(trade_date)
+                if trade_date_dt in reporting_dates:
+                    trades.loc[trade_date_dt, ticker] = trade_row['Share/Par Value']
+                else:
+                    next_dates = reporting_dates[reporting_dates >= trade_date_dt]
+                    if len(next_dates) > 0:
+                        trades.loc[next_dates[0], ticker] = trade_row['Share/Par Value']
+            tradeDates = trades.loc[trades[ticker] != 0, ticker].index
+            if len(tradeDates) > 0:
+                splitDates = df_splits.loc[df_splits[ticker] != 0, ticker].index
+                for k in splitDates:
+                    trades.loc[trades.index < k, ticker] *= df_splits.loc[k, ticker]
+    return trades
+
+
+def trade_report(rows):
+    """A transaction report from (date, ticker, shares) rows"""
+    return pd.DataFrame({
+        'D-TRADE': pd.to_datetime([date for date, _, _ in rows]),
+        'Share/Par Value': [float(shares) for _, _, shares in rows],
+        'A-PRIN-TRD-BSE': [-100.0 * shares for _, _, shares in rows],
+        'Ticker/Option Symbol number': [ticker for _, ticker, _ in rows],
+    })
+
+
+def reporting_calendar(smifTrade):
+    """Reporting dates as process_smif_data builds them"""
+    transaction_dates = pd.to_datetime(smifTrade.index).unique()
+    return pd.date_range(max(transaction_dates.min(), pd.to_datetime('2023-09-14')),
+                         transaction_dates.max(), freq='B')
+
+
+@pytest.fixture
+def splits():
+    """Split calendar with two splits of AAA (one a reverse split) and one each for BBB and CCC"""
+    portMkts = ['AAA', 'BBB', 'CCC', 'DDD']
+    df_splits = pd.DataFrame(0.0, columns=portMkts, index=pd.date_range('2023-09-01', '2024-12-31', freq='B'))
+    df_splits.loc['2023-11-06', 'AAA'] = 0.25
+    df_splits.loc['2024-03-04', 'AAA'] = 10.0
+    df_splits.loc['2024-02-01', 'BBB'] = 3.0
+    df_splits.loc['2023-09-05', 'CCC'] = 2.0
+    return portMkts, df_splits
+
+
+def test_build_trades_matrix_matches_loop_on_edge_cases(splits):
+    portMkts, df_splits = splits
+    smifTrade = app.parse_trades(trade_report([
+        ('2023-09-05', 'CCC', 40),    # before inception: lands on the first reporting day
+        ('2023-09-14', 'AAA', 100),
+        ('2023-09-16', 'AAA', 10),    # Saturday, snaps to Monday 09-18 ...
+        ('2023-09-18', 'AAA', 7),     # ... where the Monday trade overwrites it
+        ('2023-09-17', 'BBB', 30),    # Sunday
+        ('2023-10-02', 'NTPXX', 500), # money market fund, not a portfolio market
+        ('2023-12-01', 'AAA', -20),   # between the two AAA splits
+        ('2024-02-01', 'BBB', 5),     # on the split date itself
+        ('2024-03-09', 'DDD', 15),    # Saturday, last trade
+        ('2024-03-09', 'AAA', 4),
+    ]))
+    reporting_dates = reporting_calendar(smifTrade)
+
+    expected = loop_trades_matrix(smifTrade, portMkts, reporting_dates, df_splits)
+    result = app.build_trades_matrix(smifTrade, portMkts, reporting_dates, df_splits)
+
+    pd.testing.assert_frame_equal(result, expected, check_freq=False)
+    pd.testing.assert_frame_equal(result.cumsum(), expected.cumsum(), check_freq=False)
+    # The weekend trade was overwritten and both AAA splits apply to the first trade
+    assert result.loc['2023-09-18', 'AAA'] == 7 * 0.25 * 10
+    assert result.loc['2023-09-14', 'AAA'] == 100 * 0.25 * 10
+
+
+def test_build_trades_matrix_matches_loop_on_random_trades(splits):
+    portMkts, df_splits = splits
+    rng = np.random.default_rng(5)
+    dates = pd.Timestamp('2023-09-02') + pd.to_timedelta(rng.integers(0, 200, 400), unit='D')
+    tickers = rng.choice(portMkts + ['NTPXX', 'ZZZ'], 400)
+    shares = rng.integers(-50, 100, 400)
+    smifTrade = app.parse_trades(trade_report(list(zip(dates, tickers, shares))))
+    reporting_dates = reporting_calendar(smifTrade)
+
+    expected = loop_trades_matrix(smifTrade, portMkts, reporting_dates, df_splits)
+    result = app.build_trades_matrix(smifTrade, portMkts, reporting_dates, df_splits)
+
+    pd.testing.assert_frame_equal(result, expected, check_freq=False)
+
+
+# Incremental processing (extend_holdings) against a full rebuild
+
+HISTORY_END = '2024-07-01'
+CUT = pd.Timestamp('2024-05-31')
+RESULT_FRAMES = ['positions', 'market_values', 'weights', 'portfolio_summary', 'returns', 'nav']
+
+
+class FakePriceCache:
+    """Deterministic daily prices in place of the Yahoo-backed price cache"""
+
+    def __init__(self, splits=None):
+        self.splits = splits or {}
+
+    def get_histories(self, tickers, startdate='2023-09-01', enddate=None, max_workers=None):
+        index = pd.bdate_range(startdate, HISTORY_END)
+        histories = {}
+        for i, ticker in enumerate(tickers):
+            close = 50.0 + 10 * i + 5 * np.sin(np.arange(len(index)) / (7.0 + i))
+            history = pd.DataFrame({'Close': close, 'Dividends': 0.0, 'Stock Splits': 0.0}, index=index)
+            for date, factor in self.splits.get(ticker, []):
+                history.loc[date, 'Stock Splits'] = factor
+            histories[ticker] = history
+        return histories, {}
+
+
+def brokerage_files(through=None, edit=None):
+    """Transaction and income workbooks as bytes, optionally cut at a date or with one share amount edited"""
+    rng = np.random.default_rng(3)
+    dates = pd.bdate_range('2023-09-14', '2024-06-28')[::3]
+    transactions = pd.DataFrame({
+        'D-TRADE': dates,
+        'Share/Par Value': rng.integers(1, 50, len(dates)).astype(float),
+        'A-PRIN-TRD-BSE': -rng.integers(100, 5000, len(dates)).astype(float),
+        'Ticker/Option Symbol number': rng.choice(['AAA', 'BBB', 'VTI', 'NTPXX'], len(dates)),
+    })
+    income_dates = pd.bdate_range('2023-09-20', '2024-06-28')[::7]
+    income = pd.DataFrame({
+        'Recognition date': list(income_dates) + [' '],
+        'Net amount - base': list(rng.normal(50, 10, len(income_dates))) + [0.0],
+        'Narrative - Short': 'DIV',
+    })
+    if edit is not None:
+        transactions.loc[edit, 'Share/Par Value'] += 1
+    if through is not None:
+        transactions = transactions[transactions['D-TRADE'] <= through]
+        income = income[pd.to_datetime(income['Recognition date'], errors='coerce').fillna(through) <= through]
+
+    files = []
+    for frame in (transactions, income):
+        buffer = io.BytesIO()
+        frame.to_excel(buffer, index=False)
+        files.append(buffer.getvalue())
+    return files
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    """process_smif_data on fake prices, recording whether each run extended the previous results"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(app, 'get_price_cache', lambda: FakePriceCache())
+    monkeypatch.setattr(app, 'load_brokerage_files', functools.partial(load_brokerage_files, parallel=False))
+
+    extended = []
+    extend_holdings = app.extend_holdings
+
+    def recording_extend_holdings(*args, **kwargs):
+        holdings = extend_holdings(*args, **kwargs)
+        extended.append(holdings is not None)
+        return holdings
+    monkeypatch.setattr(app, 'extend_holdings', recording_extend_holdings)
+
+    def run(files, previous=None):
+        job = Job('test', 'process')
+        results = app.process_smif_data(io.BytesIO(files[0]), io.BytesIO(files[1]), previous, reporter=job)
+        assert results is not None, job.messages
+        return results
+
+    def saved(results, name):
+        # Previous results come back from the results cache as a lazy Parquet store
+        store_dir = str(tmp_path / name)
+        data_manager.write_results_store(store_dir, results)
+        return data_manager.open_results_store(store_dir)
+
+    run.saved = saved
+    run.extended = extended
+    return run
+
+
+def assert_same_results(result, expected):
+    for key in RESULT_FRAMES:
+        pd.testing.assert_frame_equal(result[key], expected[key], check_freq=False, obj=key)
+
+
+def test_extending_matches_full_rebuild(pipeline):
+    previous = pipeline.saved(pipeline(brokerage_files(through=CUT)), 'base')
+    pipeline.extended.clear()
+
+    extended = pipeline(brokerage_files(), previous)
+    assert pipeline.extended == [True]
+
+    rebuilt = pipeline(brokerage_files())
+    assert_same_results(extended, rebuilt)
+    assert extended['ingest_state'] == rebuilt['ingest_state']
+
+
+def test_edited_history_forces_rebuild(pipeline):
+    previous = pipeline.saved(pipeline(brokerage_files(through=CUT)), 'base')
+    pipeline.extended.clear()
+
+    # Edit a trade well before the previous results' last date
+    files = brokerage_files(edit=5)
+    result = pipeline(files, previous)
+    assert pipeline.extended == [False]
+    assert_same_results(result, pipeline(files))
+
+
+def test_new_split_forces_rebuild(pipeline, monkeypatch):
+    previous = pipeline.saved(pipeline(brokerage_files(through=CUT)), 'base')
+    pipeline.extended.clear()
+
+    # Yahoo now reports a split inside the already processed period
+    monkeypatch.setattr(app, 'get_price_cache', lambda: FakePriceCache({'AAA': [('2024-01-02', 2.0)]}))
+    result = pipeline(brokerage_files(), previous)
+    assert pipeline.extended == [False]
+    assert_same_results(result, pipeline(brokerage_files()))
+
+
+def test_changed_settings_force_rebuild(pipeline, monkeypatch):
+    previous = pipeline.saved(pipeline(brokerage_files(through=CUT)), 'base')
+    pipeline.extended.clear()
+
+    monkeypatch.setattr(app, 'INITIAL_PORTFOLIO_VALUE', app.INITIAL_PORTFOLIO_VALUE + 1000)
+    result = pipeline(brokerage_files(), previous)
+    assert pipeline.extended == [False]
+    assert_same_results(result, pipeline(brokerage_files()))